@@ -0,0 +1,474 @@
+# analises.py - Estruturas pré-agregadas e cálculos analíticos sobre os datasets do catálogo
+
+import numpy as np
+import pandas as pd
+
+from filtros import mascara_filtros, mascara_selecao, posicoes_de_mascara
+
+COL_TIPO_EVENTO = 't'
+COL_VALOR = 'valor'
+COL_FUNCIONARIO = 'nome_funcionario'
+COL_REGISTROS = '_registros' # Contagem de linhas por célula do cubo
+
+# O cubo só é construído se tiver no máximo esta fração das linhas originais (senão não compensa)
+PROPORCAO_MAXIMA_CUBO = 0.5
+
+
+def construir_cubo(df, colunas_filtros, colunas_valor, col_tipo=COL_TIPO_EVENTO, col_func=COL_FUNCIONARIO, proporcao_maxima=PROPORCAO_MAXIMA_CUBO):
+    """
+    Pré-agrega o dataset por todas as combinações das colunas de filtro (exceto o funcionário):
+      - 'cubo_valores': soma das colunas de valor e contagem de registros por célula e tipo de evento ('t');
+      - 'cubo_funcionarios': pares distintos (célula, funcionário) para a contagem de funcionários únicos.
+    Retorna None se o cubo não for bem menor que o dataset (ou faltarem colunas críticas).
+    Com proporcao_maxima=None o tamanho não é verificado (cubos parciais, ver combinar_cubos).
+    """
+    if col_func not in df.columns or df.empty:
+        return None
+
+    dimensoes = [col for col in colunas_filtros if col in df.columns and col != col_func]
+    chaves_valores = dimensoes + ([col_tipo] if col_tipo in df.columns and col_tipo not in dimensoes else [])
+    colunas_soma = [col for col in colunas_valor if col in df.columns and col not in chaves_valores]
+
+    if chaves_valores:
+        agrupado = df.groupby(chaves_valores, observed=True, dropna=False, sort=False)
+        cubo_valores = agrupado[colunas_soma].sum() if colunas_soma else pd.DataFrame(index=agrupado.size().index)
+        cubo_valores[COL_REGISTROS] = agrupado.size()
+        cubo_valores = cubo_valores.reset_index()
+    else:
+        cubo_valores = pd.DataFrame({col: [df[col].sum()] for col in colunas_soma})
+        cubo_valores[COL_REGISTROS] = len(df)
+
+    if proporcao_maxima is not None and len(cubo_valores) > len(df) * proporcao_maxima:
+        return None
+
+    # Mesma normalização de calcular_venc_desc: nomes vazios não contam como funcionário
+    nomes = df[col_func].astype(str).str.strip()
+    validos = (nomes != '') & df[col_func].notna()
+    pares = df.loc[validos, dimensoes].copy() if dimensoes else pd.DataFrame(index=df.index[validos])
+    pares[col_func] = nomes[validos].astype('category')
+    cubo_funcionarios = pares.drop_duplicates(ignore_index=True)
+
+    return {'cubo_valores': cubo_valores, 'cubo_funcionarios': cubo_funcionarios}
+
+
+def combinar_cubos(cubos, total_linhas, col_tipo=COL_TIPO_EVENTO, col_func=COL_FUNCIONARIO, proporcao_maxima=PROPORCAO_MAXIMA_CUBO):
+    """
+    Reagrega cubos parciais (ex.: um por bloco na ingestão em streaming) num único cubo.
+    As somas e contagens de células repetidas são somadas; os pares (célula, funcionário) são deduplicados.
+    Retorna None se algum parcial faltar ou se o cubo final não for bem menor que as 'total_linhas' do dataset.
+    """
+    if not cubos or any(cubo is None for cubo in cubos):
+        return None
+
+    if len(cubos) == 1:
+        cubo = cubos[0]
+    else:
+        dimensoes = [col for col in cubos[0]['cubo_funcionarios'].columns if col != col_func]
+        valores = pd.concat([cubo['cubo_valores'] for cubo in cubos], ignore_index=True)
+        chaves_valores = dimensoes + ([col_tipo] if col_tipo in valores.columns and col_tipo not in dimensoes else [])
+        if chaves_valores:
+            # Blocos diferentes trazem dicionários de categorias diferentes: as chaves voltam a ser categóricas
+            for col in chaves_valores:
+                valores[col] = valores[col].astype('category')
+            valores = valores.groupby(chaves_valores, observed=True, dropna=False, sort=False).sum().reset_index()
+        else:
+            valores = valores.sum().to_frame().T
+
+        pares = pd.concat([cubo['cubo_funcionarios'] for cubo in cubos], ignore_index=True)
+        for col in pares.columns:
+            pares[col] = pares[col].astype('category')
+        cubo = {'cubo_valores': valores, 'cubo_funcionarios': pares.drop_duplicates(ignore_index=True)}
+
+    if proporcao_maxima is not None and len(cubo['cubo_valores']) > total_linhas * proporcao_maxima:
+        return None
+    return cubo
+
+
+def calcular_venc_desc(df, is_value_mode, col_func=COL_FUNCIONARIO, col_tipo=COL_TIPO_EVENTO, col_valor=COL_VALOR):
+    """
+    KPIs do painel sobre as linhas já filtradas: (vencimentos, descontos, líquido, funcionários únicos).
+    No modo contagem o primeiro valor é o número de registros e os monetários são zero.
+    É a referência que kpis_do_cubo reproduz a partir do cubo.
+    """
+    if df.empty:
+        return 0, 0, 0, 0 # Vencimentos, Descontos, Liquido, Contagem Func
+
+    func_count = df[col_func].astype(str).str.strip().replace('', np.nan).dropna().nunique()
+
+    if not is_value_mode:
+        # No modo COUNT, valores monetários são ZERO. O primeiro retorno é a contagem de registros.
+        return len(df), 0, 0, func_count
+
+    # Modo VALUE
+    df_clean = df.dropna(subset=[col_valor, col_tipo])
+
+    vencimentos = df_clean[df_clean[col_tipo] == 'C'][col_valor].sum()
+    descontos = df_clean[df_clean[col_tipo] == 'D'][col_valor].sum()
+    liquido = vencimentos - descontos
+
+    return vencimentos, descontos, liquido, func_count
+
+
+def cubo_atende_filtros(cubo, filtros_ativos, indice_opcoes=None):
+    """Indica se os filtros ativos usam apenas dimensões do cubo (filtros TOTAL/vazios não contam)."""
+    if not cubo:
+        return False
+    dimensoes = set(cubo['cubo_funcionarios'].columns) - {COL_FUNCIONARIO}
+    for col, selecao in filtros_ativos.items():
+        if not selecao or col in dimensoes:
+            continue
+        total = len(indice_opcoes[col]['valores']) if indice_opcoes and col in indice_opcoes else None
+        if total is None or len(selecao) < total:
+            return False
+    return True
+
+
+def kpis_do_cubo(cubo, filtros_ativos, indice_opcoes, is_value_mode, colunas_soma=(), col_tipo=COL_TIPO_EVENTO, col_valor=COL_VALOR):
+    """
+    Calcula os KPIs do painel (mesmo retorno de calcular_venc_desc) a partir do cubo, sem ler as linhas brutas.
+    Retorna ((venc_ou_registros, descontos, liquido, funcionarios), {coluna: soma}).
+    """
+    cubo_valores = cubo['cubo_valores']
+    cubo_funcionarios = cubo['cubo_funcionarios']
+    dimensoes = [col for col in cubo_funcionarios.columns if col != COL_FUNCIONARIO]
+
+    mascara_v = mascara_filtros(cubo_valores, dimensoes, filtros_ativos, indice_opcoes)
+    mascara_f = mascara_filtros(cubo_funcionarios, dimensoes, filtros_ativos, indice_opcoes)
+    valores = cubo_valores if mascara_v is None else cubo_valores[mascara_v]
+    funcionarios = cubo_funcionarios if mascara_f is None else cubo_funcionarios[mascara_f]
+
+    func_count = int(np.unique(funcionarios[COL_FUNCIONARIO].cat.codes.to_numpy()).size)
+    somas = {col: valores[col].sum() for col in colunas_soma if col in valores.columns}
+
+    if valores.empty:
+        return (0, 0, 0, 0), somas
+
+    if not is_value_mode:
+        return (int(valores[COL_REGISTROS].sum()), 0, 0, func_count), somas
+
+    tipos = valores[col_tipo].astype(str).to_numpy()
+    vencimentos = valores.loc[tipos == 'C', col_valor].sum()
+    descontos = valores.loc[tipos == 'D', col_valor].sum()
+    return (vencimentos, descontos, vencimentos - descontos, func_count), somas
+
+
+# --- Variação por grupo (drill-down BASE vs COMPARAÇÃO) ---
+
+SITUACAO_NOVO = 'Novo'
+SITUACAO_REMOVIDO = 'Removido'
+SITUACAO_MANTIDO = 'Mantido'
+
+
+def codigos_do_grupo(serie):
+    """
+    Códigos inteiros (-1 = ausente) e rótulos de uma coluna de agrupamento.
+    Colunas categóricas reaproveitam o próprio dicionário; as demais são fatoradas uma vez.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(), serie.cat.categories
+    codigos, rotulos = pd.factorize(serie, use_na_sentinel=True)
+    return codigos, pd.Index(rotulos)
+
+
+def _somas_por_codigo(codigos, n_grupos, posicoes=None, pesos=None):
+    # Soma (ou contagem, sem pesos) por código em O(linhas); o código -1 (ausente) cai no bin 0, descartado
+    if posicoes is not None:
+        codigos = codigos[posicoes]
+        pesos = None if pesos is None else pesos[posicoes]
+    return np.bincount(codigos.astype(np.intp) + 1, weights=pesos, minlength=n_grupos + 1)[1:]
+
+
+def variacao_por_grupo(df, pos_base, pos_comp, col_grupo, is_value_mode=True, col_tipo=COL_TIPO_EVENTO, col_valor=COL_VALOR, col_registros=None):
+    """
+    Agrega BASE e COMPARAÇÃO ('pos_*' = posições das linhas filtradas, None = todas) por 'col_grupo'
+    numa única passada vetorizada: os códigos da coluna indexam np.bincount, então os dois lados já saem
+    alinhados pelo mesmo dicionário (equivale ao outer join dos dois agrupamentos, sem groupby/merge).
+
+    Retorna um DataFrame com uma linha por grupo presente em algum dos lados:
+    col_grupo, registros_base/comp e, no modo VALUE, vencimentos/descontos/liquido _base/_comp;
+    'delta' (COMPARAÇÃO - BASE do líquido, ou dos registros no modo contagem) e 'situacao'
+    (Novo = só na COMPARAÇÃO, Removido = só na BASE, Mantido = nos dois).
+    'col_registros' (ex.: contagem das células de um cubo) pondera os registros; sem ela, cada linha conta 1.
+    """
+    codigos, rotulos = codigos_do_grupo(df[col_grupo])
+    n_grupos = len(rotulos)
+
+    medidas = {'registros': df[col_registros].to_numpy(dtype='float64') if col_registros else None}
+    if is_value_mode:
+        valores = df[col_valor].to_numpy(dtype='float64', na_value=0.0)
+        valores = np.nan_to_num(valores)
+        medidas['vencimentos'] = np.where(mascara_selecao(df[col_tipo], ['C']), valores, 0.0)
+        medidas['descontos'] = np.where(mascara_selecao(df[col_tipo], ['D']), valores, 0.0)
+
+    colunas = {col_grupo: rotulos.astype(str)}
+    for lado, posicoes in (('base', pos_base), ('comp', pos_comp)):
+        for medida, pesos in medidas.items():
+            colunas[f'{medida}_{lado}'] = _somas_por_codigo(codigos, n_grupos, posicoes, pesos)
+        colunas[f'registros_{lado}'] = colunas[f'registros_{lado}'].astype(np.int64)
+        if is_value_mode:
+            colunas[f'liquido_{lado}'] = colunas[f'vencimentos_{lado}'] - colunas[f'descontos_{lado}']
+    tabela = pd.DataFrame(colunas)
+
+    # Mesma normalização da contagem de funcionários: rótulos vazios não formam grupo
+    presentes = (tabela['registros_base'] > 0) | (tabela['registros_comp'] > 0)
+    presentes &= tabela[col_grupo].str.strip() != ''
+    tabela = tabela[presentes.to_numpy()].reset_index(drop=True)
+
+    medida_delta = 'liquido' if is_value_mode else 'registros'
+    tabela['delta'] = tabela[f'{medida_delta}_comp'] - tabela[f'{medida_delta}_base']
+    na_base = tabela['registros_base'].to_numpy() > 0
+    na_comp = tabela['registros_comp'].to_numpy() > 0
+    tabela['situacao'] = np.select([na_base & na_comp, na_comp], [SITUACAO_MANTIDO, SITUACAO_NOVO], SITUACAO_REMOVIDO)
+    return tabela
+
+
+def indices_top_n(valores, n):
+    """
+    Posições dos 'n' maiores valores, em ordem decrescente. A seleção é parcial (argpartition, O(m));
+    só os 'n' escolhidos são ordenados.
+    """
+    valores = np.asarray(valores)
+    n = min(max(int(n), 0), len(valores))
+    if n == 0:
+        return np.array([], dtype=np.intp)
+    candidatos = np.argpartition(-valores, n - 1)[:n] if n < len(valores) else np.arange(len(valores))
+    return candidatos[np.argsort(-valores[candidatos], kind='stable')]
+
+
+def variacao_por_grupo_no_cubo(cubo, filtros_base, filtros_comp, indice_opcoes, col_grupo, is_value_mode=True, col_tipo=COL_TIPO_EVENTO, col_valor=COL_VALOR):
+    """
+    variacao_por_grupo calculada sobre o cubo pré-agregado (células em vez de linhas brutas), quando
+    'col_grupo' é dimensão do cubo e os filtros dos dois lados usam só dimensões dele. Retorna None
+    quando o cubo não atende (o chamador volta para as linhas filtradas).
+    """
+    if not cubo or col_grupo not in cubo['cubo_valores'].columns:
+        return None
+    if not (cubo_atende_filtros(cubo, filtros_base, indice_opcoes) and cubo_atende_filtros(cubo, filtros_comp, indice_opcoes)):
+        return None
+    if is_value_mode and col_valor not in cubo['cubo_valores'].columns:
+        return None
+    cubo_valores = cubo['cubo_valores']
+    dimensoes = [col for col in cubo['cubo_funcionarios'].columns if col != COL_FUNCIONARIO]
+    pos_base = posicoes_de_mascara(mascara_filtros(cubo_valores, dimensoes, filtros_base, indice_opcoes))
+    pos_comp = posicoes_de_mascara(mascara_filtros(cubo_valores, dimensoes, filtros_comp, indice_opcoes))
+    return variacao_por_grupo(cubo_valores, pos_base, pos_comp, col_grupo, is_value_mode, col_tipo, col_valor, col_registros=COL_REGISTROS)
+
+
+# --- Comparação de N coortes (ex.: 12 meses lado a lado) ---
+
+LIMITE_MAPA_PRESENCA = 64_000_000 # Coortes x funcionários até onde a contagem de únicos usa um mapa de bits (64 MB)
+
+def ordem_natural(rotulos):
+    """Posições que ordenam os rótulos numericamente quando todos são números (ex.: meses '1'..'12'), senão como texto."""
+    numeros = pd.to_numeric(pd.Series(list(rotulos), dtype=object), errors='coerce')
+    if len(numeros) and numeros.notna().all():
+        return np.argsort(numeros.to_numpy(dtype='float64'), kind='stable')
+    return np.argsort(np.asarray([str(rotulo) for rotulo in rotulos]), kind='stable')
+
+
+def coortes_por_dimensao(serie, posicoes=None):
+    """
+    Uma coorte por valor distinto da coluna entre as linhas 'posicoes' (None = todas), em ordem natural.
+    Retorna (rótulo da coorte de cada linha de 'posicoes', -1 = valor ausente; nomes das coortes).
+    """
+    codigos, categorias = codigos_do_grupo(serie)
+    if posicoes is not None:
+        codigos = codigos[posicoes]
+    codigos = codigos.astype(np.intp)
+    presentes = np.flatnonzero(np.bincount(codigos[codigos >= 0], minlength=len(categorias)))
+    nomes = pd.Index(categorias[presentes]).astype(str)
+    presentes = presentes[ordem_natural(nomes)]
+    mapa = np.full(len(categorias) + 1, -1, dtype=np.intp) # Última posição atende o código -1
+    mapa[presentes] = np.arange(len(presentes))
+    return mapa[codigos], pd.Index(categorias[presentes]).astype(str).tolist()
+
+
+def coortes_por_posicoes(lista_posicoes, total_linhas):
+    """
+    Junta as posições de várias coortes (None = todas as linhas) num único par (posições, rótulos),
+    para metricas_por_coorte. Coortes podem se sobrepor: a linha aparece uma vez por coorte.
+    """
+    partes = [np.arange(total_linhas) if posicoes is None else np.asarray(posicoes) for posicoes in lista_posicoes]
+    if not partes:
+        return np.array([], dtype=np.intp), np.array([], dtype=np.intp)
+    rotulos = np.repeat(np.arange(len(partes)), [len(parte) for parte in partes])
+    return np.concatenate(partes), rotulos
+
+
+def metricas_por_coorte(df, rotulos, n_coortes, posicoes=None, is_value_mode=True, colunas_soma=(),
+                        col_func=COL_FUNCIONARIO, col_tipo=COL_TIPO_EVENTO, col_valor=COL_VALOR):
+    """
+    Métricas do painel (registros, funcionários únicos e, no modo VALUE, vencimentos, descontos, líquido e
+    somas das 'colunas_soma') de 'n_coortes' coortes numa única passada agrupada: 'rotulos' traz a coorte
+    (0..n_coortes-1, -1 = fora de todas) de cada linha de 'posicoes' (None = todas as linhas do df).
+    Retorna um DataFrame com uma linha por coorte.
+    """
+    rotulos = np.asarray(rotulos, dtype=np.intp)
+    dentro = rotulos >= 0
+    if dentro.all():
+        linhas = posicoes # None: todas as linhas, sem indexar
+    else:
+        rotulos = rotulos[dentro]
+        linhas = np.flatnonzero(dentro) if posicoes is None else np.asarray(posicoes)[dentro]
+
+    def selecionar(valores):
+        return valores if linhas is None else valores[linhas]
+
+    def somar(pesos=None):
+        return np.bincount(rotulos, weights=None if pesos is None else selecionar(pesos), minlength=n_coortes)
+
+    metricas = {'registros': somar().astype(np.int64)}
+
+    # Funcionários únicos: pares (coorte, funcionário) distintos, contados por coorte.
+    # Mesma normalização da contagem do painel: nomes vazios não contam.
+    if col_func in df.columns:
+        codigos, nomes = codigos_do_grupo(df[col_func])
+        nome_valido = np.append(pd.Index(nomes).astype(str).str.strip() != '', False) # Posição extra: código -1
+        codigos = selecionar(codigos).astype(np.int64)
+        validos = nome_valido[codigos]
+        largura = max(len(nomes), 1)
+        pares = rotulos[validos].astype(np.int64) * largura + codigos[validos]
+        if n_coortes * largura <= LIMITE_MAPA_PRESENCA:
+            # Mapa de presença coorte x funcionário: O(linhas), sem ordenar os pares
+            presenca = np.zeros(n_coortes * largura, dtype=bool)
+            presenca[pares] = True
+            metricas['funcionarios'] = presenca.reshape(n_coortes, largura).sum(axis=1)
+        else:
+            metricas['funcionarios'] = np.bincount(np.unique(pares) // largura, minlength=n_coortes)
+    else:
+        metricas['funcionarios'] = np.zeros(n_coortes, dtype=np.int64)
+
+    if is_value_mode:
+        valores = np.nan_to_num(df[col_valor].to_numpy(dtype='float64', na_value=0.0))
+        metricas['vencimentos'] = somar(np.where(mascara_selecao(df[col_tipo], ['C']), valores, 0.0))
+        metricas['descontos'] = somar(np.where(mascara_selecao(df[col_tipo], ['D']), valores, 0.0))
+        metricas['liquido'] = metricas['vencimentos'] - metricas['descontos']
+        for col in colunas_soma:
+            if col in df.columns:
+                metricas[f'soma_{col}'] = somar(np.nan_to_num(df[col].to_numpy(dtype='float64', na_value=0.0)))
+    return pd.DataFrame(metricas)
+
+
+# --- Diferença entre dois datasets do catálogo (reconciliação) ---
+
+CHAVES_DIFERENCA = ['nr_func', 'eve', 'seq'] # Chave padrão de uma linha da folha
+SITUACAO_ALTERADO = 'Alterado'
+TOLERANCIA_DIFERENCA = 0.005 # Diferenças menores que meio centavo não contam como alteração
+LIMITE_CHAVE_COMPOSTA = 2 ** 62
+
+
+def _codigos_compartilhados(serie_a, serie_b):
+    """
+    Códigos das duas colunas sobre um dicionário comum (valores comparados como texto; ausente é um valor).
+    Só os dicionários são unidos e fatorados; as linhas são remapeadas por consulta.
+    """
+    codigos_a, categorias_a = codigos_do_grupo(serie_a)
+    codigos_b, categorias_b = codigos_do_grupo(serie_b)
+    rotulos = np.concatenate([pd.Index(categorias_a).astype(str).to_numpy(object), pd.Index(categorias_b).astype(str).to_numpy(object)])
+    mapa, uniao = pd.factorize(rotulos)
+    ausente = len(uniao) # Código -1 (ausente) aponta para a última posição do mapa
+    mapa_a = np.append(mapa[:len(categorias_a)], ausente).astype(np.int64)
+    mapa_b = np.append(mapa[len(categorias_a):], ausente).astype(np.int64)
+    return mapa_a[codigos_a], mapa_b[codigos_b], pd.Index(uniao)
+
+
+def chaves_compostas(df_a, df_b, chaves):
+    """
+    Uma chave int64 por linha de cada DataFrame combinando as colunas 'chaves' (mesma chave = mesmos valores).
+    Se o produto das cardinalidades estourar o int64, a chave parcial é recomprimida (fatorada) antes de seguir.
+    Retorna (chave_a, chave_b, {coluna: (códigos em a, códigos em b, dicionário comum)}); o código
+    len(dicionário) representa o valor ausente.
+    """
+    chave_a = np.zeros(len(df_a), dtype=np.int64)
+    chave_b = np.zeros(len(df_b), dtype=np.int64)
+    dicionarios = {}
+    cardinalidade = 1
+    for col in chaves:
+        codigos_a, codigos_b, uniao = _codigos_compartilhados(df_a[col], df_b[col])
+        dicionarios[col] = (codigos_a, codigos_b, uniao)
+        n = len(uniao) + 1
+        if cardinalidade * n > LIMITE_CHAVE_COMPOSTA:
+            _, inversa = np.unique(np.concatenate([chave_a, chave_b]), return_inverse=True)
+            chave_a, chave_b = inversa[:len(df_a)].astype(np.int64), inversa[len(df_a):].astype(np.int64)
+            cardinalidade = int(inversa.max()) + 1 if len(inversa) else 1
+        chave_a = chave_a * n + codigos_a
+        chave_b = chave_b * n + codigos_b
+        cardinalidade *= n
+    return chave_a, chave_b, dicionarios
+
+
+def _agregar_por_chave(chave, valores):
+    # Ordena as chaves uma vez (sorted-merge): chaves únicas, primeira linha de cada uma, linhas e somas por chave
+    unicas, primeira, inversa = np.unique(chave, return_index=True, return_inverse=True)
+    linhas = np.bincount(inversa, minlength=len(unicas))
+    somas = {col: np.bincount(inversa, weights=pesos, minlength=len(unicas)) for col, pesos in valores.items()}
+    return unicas, primeira, linhas, somas
+
+
+def diferenca_datasets(df_antigo, df_novo, chaves, colunas_valor, tolerancia=TOLERANCIA_DIFERENCA):
+    """
+    Reconcilia dois datasets alinhados pelas colunas 'chaves' (ex.: nr_func, eve, seq). Linhas com a mesma
+    chave num dataset são somadas. Cada chave é classificada em Novo (só no novo), Removido (só no antigo),
+    Alterado (alguma coluna de 'colunas_valor' difere mais que 'tolerancia') ou Mantido.
+
+    Recebe só as colunas necessárias (chaves + valores) e não copia os DataFrames: as chaves viram inteiros
+    e os dois lados são alinhados pelas chaves ordenadas. As colunas-chave do resultado são categóricas.
+    Retorna (DataFrame das chaves Novas/Removidas/Alteradas com os valores antigo, novo e delta;
+    resumo {situação: quantidade, 'delta_<coluna>': soma dos deltas}).
+    """
+    chave_antigo, chave_novo, dicionarios = chaves_compostas(df_antigo, df_novo, chaves)
+
+    def valores(df):
+        return {col: np.nan_to_num(df[col].to_numpy(dtype='float64', na_value=0.0)) for col in colunas_valor}
+
+    unicas_a, primeira_a, linhas_a, somas_a = _agregar_por_chave(chave_antigo, valores(df_antigo))
+    unicas_n, primeira_n, linhas_n, somas_n = _agregar_por_chave(chave_novo, valores(df_novo))
+
+    _, pos_a, pos_n = np.intersect1d(unicas_a, unicas_n, assume_unique=True, return_indices=True)
+    removidos = np.ones(len(unicas_a), dtype=bool)
+    removidos[pos_a] = False
+    novos = np.ones(len(unicas_n), dtype=bool)
+    novos[pos_n] = False
+    alterado = np.zeros(len(pos_a), dtype=bool)
+    for col in colunas_valor:
+        alterado |= np.abs(somas_n[col][pos_n] - somas_a[col][pos_a]) > tolerancia
+    pos_a_alt, pos_n_alt = pos_a[alterado], pos_n[alterado]
+    idx_removidos, idx_novos = np.flatnonzero(removidos), np.flatnonzero(novos)
+
+    def rotulos_chave(lado, linhas_rotulos):
+        # Colunas-chave como categóricas sobre o dicionário comum (sem materializar texto por linha)
+        colunas = {}
+        for col, (codigos_a, codigos_b, uniao) in dicionarios.items():
+            codigos = (codigos_a if lado == 'antigo' else codigos_b)[linhas_rotulos]
+            colunas[col] = pd.Categorical.from_codes(np.where(codigos == len(uniao), -1, codigos), categories=uniao)
+        return colunas
+
+    def bloco(situacao, lado, linhas_rotulos, idx_a, idx_n, total):
+        # Rótulos das chaves lidos de uma linha representativa; lado ausente conta zero
+        parte = pd.DataFrame(rotulos_chave(lado, linhas_rotulos))
+        parte['situacao'] = situacao
+        parte['linhas_antigo'] = linhas_a[idx_a] if idx_a is not None else 0
+        parte['linhas_novo'] = linhas_n[idx_n] if idx_n is not None else 0
+        for col in colunas_valor:
+            antigo = somas_a[col][idx_a] if idx_a is not None else np.zeros(total)
+            novo = somas_n[col][idx_n] if idx_n is not None else np.zeros(total)
+            parte[f'{col}_antigo'] = antigo
+            parte[f'{col}_novo'] = novo
+            parte[f'delta_{col}'] = novo - antigo
+        return parte
+
+    resultado = pd.concat([
+        bloco(SITUACAO_NOVO, 'novo', primeira_n[idx_novos], None, idx_novos, len(idx_novos)),
+        bloco(SITUACAO_REMOVIDO, 'antigo', primeira_a[idx_removidos], idx_removidos, None, len(idx_removidos)),
+        bloco(SITUACAO_ALTERADO, 'novo', primeira_n[pos_n_alt], pos_a_alt, pos_n_alt, len(pos_n_alt)),
+    ], ignore_index=True)
+
+    resumo = {
+        SITUACAO_NOVO: len(idx_novos),
+        SITUACAO_REMOVIDO: len(idx_removidos),
+        SITUACAO_ALTERADO: int(alterado.sum()),
+        SITUACAO_MANTIDO: int(len(pos_a) - alterado.sum()),
+    }
+    for col in colunas_valor:
+        resumo[f'delta_{col}'] = float(somas_n[col].sum() - somas_a[col].sum())
+    return resultado, resumo
@@ -5,9 +5,14 @@ import os
 import numpy as np
 from datetime import datetime
 
+from utils import fingerprint_bytes, calcular_fingerprint, assinatura_filtros, detectar_formato_data, compactar_tipos
+from filtros import (garantir_categoricas, mascara_filtros, construir_indice_opcoes, opcoes_coluna, combinar_mascaras,
+                     construir_indice_datas, limites_indice_datas, mascara_periodo)
+from ingestao import detectar_dialeto_csv, ler_xlsx
+from tabelas import exibir_tabela_paginada, exibir_botoes_exportacao
+
 # --- Funções de Utilitário ---
 
-@st.cache_data
 def formatar_moeda(valor):
     """Formata um valor numérico para o padrão de moeda (R$ com separador de milhar e duas casas decimais)."""
     if pd.isna(valor):
@@ -57,23 +62,38 @@ def initialize_widget_state(key, options, initial_default_calc):
     if key not in st.session_state:
         st.session_state[key] = initial_default_calc
     
-def processar_dados_atuais(df_novo, colunas_filtros, colunas_valor):
-    """Salva o DataFrame processado e as colunas de filtro/valor na sessão."""
+def processar_dados_atuais(df_novo, colunas_filtros, colunas_valor, fingerprint):
+    """Salva o DataFrame processado, as colunas de filtro/valor e o fingerprint do dataset na sessão."""
+    # Colunas de filtro armazenadas como categóricas (códigos inteiros) para o motor de filtros
+    df_novo = garantir_categoricas(df_novo, colunas_filtros)
+    # Menor representação segura para as demais colunas (inteiros reduzidos, categorias, strings Arrow)
+    df_novo, memoria_antes, memoria_depois = compactar_tipos(df_novo, colunas_filtros)
+    st.session_state.relatorio_memoria = (memoria_antes, memoria_depois)
     st.session_state.dados_atuais = df_novo 
+    st.session_state.indice_opcoes = construir_indice_opcoes(df_novo, colunas_filtros) # Opções dos widgets de filtro
+    # Índice de datas ordenado (coluna, índice): o filtro de intervalo vira uma busca binária
+    colunas_data = encontrar_colunas_tipos(df_novo)[1]
+    st.session_state.indice_datas = (colunas_data[0], construir_indice_datas(df_novo[colunas_data[0]])) if colunas_data else None
     st.session_state.colunas_filtros_salvas = colunas_filtros
     st.session_state.colunas_valor_salvas = colunas_valor # AQUI SALVAMOS AS COLUNAS NUMÉRICAS FINAIS
+    st.session_state.fingerprint_dados = fingerprint # Chave dos caches de filtro (evita hashear o DF)
     return True, df_novo
 
 
 # --- OTIMIZAÇÃO CHAVE DE PERFORMANCE: Cache para processamento de dados ---
+# O DataFrame (prefixo '_') não é hasheado pelo Streamlit: a chave é o fingerprint do arquivo + as colunas.
 @st.cache_data(show_spinner="Processando e inferindo tipos de dados...")
-def inferir_e_converter_tipos(df, colunas_texto=None, colunas_moeda=None):
-    df_copy = df.copy() 
+def inferir_e_converter_tipos(_df, fingerprint, colunas_texto=None, colunas_moeda=None):
+    df_copy = _df.copy() 
     
     # Processa Colunas de Moeda (Força para float64)
     if colunas_moeda:
         for col in colunas_moeda:
             if col in df_copy.columns:
+                # Já numérica (o leitor de CSV aplicou decimal/milhar): só garante float64
+                if pd.api.types.is_numeric_dtype(df_copy[col]):
+                    df_copy[col] = df_copy[col].astype('float64')
+                    continue
                 try:
                     # Limpeza e conversão robusta
                     s = df_copy[col].astype(str).str.replace(r'[R$]', '', regex=True).str.replace('.', '', regex=False).str.replace(',', '.', regex=False).str.strip()
@@ -88,12 +108,14 @@ def inferir_e_converter_tipos(df, colunas_texto=None, colunas_moeda=None):
                 df_copy[col] = df_copy[col].fillna('').astype(str)
                 
     # Inferência de Data/Hora e String para o restante
+    # O formato é detectado numa amostra; só colunas confirmadas são convertidas (com formato explícito)
     for col in df_copy.columns:
         if col not in colunas_moeda and col not in colunas_texto:
-            if df_copy[col].dtype == 'object':
+            if pd.api.types.is_object_dtype(df_copy[col]) or pd.api.types.is_string_dtype(df_copy[col]):
                 try:
-                    df_temp = pd.to_datetime(df_copy[col], errors='coerce', dayfirst=True)
-                    if df_temp.notna().sum() > len(df_copy) * 0.5:
+                    formato_data = detectar_formato_data(df_copy[col])
+                    df_temp = pd.to_datetime(df_copy[col], format=formato_data, errors='coerce') if formato_data else None
+                    if df_temp is not None and df_temp.notna().sum() > len(df_copy) * 0.5:
                         df_copy[col] = df_temp
                     else:
                         df_copy[col] = df_copy[col].astype(str).fillna('')
@@ -128,6 +150,9 @@ if 'colunas_valor_salvas' not in st.session_state:
 if 'filtro_reset_trigger' not in st.session_state:
     st.session_state['filtro_reset_trigger'] = 0
 
+if 'fingerprint_dados' not in st.session_state:
+    st.session_state.fingerprint_dados = None
+
 
 # --- Barra Lateral: Upload e Configurações de Tipos (Layout Limpo e Funcional) ---
 with st.sidebar:
@@ -146,6 +171,15 @@ with st.sidebar:
 
     st.header("1. Upload e Processamento de Dados")
     
+    # Resultado do planejador de tipos no último processamento
+    if st.session_state.get('relatorio_memoria'):
+        memoria_antes, memoria_depois = st.session_state.relatorio_memoria
+        reducao = 1 - memoria_depois / memoria_antes if memoria_antes else 0
+        st.caption(
+            f"💾 Dados em memória: {memoria_antes / (1024 * 1024):,.1f} MB → "
+            f"{memoria_depois / (1024 * 1024):,.1f} MB ({reducao:.0%} menor)"
+        )
+    
     uploaded_file = st.file_uploader("📥 Carregar Novo CSV/XLSX", type=['csv', 'xlsx'])
     
     df_novo = pd.DataFrame()
@@ -155,14 +189,12 @@ with st.sidebar:
             # --- LEITURA DO ARQUIVO (ROBUSTA) ---
             if uploaded_file.name.endswith('.csv'):
                 uploaded_file.seek(0)
-                try:
-                    df_novo = pd.read_csv(uploaded_file, sep=';', decimal=',', encoding='utf-8')
-                except:
-                    uploaded_file.seek(0)
-                    df_novo = pd.read_csv(uploaded_file, sep=',', decimal='.', encoding='utf-8')
+                # Separador, decimal, milhar e encoding detectados numa amostra: o arquivo é lido uma única vez
+                df_novo = pd.read_csv(uploaded_file, **detectar_dialeto_csv(uploaded_file))
                     
             elif uploaded_file.name.endswith('.xlsx'):
-                df_novo = pd.read_excel(uploaded_file)
+                # Leitura somente leitura (linhas como tuplas de valores, sem o modelo de células do openpyxl)
+                df_novo = ler_xlsx(uploaded_file)
             
             # VERIFICAÇÃO DE DADOS CARREGADOS
             if df_novo.empty:
@@ -172,6 +204,12 @@ with st.sidebar:
             
             df_novo.columns = df_novo.columns.str.strip()
             colunas_disponiveis = df_novo.columns.tolist()
+            
+            # Fingerprint do arquivo: hash dos bytes calculado uma única vez por upload
+            if st.session_state.get('_fingerprint_upload_id') != uploaded_file.file_id:
+                st.session_state._fingerprint_upload = fingerprint_bytes(uploaded_file.getvalue())
+                st.session_state._fingerprint_upload_id = uploaded_file.file_id
+            fingerprints_arquivos = {uploaded_file.name: st.session_state._fingerprint_upload}
             st.info(f"Arquivo carregado! ({len(df_novo)} linhas)")
             
             # --- AJUSTE DE TIPOS E SELEÇÃO MANUAL DE COLUNAS ---
@@ -242,7 +280,7 @@ with st.sidebar:
                                            
             # Realiza o processamento e a conversão de tipos (usando cache)
             # PASSAMOS AS SELEÇÕES ATUAIS (colunas_moeda e colunas_texto)
-            df_processado = inferir_e_converter_tipos(df_novo, colunas_texto, colunas_moeda)
+            df_processado = inferir_e_converter_tipos(df_novo, calcular_fingerprint(fingerprints_arquivos), colunas_texto, colunas_moeda)
             
             # SELEÇÃO MANUAL DAS COLUNAS DE FILTRO (Categóricas)
             colunas_para_filtro_options = df_processado.select_dtypes(include=['object', 'category']).columns.tolist()
@@ -285,10 +323,16 @@ with st.sidebar:
                 elif not colunas_para_filtro:
                     st.warning("Selecione pelo menos uma coluna na seção 'Colunas para FILTROS' para prosseguir.")
                 else:
+                    fingerprint_dataset = calcular_fingerprint(fingerprints_arquivos, {
+                        'colunas_moeda': colunas_moeda,
+                        'colunas_texto': colunas_texto,
+                        'colunas_filtros': colunas_para_filtro,
+                    })
                     sucesso, df_processado_salvo = processar_dados_atuais( 
                         df_processado, 
                         colunas_para_filtro, 
-                        colunas_valor_dashboard # AGORA ESSA LISTA CONTÉM AS COLUNAS MOEDA CORRETAMENTE CONVERTIDAS
+                        colunas_valor_dashboard, # AGORA ESSA LISTA CONTÉM AS COLUNAS MOEDA CORRETAMENTE CONVERTIDAS
+                        fingerprint_dataset
                     )
                     
                     if sucesso:
@@ -316,8 +360,20 @@ else:
     colunas_categoricas_filtro = st.session_state.colunas_filtros_salvas
     colunas_numericas_salvas = st.session_state.colunas_valor_salvas
     
+    # Índice de opções (valores distintos ordenados + contagens) construído no processamento
+    if not st.session_state.get('indice_opcoes'):
+        st.session_state.indice_opcoes = construir_indice_opcoes(df_analise_base, colunas_categoricas_filtro)
+    indice_opcoes = st.session_state.indice_opcoes
+    
     _, colunas_data = encontrar_colunas_tipos(df_analise_base) 
 
+    # Índice de datas ordenado da coluna de data padrão (construído no processamento)
+    indice_datas = None
+    if colunas_data:
+        if not st.session_state.get('indice_datas') or st.session_state.indice_datas[0] != colunas_data[0]:
+            st.session_state.indice_datas = (colunas_data[0], construir_indice_datas(df_analise_base[colunas_data[0]]))
+        indice_datas = st.session_state.indice_datas[1]
+
     coluna_valor_principal = colunas_numericas_salvas[0] if colunas_numericas_salvas else None
     coluna_agrupamento_principal = colunas_categoricas_filtro[0] if colunas_categoricas_filtro else None
 
@@ -384,7 +440,7 @@ else:
         with cols_container[0]:
             for col in filtros_col_1:
                 if col not in df_analise_base.columns: continue
-                opcoes_unicas = sorted(df_analise_base[col].astype(str).fillna('').unique().tolist())
+                opcoes_unicas = opcoes_coluna(indice_opcoes, col)
                 with st.expander(f"**{col}** ({len(opcoes_unicas)} opções)"):
                     if f'filtro_key_{col}' not in st.session_state: st.session_state[f'filtro_key_{col}'] = []
                     selecao_padrao_form = st.session_state.get(f'filtro_key_{col}', [])
@@ -397,7 +453,7 @@ else:
         with cols_container[1]:
              for col in filtros_col_2:
                 if col not in df_analise_base.columns: continue
-                opcoes_unicas = sorted(df_analise_base[col].astype(str).fillna('').unique().tolist())
+                opcoes_unicas = opcoes_coluna(indice_opcoes, col)
                 with st.expander(f"**{col}** ({len(opcoes_unicas)} opções)"):
                     if f'filtro_key_{col}' not in st.session_state: st.session_state[f'filtro_key_{col}'] = []
                     selecao_padrao_form = st.session_state.get(f'filtro_key_{col}', [])
@@ -410,7 +466,7 @@ else:
         with cols_container[2]:
              for col in filtros_col_3:
                 if col not in df_analise_base.columns: continue
-                opcoes_unicas = sorted(df_analise_base[col].astype(str).fillna('').unique().tolist())
+                opcoes_unicas = opcoes_coluna(indice_opcoes, col)
                 with st.expander(f"**{col}** ({len(opcoes_unicas)} opções)"):
                     if f'filtro_key_{col}' not in st.session_state: st.session_state[f'filtro_key_{col}'] = []
                     selecao_padrao_form = st.session_state.get(f'filtro_key_{col}', [])
@@ -424,11 +480,10 @@ else:
         if colunas_data:
             st.markdown("---")
             col_data_padrao = colunas_data[0]
-            df_col_data = df_analise_base[col_data_padrao].dropna()
+            limites_data = limites_indice_datas(indice_datas) # Primeira/última posição do índice ordenado
             
-            if not df_col_data.empty and pd.notna(df_col_data.min()) and pd.notna(df_col_data.max()):
-                data_min = df_col_data.min()
-                data_max = df_col_data.max()
+            if limites_data is not None:
+                data_min, data_max = limites_data
                 try:
                     default_date_range = st.session_state.get(f'date_range_key_{col_data_padrao}', (data_min.to_pydatetime(), data_max.to_pydatetime()))
                     slider_key = f'slider_{col_data_padrao}_{st.session_state.filtro_reset_trigger}'
@@ -466,41 +521,23 @@ else:
     # ----------------------------------------------------
     
     # Cache garantido. O cache é invalidado apenas se os argumentos mudarem.
+    # O DataFrame (prefixo '_') não é hasheado: a chave é o fingerprint do dataset + a assinatura dos filtros.
     @st.cache_data(show_spinner="Aplicando filtros...")
-    def aplicar_filtros(df_base, col_filtros, filtros_ativos, col_data, data_range_ativo):
-        # Evitar cópia desnecessária se não houver filtro a aplicar (maior otimização)
-        filtro_aplicado = False
-        df_filtrado_temp = df_base
-        
-        for col in col_filtros:
-            selecao = filtros_ativos.get(col)
-            
-            # Se a seleção tem itens, aplica o filtro.
-            if selecao is not None and len(selecao) > 0 and col in df_filtrado_temp.columns: 
-                # Cópia só é feita se houver filtro
-                if not filtro_aplicado:
-                    df_filtrado_temp = df_base.copy()
-                    filtro_aplicado = True
-                    
-                df_filtrado_temp = df_filtrado_temp[df_filtrado_temp[col].astype(str).isin(selecao)]
-                
-        if data_range_ativo and len(data_range_ativo) == 2 and col_data and col_data[0] in df_filtrado_temp.columns:
-            # Cópia só é feita se houver filtro
-            if not filtro_aplicado:
-                df_filtrado_temp = df_base.copy()
-                filtro_aplicado = True
+    def aplicar_filtros(_df_base, _indice_opcoes, _indice_datas, fingerprint, col_filtros, assinatura, col_data, data_range_ativo):
+        df_base = _df_base
+        filtros_ativos = dict(assinatura)
+        # Máscara única (códigos inteiros + AND bit a bit); None = nenhum filtro categórico ativo
+        mascara = mascara_filtros(df_base, col_filtros, filtros_ativos, _indice_opcoes)
                 
-            col_data_padrao = col_data[0]
-            df_filtrado_temp = df_filtrado_temp[
-                (df_filtrado_temp[col_data_padrao] >= pd.to_datetime(data_range_ativo[0])) &
-                (df_filtrado_temp[col_data_padrao] <= pd.to_datetime(data_range_ativo[1]))
-            ]
+        if data_range_ativo and len(data_range_ativo) == 2 and col_data and _indice_datas is not None:
+            # Intervalo de datas = fatia do índice ordenado (searchsorted), sem comparar a coluna inteira
+            mascara = combinar_mascaras(mascara, mascara_periodo(_indice_datas, data_range_ativo[0], data_range_ativo[1]))
         
         # Se nenhum filtro foi aplicado, retorna o DF base (sem cópia)
-        if not filtro_aplicado:
+        if mascara is None:
              return df_base
              
-        return df_filtrado_temp
+        return df_base[mascara]
 
     # Monta a lista de filtros ativos (seleções atuais)
     filtros_ativos = {}
@@ -514,8 +551,11 @@ else:
     # Aplica os filtros (com cache)
     df_analise = aplicar_filtros(
         df_analise_base, 
+        indice_opcoes,
+        indice_datas,
+        st.session_state.fingerprint_dados,
         colunas_categoricas_filtro, 
-        filtros_ativos, 
+        assinatura_filtros(filtros_ativos), 
         colunas_data, 
         data_range_ativo
     )
@@ -683,29 +723,19 @@ else:
     st.markdown("---")
     st.subheader("🔍 Detalhes dos Dados Filtrados")
     
-    df_exibicao = df_analise.copy()
-    
-    # Formatação de Moeda
-    for col in colunas_numericas_salvas: 
-        if col in df_exibicao.columns:
-            if any(word in col.lower() for word in ['valor', 'salario', 'custo', 'receita']):
-                df_exibicao[col] = df_exibicao[col].apply(formatar_moeda)
-    
-    # CHAVE DE OTIMIZAÇÃO: LIMITAR O NÚMERO DE LINHAS EXIBIDAS
-    max_linhas_exibidas = 1000
-    if len(df_exibicao) > max_linhas_exibidas:
-        df_exibicao_limitado = df_exibicao.head(max_linhas_exibidas)
-        st.info(f"Exibindo apenas as primeiras {max_linhas_exibidas} linhas para evitar travamento. Baixe o CSV para ver todos os {len(df_exibicao)} registros.")
-    else:
-        df_exibicao_limitado = df_exibicao
-        
-    st.dataframe(df_exibicao_limitado, use_container_width=True, hide_index=True)
-
-    # Botão de download (usa o DF COMPLETO)
-    csv_data = df_analise.to_csv(index=False, sep=';', decimal=',', encoding='utf-8')
-    st.download_button(
-        label="📥 Baixar Dados Tratados (CSV)",
-        data=csv_data,
-        file_name=f'dados_analise_exportados_{datetime.now().strftime("%Y%m%d_%H%M")}.csv',
-        mime='text/csv',
+    # Paginada: só a página atual é fatiada e formatada (moeda em BRL); a ordenação usa um índice argsort
+    colunas_moeda_detalhe = [col for col in colunas_numericas_salvas if any(word in col.lower() for word in ['valor', 'salario', 'custo', 'receita'])]
+    exibir_tabela_paginada(
+        df_analise,
+        'detalhes',
+        assinatura=(st.session_state.fingerprint_dados, assinatura_filtros(filtros_ativos), str(data_range_ativo)),
+        colunas_moeda=colunas_moeda_detalhe
+    )
+
+    # Botões de download (usam o DF filtrado COMPLETO); o arquivo só é gerado no clique
+    exibir_botoes_exportacao(
+        df_analise,
+        'detalhes',
+        f'dados_analise_exportados_{datetime.now().strftime("%Y%m%d_%H%M")}',
+        rotulo="📥 Baixar Dados Tratados"
     )
@@ -0,0 +1,110 @@
+# bench_inferencia_tipos.py - Custo por coluna de utils.inferir_e_converter_tipos num DataFrame de folha com 1M de linhas
+
+"""
+Mede o custo por coluna de utils.inferir_e_converter_tipos num DataFrame sintético de folha.
+
+Uso (na raiz do projeto):
+  python benchmarks/bench_inferencia_tipos.py [--linhas 1000000] [--com-referencia]
+
+--com-referencia também mede a implementação anterior (linha a linha, com .apply por célula) para comparação.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import inferir_e_converter_tipos
+
+COLUNAS_TEXTO = ['nr_func', 'nome_funcionario', 'emp', 'eve', 'seq', 't', 'descricao_evento', 'ano', 'mes']
+COLUNAS_MOEDA = ['valor']
+
+
+def gerar_folha(linhas, semente=0):
+    """DataFrame como lido de um CSV de folha (';', valores BRL em texto), com 'linhas' linhas."""
+    rng = np.random.default_rng(semente)
+    funcionarios = rng.integers(1, 5_000, linhas)
+    eventos = rng.choice([100, 200, 300, 400, 500, 600], linhas)
+    valores = rng.random(linhas) * 10_000
+    return pd.DataFrame({
+        'nr_func': funcionarios,
+        'nome_funcionario': pd.Series(funcionarios).map(lambda n: f"Func {n} ").to_numpy(dtype=object),
+        'emp': rng.integers(1, 5, linhas),
+        'eve': eventos,
+        'seq': rng.integers(1, 3, linhas),
+        't': rng.choice(['C', 'D'], linhas).astype(object),
+        'descricao_evento': pd.Series(eventos).map({100: 'Salario', 200: 'Hora extra', 300: 'INSS', 400: 'IRRF', 500: 'Vale transporte', 600: 'Ferias'}).to_numpy(dtype=object),
+        'ano': np.full(linhas, 2024),
+        'mes': rng.integers(1, 13, linhas),
+        'valor': np.char.replace(np.char.mod('%.2f', valores), '.', ',').astype(object),
+        'horas': rng.integers(0, 220, linhas).astype(float),
+        'codigo_texto': rng.integers(1, 100, linhas).astype(str).astype(object),
+    })
+
+
+def referencia_linha_a_linha(df, colunas_texto, colunas_moeda):
+    """Implementação anterior de inferir_e_converter_tipos (mantida aqui só para comparação)."""
+    df_novo = df.copy()
+    for col in df_novo.columns:
+        if col in colunas_moeda:
+            df_novo[col] = df_novo[col].astype(str).str.strip().str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+            df_novo[col] = pd.to_numeric(df_novo[col], errors='coerce')
+        elif col in colunas_texto:
+            df_novo[col] = df_novo[col].astype('object')
+        elif df_novo[col].dtype not in ['datetime64[ns]']:
+            try:
+                if df_novo[col].dropna().apply(lambda x: float(x).is_integer()).all():
+                    df_novo[col] = pd.to_numeric(df_novo[col], errors='coerce', downcast='integer')
+                else:
+                    df_novo[col] = pd.to_numeric(df_novo[col], errors='coerce')
+            except Exception:
+                pass
+    for col in df_novo.select_dtypes(include=['object']):
+        df_novo[col] = df_novo[col].astype(str).str.strip().str.upper().astype('category')
+    return df_novo
+
+
+def medir(funcao, df, col):
+    """Segundos para converter só a coluna 'col' (mesmas listas de texto/moeda do processamento real)."""
+    parcial = df[[col]]
+    inicio = time.perf_counter()
+    funcao(parcial, COLUNAS_TEXTO, COLUNAS_MOEDA)
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    parser.add_argument('--com-referencia', action='store_true')
+    args = parser.parse_args()
+
+    df = gerar_folha(args.linhas)
+    print(f"DataFrame: {len(df):,} linhas x {len(df.columns)} colunas\n")
+
+    resultados = []
+    for col in df.columns:
+        linha = {'coluna': col, 'tipo_entrada': str(df[col].dtype), 'vetorizada_s': medir(inferir_e_converter_tipos, df, col)}
+        if args.com_referencia:
+            linha['referencia_s'] = medir(referencia_linha_a_linha, df, col)
+            linha['ganho'] = linha['referencia_s'] / linha['vetorizada_s']
+        resultados.append(linha)
+
+    inicio = time.perf_counter()
+    inferir_e_converter_tipos(df, COLUNAS_TEXTO, COLUNAS_MOEDA)
+    total = time.perf_counter() - inicio
+
+    tabela = pd.DataFrame(resultados).set_index('coluna')
+    print(tabela.to_string(float_format=lambda v: f"{v:.3f}"))
+    print(f"\nDataFrame inteiro (vetorizada): {total:.3f} s")
+    if args.com_referencia:
+        inicio = time.perf_counter()
+        referencia_linha_a_linha(df, COLUNAS_TEXTO, COLUNAS_MOEDA)
+        print(f"DataFrame inteiro (referência): {time.perf_counter() - inicio:.3f} s")
+
+
+if __name__ == '__main__':
+    main()
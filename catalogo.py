@@ -0,0 +1,439 @@
+# catalogo.py - Catálogo colunar de datasets (um arquivo Parquet por dataset + manifesto JSON)
+
+import os
+import re
+import json
+import pickle
+import uuid
+import hashlib
+import threading
+from datetime import datetime
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CATALOG_DIR = os.path.join('data', 'catalog') # Onde os arquivos Parquet e o manifesto são salvos
+MANIFEST_FILE = 'manifest.json'
+LEGACY_PICKLE_PATH = os.path.join('data', 'data_sets_catalog.pkl') # Formato antigo (pickle monolítico)
+PARQUET_COMPRESSION = 'zstd'
+MAX_DATASETS_RESIDENTES = 3 # Quantos DataFrames hidratados ficam em memória por processo
+
+# Metadados copiados da entrada do catálogo para o manifesto (tudo exceto o DataFrame)
+CAMPOS_METADADOS = ['colunas_filtros_salvas', 'colunas_valor_salvas', 'main_metric_type', 'memoria_bytes', 'colunas_centavos']
+
+_lock_manifesto = threading.Lock()
+
+
+def _nome_arquivo_dataset(nome):
+    """
+    Gera um nome de arquivo seguro para o dataset (slug + hash curto do nome + versão).
+    Cada gravação usa uma versão nova: os arquivos da entrada atual do manifesto nunca são sobrescritos,
+    e os anexos (que herdam o nome do arquivo) acompanham a mesma versão.
+    """
+    slug = re.sub(r'[^a-zA-Z0-9]+', '_', nome).strip('_').lower()[:60] or 'dataset'
+    sufixo = hashlib.sha1(nome.encode('utf-8')).hexdigest()[:8]
+    return f"{slug}_{sufixo}_{uuid.uuid4().hex[:12]}.parquet"
+
+
+def calcular_hash_conteudo(df):
+    """
+    Hash estável do conteúdo de um DataFrame (colunas + valores). Usado como fingerprint apenas
+    quando o dataset não traz um calculado na ingestão (ex.: migração do pickle antigo).
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps([str(c) for c in df.columns]).encode('utf-8'))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _gravar_atomicamente(caminho, escrever):
+    """Escreve em um arquivo temporário e o move para o destino final (evita arquivos corrompidos)."""
+    caminho_tmp = f"{caminho}.tmp"
+    try:
+        escrever(caminho_tmp)
+        os.replace(caminho_tmp, caminho)
+    finally:
+        if os.path.exists(caminho_tmp):
+            os.remove(caminho_tmp)
+
+
+class CatalogoColunar:
+    """
+    Catálogo de datasets persistido em disco: cada DataFrame é salvo em seu próprio
+    arquivo Parquet comprimido e um manifesto JSON pequeno guarda os metadados.
+    Salvar um dataset grava apenas aquele dataset; carregar pode ler só as colunas necessárias.
+    """
+
+    def __init__(self, diretorio=CATALOG_DIR):
+        self.diretorio = diretorio
+
+    @property
+    def caminho_manifesto(self):
+        return os.path.join(self.diretorio, MANIFEST_FILE)
+
+    def caminho_dataset(self, nome):
+        """Retorna o caminho do arquivo Parquet de um dataset do manifesto."""
+        entrada = self.ler_manifesto().get(nome)
+        if entrada is None:
+            raise KeyError(nome)
+        return os.path.join(self.diretorio, entrada['arquivo'])
+
+    def ler_manifesto(self):
+        """Lê o manifesto (nome -> metadados). Retorna {} se não existir ou estiver ilegível."""
+        if not os.path.exists(self.caminho_manifesto):
+            return {}
+        try:
+            with open(self.caminho_manifesto, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _gravar_manifesto(self, manifesto):
+        os.makedirs(self.diretorio, exist_ok=True)
+
+        def escrever(caminho):
+            with open(caminho, 'w', encoding='utf-8') as f:
+                json.dump(manifesto, f, ensure_ascii=False, indent=2)
+
+        _gravar_atomicamente(self.caminho_manifesto, escrever)
+
+    def _gravar_anexo(self, arquivo_base, tipo, conteudo):
+        """Grava um anexo do dataset (DataFrame -> Parquet, demais -> JSON) e retorna o nome do arquivo."""
+        raiz = os.path.splitext(arquivo_base)[0]
+        if isinstance(conteudo, pd.DataFrame):
+            arquivo = f"{raiz}.{tipo}.parquet"
+            escrever = lambda c: conteudo.to_parquet(c, engine='pyarrow', compression=PARQUET_COMPRESSION, index=False)
+        else:
+            arquivo = f"{raiz}.{tipo}.json"
+            def escrever(c):
+                with open(c, 'w', encoding='utf-8') as f:
+                    json.dump(conteudo, f, ensure_ascii=False)
+        _gravar_atomicamente(os.path.join(self.diretorio, arquivo), escrever)
+        return arquivo
+
+    def salvar_dataset(self, nome, df, metadados, anexos=None):
+        """
+        Grava o DataFrame em seu próprio arquivo Parquet e registra a entrada no manifesto.
+        Os demais datasets do catálogo não são lidos nem regravados. Substituir um dataset é atômico:
+        os arquivos novos ficam ao lado dos atuais e a troca acontece na gravação do manifesto.
+        'anexos' (tipo -> DataFrame ou objeto JSON) são estruturas derivadas persistidas junto
+        ao dataset (ex.: índice de opções dos filtros).
+        """
+        os.makedirs(self.diretorio, exist_ok=True)
+        arquivo = _nome_arquivo_dataset(nome)
+        caminho = os.path.join(self.diretorio, arquivo)
+
+        _gravar_atomicamente(
+            caminho,
+            lambda c: df.to_parquet(c, engine='pyarrow', compression=PARQUET_COMPRESSION, index=False)
+        )
+        return self._registrar_entrada(
+            nome, arquivo, len(df), df.dtypes, metadados, anexos,
+            metadados.get('fingerprint') or calcular_hash_conteudo(df)
+        )
+
+    def iniciar_dataset(self, nome):
+        """
+        Abre um EscritorDataset para gravar o dataset em blocos (ingestão em streaming).
+        O dataset só entra no manifesto quando o escritor é concluído.
+        """
+        os.makedirs(self.diretorio, exist_ok=True)
+        return EscritorDataset(self, nome, _nome_arquivo_dataset(nome))
+
+    def _registrar_entrada(self, nome, arquivo, linhas, tipos, metadados, anexos, fingerprint):
+        """
+        Grava os anexos e registra (ou substitui) a entrada do dataset no manifesto. Até a gravação do manifesto
+        quem lê o catálogo continua vendo a versão anterior completa (dados e anexos); os arquivos dela
+        são removidos só depois da troca.
+        """
+        arquivos_anexos = {}
+        try:
+            for tipo, conteudo in (anexos or {}).items():
+                arquivos_anexos[tipo] = self._gravar_anexo(arquivo, tipo, conteudo)
+
+            entrada = {campo: metadados.get(campo) for campo in CAMPOS_METADADOS}
+            entrada.update({
+                'arquivo': arquivo,
+                'linhas': int(linhas),
+                'colunas': [str(c) for c in tipos.index],
+                'tipos': {str(c): str(t) for c, t in tipos.items()},
+                'anexos': arquivos_anexos,
+                'tamanho_bytes': os.path.getsize(os.path.join(self.diretorio, arquivo)),
+                'fingerprint': fingerprint,
+                'criado_em': datetime.now().isoformat(timespec='seconds'),
+            })
+
+            with _lock_manifesto:
+                manifesto = self.ler_manifesto()
+                anterior = manifesto.get(nome)
+                manifesto[nome] = entrada
+                self._gravar_manifesto(manifesto)
+        except BaseException:
+            # A versão nova não chegou ao manifesto: seus arquivos são descartados
+            self._remover_arquivos({'arquivo': arquivo, 'anexos': arquivos_anexos})
+            raise
+
+        if anterior is not None:
+            self._remover_arquivos(anterior, manter=[arquivo] + list(arquivos_anexos.values()))
+        return entrada
+
+    def _remover_arquivos(self, entrada, manter=()):
+        """Remove do disco o arquivo de dados e os anexos de uma entrada do manifesto (exceto os de 'manter')."""
+        for arquivo in [entrada['arquivo']] + list(entrada.get('anexos', {}).values()):
+            caminho = os.path.join(self.diretorio, arquivo)
+            if arquivo not in manter and os.path.exists(caminho):
+                os.remove(caminho)
+
+    def carregar_dataset(self, nome, colunas=None):
+        """
+        Lê o DataFrame de um dataset do catálogo.
+        Se 'colunas' for informado, apenas essas colunas (as que existirem) são lidas do disco.
+        """
+        entrada = self.ler_manifesto().get(nome)
+        if entrada is None:
+            raise KeyError(nome)
+
+        if colunas is not None:
+            colunas = [c for c in entrada['colunas'] if c in set(colunas)]
+
+        return pd.read_parquet(os.path.join(self.diretorio, entrada['arquivo']), columns=colunas, engine='pyarrow')
+
+    def carregar_anexo(self, nome, tipo):
+        """Lê um anexo do dataset. Retorna None se o dataset não tiver esse anexo."""
+        entrada = self.ler_manifesto().get(nome)
+        if entrada is None:
+            raise KeyError(nome)
+        arquivo = entrada.get('anexos', {}).get(tipo)
+        if arquivo is None:
+            return None
+
+        caminho = os.path.join(self.diretorio, arquivo)
+        if arquivo.endswith('.parquet'):
+            return pd.read_parquet(caminho, engine='pyarrow')
+        with open(caminho, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def remover_dataset(self, nome):
+        """Remove os arquivos do dataset (e anexos) e sua entrada no manifesto."""
+        with _lock_manifesto:
+            manifesto = self.ler_manifesto()
+            entrada = manifesto.pop(nome, None)
+            if entrada is None:
+                return
+            self._gravar_manifesto(manifesto)
+
+        self._remover_arquivos(entrada)
+
+    def limpar(self):
+        """Remove todos os arquivos do catálogo (datasets e manifesto)."""
+        with _lock_manifesto:
+            if not os.path.isdir(self.diretorio):
+                return
+            for arquivo in os.listdir(self.diretorio):
+                os.remove(os.path.join(self.diretorio, arquivo))
+
+    def migrar_pickle_legado(self, caminho=LEGACY_PICKLE_PATH):
+        """
+        Converte o catálogo antigo (um único pickle com todos os DataFrames) para o formato colunar.
+        O pickle é removido após a migração bem-sucedida.
+        """
+        if not os.path.exists(caminho):
+            return []
+        try:
+            with open(caminho, 'rb') as f:
+                catalogo_antigo = pickle.load(f)
+        except Exception:
+            return []
+
+        migrados = []
+        for nome, dados in catalogo_antigo.items():
+            if isinstance(dados, dict) and isinstance(dados.get('df'), pd.DataFrame):
+                self.salvar_dataset(nome, dados['df'], dados)
+                migrados.append(nome)
+
+        os.remove(caminho)
+        return migrados
+
+
+def _esquema_para_blocos(esquema):
+    """
+    Esquema do primeiro bloco com os índices dos dicionários (colunas categóricas) em int32: o pandas usa
+    o menor inteiro que cabe nas categorias do bloco (int8 até 127), e os blocos seguintes podem ter mais.
+    """
+    campos = [
+        campo.with_type(pa.dictionary(pa.int32(), campo.type.value_type, campo.type.ordered))
+        if pa.types.is_dictionary(campo.type) else campo
+        for campo in esquema
+    ]
+    return pa.schema(campos, metadata=esquema.metadata)
+
+
+class EscritorDataset:
+    """
+    Grava um dataset do catálogo bloco a bloco (um row group Parquet por bloco), mantendo em memória
+    apenas o bloco atual. O esquema é fixado pelo primeiro bloco; os seguintes são alinhados a ele
+    (colunas categóricas podem trazer dicionários diferentes, e de qualquer tamanho, em cada bloco).
+    O arquivo é escrito em um temporário e só vai para o destino (uma versão nova, ver _nome_arquivo_dataset)
+    em concluir(), logo antes do registro no manifesto; use como context manager para descartar o temporário
+    em caso de erro.
+    """
+
+    def __init__(self, catalogo, nome, arquivo):
+        self.catalogo = catalogo
+        self.nome = nome
+        self.arquivo = arquivo
+        self.caminho = os.path.join(catalogo.diretorio, arquivo)
+        self.caminho_tmp = f"{self.caminho}.tmp"
+        self.linhas = 0
+        self.tipos = None
+        self._escritor = None
+        self._esquema = None
+        self._hash = hashlib.blake2b(digest_size=16)
+
+    def escrever(self, df):
+        """Acrescenta um bloco ao arquivo do dataset."""
+        if self._escritor is None:
+            self._esquema = _esquema_para_blocos(pa.Schema.from_pandas(df, preserve_index=False))
+            tabela = pa.Table.from_pandas(df, schema=self._esquema, preserve_index=False)
+            self.tipos = df.dtypes
+            self._escritor = pq.ParquetWriter(self.caminho_tmp, self._esquema, compression=PARQUET_COMPRESSION)
+            self._hash.update(json.dumps([str(c) for c in df.columns]).encode('utf-8'))
+        else:
+            df = df.reindex(columns=self._esquema.names)
+            tabela = pa.Table.from_pandas(df, schema=self._esquema, preserve_index=False)
+        self._escritor.write_table(tabela)
+        self._hash.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+        self.linhas += len(df)
+
+    def concluir(self, metadados, anexos=None):
+        """Fecha o arquivo, move-o para o destino final e registra o dataset no manifesto."""
+        if self._escritor is None:
+            raise ValueError(f"Nenhum bloco gravado para o dataset '{self.nome}'.")
+        self._escritor.close()
+        self._escritor = None
+        os.replace(self.caminho_tmp, self.caminho)
+        return self.catalogo._registrar_entrada(
+            self.nome, self.arquivo, self.linhas, self.tipos, metadados, anexos,
+            metadados.get('fingerprint') or self._hash.hexdigest()
+        )
+
+    def cancelar(self):
+        """Descarta o arquivo temporário (o catálogo não é alterado)."""
+        if self._escritor is not None:
+            self._escritor.close()
+            self._escritor = None
+        if os.path.exists(self.caminho_tmp):
+            os.remove(self.caminho_tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_excecao, excecao, rastreamento):
+        self.cancelar()
+        return False
+
+
+class RegistroDatasets:
+    """
+    Registro de datasets somente leitura, compartilhado por todas as sessões do processo.
+    Cada DataFrame é hidratado uma única vez por (nome, fingerprint) e entregue sem cópia;
+    as sessões guardam apenas o nome do dataset ativo e o estado dos filtros.
+    No máximo 'limite' DataFrames ficam residentes (o menos usado recentemente é descartado).
+
+    IMPORTANTE: os DataFrames devolvidos são compartilhados e NÃO devem ser alterados in-place.
+    """
+
+    def __init__(self, catalogo, limite=MAX_DATASETS_RESIDENTES):
+        self.catalogo = catalogo
+        self.limite = limite
+        self._datasets = OrderedDict()
+        self._anexos = OrderedDict()
+        self._manifesto = {}
+        self._mtime_manifesto = None
+        self._lock = threading.Lock()
+
+    def manifesto(self):
+        """Retorna o manifesto do catálogo, relendo o arquivo apenas quando ele muda no disco."""
+        caminho = self.catalogo.caminho_manifesto
+        mtime = os.path.getmtime(caminho) if os.path.exists(caminho) else None
+        with self._lock:
+            if mtime != self._mtime_manifesto:
+                self._manifesto = self.catalogo.ler_manifesto()
+                self._mtime_manifesto = mtime
+            return self._manifesto
+
+    def _chave(self, nome):
+        entrada = self.manifesto().get(nome)
+        if entrada is None:
+            raise KeyError(nome)
+        return (nome, entrada.get('fingerprint'))
+
+    def obter(self, nome, colunas=None):
+        """Retorna o DataFrame compartilhado do dataset, lendo do disco (somente 'colunas') se necessário."""
+        chave = self._chave(nome)
+        with self._lock:
+            if chave in self._datasets:
+                self._datasets.move_to_end(chave)
+                return self._datasets[chave]
+
+        df = self.catalogo.carregar_dataset(nome, colunas)
+        self._guardar(chave, df, self._datasets)
+        return df
+
+    def obter_colunas(self, nome, colunas):
+        """
+        Retorna só 'colunas' do dataset (as que existirem): do DataFrame residente, se estiver em memória
+        (seleção rasa, sem copiar os dados), ou lidas do Parquet apenas essas colunas, sem hidratar o registro.
+        """
+        chave = self._chave(nome)
+        with self._lock:
+            df = self._datasets.get(chave)
+        if df is not None and all(col in df.columns for col in colunas if col in self.manifesto()[nome]['colunas']):
+            return df[[col for col in colunas if col in df.columns]]
+        return self.catalogo.carregar_dataset(nome, colunas)
+
+    def obter_anexo(self, nome, tipo):
+        """Retorna um anexo compartilhado do dataset (ex.: índice de opções), lendo do disco se necessário."""
+        chave = self._chave(nome) + (tipo,)
+        with self._lock:
+            if chave in self._anexos:
+                self._anexos.move_to_end(chave)
+                return self._anexos[chave]
+
+        anexo = self.catalogo.carregar_anexo(nome, tipo)
+        self._guardar(chave, anexo, self._anexos)
+        return anexo
+
+    def registrar(self, nome, df, anexos=None):
+        """Coloca no registro um DataFrame (e anexos) recém-salvo no catálogo (evita relê-lo do disco)."""
+        chave = self._chave(nome)
+        self._guardar(chave, df, self._datasets)
+        for tipo, anexo in (anexos or {}).items():
+            self._guardar(chave + (tipo,), anexo, self._anexos)
+
+    def _guardar(self, chave, objeto, destino):
+        with self._lock:
+            # Versões antigas do mesmo dataset (fingerprint diferente) deixam de ser servidas
+            for chave_antiga in [c for c in destino if c[0] == chave[0] and c[1] != chave[1]]:
+                del destino[chave_antiga]
+            destino[chave] = objeto
+            destino.move_to_end(chave)
+            # Anexos são pequenos (índices, cubos): cabem alguns por dataset residente
+            limite = self.limite if destino is self._datasets else self.limite * 4
+            while len(destino) > limite:
+                destino.popitem(last=False)
+
+    def descartar(self, nome=None):
+        """Remove um dataset do registro (ou todos, se 'nome' for None)."""
+        with self._lock:
+            for destino in (self._datasets, self._anexos):
+                for chave in [c for c in destino if nome is None or c[0] == nome]:
+                    del destino[chave]
+            self._mtime_manifesto = None
+
+    def residentes(self):
+        """Chaves (nome, fingerprint) dos datasets em memória, do menos ao mais recente."""
+        with self._lock:
+            return list(self._datasets.keys())
@@ -5,9 +5,9 @@ import pandas as pd
 import plotly.express as px
 import os
 import numpy as np
+import multiprocessing
 from datetime import datetime
-from io import BytesIO
-import pickle 
+from concurrent.futures import ProcessPoolExecutor
 
 # ==============================================================================
 # IMPORTAÇÃO DE FUNÇÕES ESSENCIAIS DO UTILS.PY
@@ -15,42 +15,272 @@ import pickle
 try:
     from utils import (
         formatar_moeda, 
+        formatar_moeda_series,
+        formatar_numero_series,
         inferir_e_converter_tipos, 
         encontrar_colunas_tipos, 
         verificar_ausentes,
-        gerar_rotulo_filtro 
+        gerar_rotulo_filtro,
+        calcular_fingerprint,
+        assinatura_filtros,
+        compactar_tipos,
+        centavos_para_reais,
+        reais_para_exibicao
     )
 except ImportError:
     st.error("ERRO CRÍTICO: O arquivo 'utils.py' não foi encontrado. Certifique-se de que ele está no mesmo diretório do 'app.py' e que copiou o código completo fornecido.")
     st.stop()
+
+try:
+    from filtros import (
+        garantir_categoricas, 
+        mascaras_comparacao, 
+        posicoes_de_mascara, 
+        contar_linhas, 
+        selecionar_linhas, 
+        construir_indice_opcoes, 
+        combinar_indices_opcoes, 
+        opcoes_coluna,
+        combinar_mascaras,
+        coluna_data_principal,
+        construir_indice_datas,
+        limites_indice_datas,
+        mascara_periodo,
+        mascara_filtros
+    )
+except ImportError:
+    st.error("ERRO CRÍTICO: O arquivo 'filtros.py' não foi encontrado. Certifique-se de que ele está no mesmo diretório do 'app.py'.")
+    st.stop()
+
+try:
+    from analises import (
+        construir_cubo, 
+        combinar_cubos, 
+        cubo_atende_filtros, 
+        kpis_do_cubo, 
+        calcular_venc_desc, 
+        variacao_por_grupo, 
+        variacao_por_grupo_no_cubo, 
+        indices_top_n, 
+        coortes_por_dimensao, 
+        coortes_por_posicoes, 
+        metricas_por_coorte, 
+        diferenca_datasets, 
+        CHAVES_DIFERENCA, 
+        SITUACAO_ALTERADO, 
+        SITUACAO_NOVO, 
+        SITUACAO_REMOVIDO, 
+        SITUACAO_MANTIDO
+    )
+except ImportError:
+    st.error("ERRO CRÍTICO: O arquivo 'analises.py' não foi encontrado. Certifique-se de que ele está no mesmo diretório do 'app.py'.")
+    st.stop()
+
+try:
+    from catalogo import CatalogoColunar, RegistroDatasets, CATALOG_DIR, MAX_DATASETS_RESIDENTES
+except ImportError:
+    st.error("ERRO CRÍTICO: O arquivo 'catalogo.py' não foi encontrado ou o pacote 'pyarrow' não está instalado (pip install -r requirements.txt).")
+    st.stop()
+
+try:
+    from ingestao import (
+        UPLOAD_DIR, 
+        LINHAS_POR_BLOCO, 
+        LINHAS_PREVIEW, 
+        MAX_PROCESSOS_INGESTAO, 
+        salvar_upload, 
+        remover_uploads, 
+        usar_modo_em_blocos, 
+        ler_e_normalizar_arquivo, 
+        converter_arquivo, 
+        mapear_em_paralelo, 
+        colunas_alinhadas, 
+        concatenar_alinhado, 
+        plano_de_tipos, 
+        ingerir_em_blocos
+    )
+except ImportError:
+    st.error("ERRO CRÍTICO: O arquivo 'ingestao.py' não foi encontrado. Certifique-se de que ele está no mesmo diretório do 'app.py'.")
+    st.stop()
+
+try:
+    from tarefas import RegistroTarefas, MAX_TAREFAS_SIMULTANEAS, ESTADO_CONCLUIDA, ESTADO_ERRO, ESTADOS_FINAIS
+except ImportError:
+    st.error("ERRO CRÍTICO: O arquivo 'tarefas.py' não foi encontrado. Certifique-se de que ele está no mesmo diretório do 'app.py'.")
+    st.stop()
+
+try:
+    from tabelas import exibir_tabela_paginada, exibir_botoes_exportacao
+except ImportError:
+    st.error("ERRO CRÍTICO: O arquivo 'tabelas.py' não foi encontrado. Certifique-se de que ele está no mesmo diretório do 'app.py'.")
+    st.stop()
 # ==============================================================================
 
 # --- Configuração da Página e Persistência ---
 st.set_page_config(layout="wide", page_title="Sistema de Análise de Indicadores Expert")
-PERSISTENCE_PATH = 'data/data_sets_catalog.pkl' # Onde os DataFrames e metadados serão salvos
+catalogo_colunar = CatalogoColunar(CATALOG_DIR) # Um arquivo Parquet por dataset + manifesto JSON
+
+INTERVALO_ATUALIZACAO_TAREFAS = 1.0 # Segundos entre atualizações do painel de tarefas em andamento
+
+# Colunas lidas do disco ao ativar um dataset (além das de filtro, valor e data); as demais ficam só no Parquet
+# e são lidas à parte para as tabelas de detalhe e as exportações (get_active_detail_df)
+COLUNAS_ANALISE_FIXAS = ['nome_funcionario', 't', 'valor', 'nr_func', 'emp', 'eve', 'seq', 'descricao_evento', 'ano', 'mes']
 
 # ==============================================================================
 # FUNÇÕES DE GERENCIAMENTO DE ESTADO E PERSISTÊNCIA
 # ==============================================================================
 
+def colunas_necessarias(entrada_manifesto):
+    """Retorna as colunas que o dashboard usa de um dataset (filtros, valores, datas e colunas críticas)."""
+    colunas_data = [col for col, tipo in entrada_manifesto.get('tipos', {}).items() if tipo.startswith('datetime')]
+    return (
+        list(entrada_manifesto.get('colunas_filtros_salvas') or []) +
+        list(entrada_manifesto.get('colunas_valor_salvas') or []) +
+        colunas_data +
+        COLUNAS_ANALISE_FIXAS
+    )
+
+@st.cache_resource
+def get_process_pool():
+    """Pool de processos do servidor para ler e converter vários arquivos em paralelo (criado uma única vez)."""
+    # 'spawn': o servidor do Streamlit tem várias threads, e fork + threads pode travar os processos filhos
+    return ProcessPoolExecutor(
+        max_workers=max(1, min(MAX_PROCESSOS_INGESTAO, os.cpu_count() or 1)),
+        mp_context=multiprocessing.get_context('spawn')
+    )
+
+@st.cache_resource
+def get_job_registry():
+    """Tarefas de ingestão em segundo plano do servidor (sobrevivem a recarregar a página; criado uma única vez)."""
+    return RegistroTarefas(MAX_TAREFAS_SIMULTANEAS)
+
+@st.cache_resource
+def get_dataset_registry():
+    """Registro de datasets somente leitura, compartilhado (sem cópias) por todas as sessões do processo."""
+    try:
+        catalogo_colunar.migrar_pickle_legado()
+    except Exception as e:
+        st.sidebar.error(f"Erro ao migrar o catálogo antigo: {e}")
+    return RegistroDatasets(catalogo_colunar, MAX_DATASETS_RESIDENTES)
+
 def load_catalog():
-    """Carrega o catálogo de datasets salvos do disco."""
-    if os.path.exists(PERSISTENCE_PATH):
-        try:
-            with open(PERSISTENCE_PATH, 'rb') as f:
-                return pickle.load(f)
-        except Exception:
-            return {}
-    return {}
-
-def save_catalog(catalog):
-    """Salva o catálogo de datasets no disco."""
+    """
+    Retorna o manifesto do catálogo (nome, linhas, colunas, tipo de métrica, tamanho, hash).
+    O manifesto é compartilhado pelo processo: use apenas para leitura.
+    """
+    try:
+        return get_dataset_registry().manifesto()
+    except Exception as e:
+        st.sidebar.error(f"Erro ao carregar o catálogo: {e}")
+        return {}
+
+def load_dataset_df(dataset_name):
+    """Retorna o DataFrame compartilhado de um dataset do catálogo (hidratado sob demanda, sem cópia)."""
+    entrada = load_catalog().get(dataset_name)
+    if entrada is None:
+        return pd.DataFrame()
+    try:
+        return get_dataset_registry().obter(dataset_name, colunas_necessarias(entrada))
+    except Exception as e:
+        st.error(f"Erro ao carregar o dataset '{dataset_name}': {e}")
+        return pd.DataFrame()
+
+def get_active_df():
+    """DataFrame do dataset ativo desta sessão (a sessão guarda apenas o nome)."""
+    return load_dataset_df(st.session_state.current_dataset_name)
+
+@st.cache_resource(max_entries=MAX_DATASETS_RESIDENTES, show_spinner=False)
+def build_detail_df_cache(_df, dataset_name, fingerprint, colunas):
+    """
+    Dataset com todas as 'colunas' do catálogo: só as que faltam no DataFrame de análise são lidas do Parquet
+    (uma vez por dataset, compartilhado pelas sessões) e juntadas a ele sem copiar as colunas já residentes.
+    """
+    extras = catalogo_colunar.carregar_dataset(dataset_name, [col for col in colunas if col not in _df.columns])
+    return pd.concat([_df, extras], axis=1)[list(colunas)]
+
+def get_active_detail_df(df_analise):
+    """
+    DataFrame do dataset ativo com todas as colunas enviadas, para as tabelas de detalhe e as exportações
+    (o de análise só tem as colunas de filtro, valor, data e críticas). As linhas são as mesmas, na mesma ordem.
+    """
+    dataset_name = st.session_state.current_dataset_name
+    entrada = load_catalog().get(dataset_name)
+    if entrada is None or all(col in df_analise.columns for col in entrada.get('colunas', [])):
+        return df_analise
     try:
-        os.makedirs(os.path.dirname(PERSISTENCE_PATH), exist_ok=True)
-        with open(PERSISTENCE_PATH, 'wb') as f:
-            pickle.dump(catalog, f)
+        return build_detail_df_cache(df_analise, dataset_name, entrada.get('fingerprint'), tuple(entrada['colunas']))
     except Exception as e:
-        st.sidebar.error(f"Erro ao salvar dados: {e}")
+        st.error(f"Erro ao carregar as demais colunas do dataset '{dataset_name}': {e}")
+        return df_analise
+
+def get_active_options_index():
+    """
+    Índice de opções dos filtros do dataset ativo (valores distintos ordenados e contagens por coluna).
+    Datasets salvos sem o índice (ex.: migrados do pickle) têm o índice construído a partir do DF.
+    """
+    dataset_name = st.session_state.current_dataset_name
+    entrada = load_catalog().get(dataset_name)
+    if entrada is None:
+        return {}
+    try:
+        indice = get_dataset_registry().obter_anexo(dataset_name, 'opcoes')
+    except Exception:
+        indice = None
+    if indice is None:
+        indice = build_options_index_cache(get_active_df(), entrada.get('fingerprint'), st.session_state.colunas_filtros_salvas)
+    return indice
+
+def get_active_cube():
+    """
+    Cubo pré-agregado de KPIs do dataset ativo ({'cubo_valores', 'cubo_funcionarios'}),
+    ou None se o dataset não tiver cubo (datasets antigos ou com cardinalidade alta demais).
+    """
+    dataset_name = st.session_state.current_dataset_name
+    if dataset_name not in load_catalog():
+        return None
+    try:
+        registro = get_dataset_registry()
+        cubo_valores = registro.obter_anexo(dataset_name, 'cubo_valores')
+        cubo_funcionarios = registro.obter_anexo(dataset_name, 'cubo_funcionarios')
+    except Exception:
+        return None
+    if cubo_valores is None or cubo_funcionarios is None:
+        return None
+    return {'cubo_valores': cubo_valores, 'cubo_funcionarios': cubo_funcionarios}
+
+@st.cache_resource(max_entries=MAX_DATASETS_RESIDENTES, show_spinner=False)
+def build_date_index_cache(_df, dataset_name, fingerprint, coluna):
+    """Índice de datas ordenado de uma coluna (uma vez por dataset, compartilhado pelas sessões)."""
+    return construir_indice_datas(_df[coluna])
+
+def get_active_date_index(df, colunas_data):
+    """
+    (coluna, índice de datas ordenado) do dataset ativo para os filtros de período, ou (None, None)
+    se não houver coluna de data. A coluna é 'data_referencia' (ano/mês), se existir, senão a primeira de data.
+    """
+    coluna = coluna_data_principal(colunas_data)
+    if coluna is None:
+        return None, None
+    dataset_name = st.session_state.current_dataset_name
+    fingerprint = load_catalog().get(dataset_name, {}).get('fingerprint')
+    return coluna, build_date_index_cache(df, dataset_name, fingerprint, coluna)
+
+@st.cache_data(show_spinner=False)
+def build_options_index_cache(_df, fingerprint, colunas_filtros):
+    """Constrói (uma vez por fingerprint) o índice de opções de datasets que não o têm persistido."""
+    return construir_indice_opcoes(_df, colunas_filtros)
+
+def describe_dataset(entrada):
+    """Resumo curto de uma entrada do manifesto (usado no tooltip dos botões de navegação)."""
+    tamanho_mb = entrada.get('tamanho_bytes', 0) / (1024 * 1024)
+    metrica = 'Valor Monetário' if entrada.get('main_metric_type', 'VALUE') == 'VALUE' else 'Contagem'
+    descricao = (
+        f"{entrada.get('linhas', 0):,} linhas | {len(entrada.get('colunas', []))} colunas | "
+        f"Métrica: {metrica} | {tamanho_mb:,.1f} MB"
+    )
+    if entrada.get('memoria_bytes'):
+        descricao += f" | {entrada['memoria_bytes']['depois'] / (1024 * 1024):,.1f} MB em memória"
+    return descricao
 
 def limpar_filtros_salvos():
     """Limpa o estado de todos os filtros, forçando os widgets a resetarem ao default."""
@@ -60,6 +290,9 @@ def limpar_filtros_salvos():
     # Incrementa o trigger para forçar o recálculo da função cacheada de filtros
     st.session_state['filtro_reset_trigger'] += 1
     
+    # Opções válidas de cada coluna vêm do índice do dataset ativo (sem recalcular valores distintos)
+    indice_opcoes = get_active_options_index() if st.session_state.current_dataset_name else {}
+    
     # Limpa as chaves de estado de sessão específicas dos filtros
     chaves_a_limpar = [
         key for key in st.session_state.keys() 
@@ -71,12 +304,9 @@ def limpar_filtros_salvos():
             # Reseta multiselects para o estado "Selecionar Tudo" (default)
             if key.startswith('filtro_key_'):
                  # Tenta encontrar as opções válidas para esta coluna no DF ativo
-                 col_name = key.split('_')[-1]
-                 if col_name in st.session_state.dados_atuais.columns:
-                      options = st.session_state.dados_atuais[col_name].astype(str).fillna('N/A').unique().tolist()
-                      st.session_state[key] = options
-                 else:
-                      st.session_state[key] = []
+                 # Chave no formato filtro_key_<base|comp>_<coluna> (a coluna pode conter '_')
+                 col_name = key.split('_', 3)[3]
+                 st.session_state[key] = opcoes_coluna(indice_opcoes, col_name)
             elif key.startswith('date_range_key_'):
                  del st.session_state[key]
         except:
@@ -97,20 +327,22 @@ def switch_dataset(dataset_name):
     """
     Troca o dataset ativo no dashboard baseado no nome (chave do catálogo).
     """
-    if dataset_name in st.session_state.data_sets_catalog:
-        data = st.session_state.data_sets_catalog[dataset_name]
+    catalog = load_catalog()
+    if dataset_name in catalog:
+        data = catalog[dataset_name]
         
-        # Carrega o DF e as configurações de colunas
-        st.session_state.dados_atuais = data['df']
+        # Apenas o nome e as configurações de colunas ficam na sessão; o DF vem do registro compartilhado
         st.session_state.colunas_filtros_salvas = data['colunas_filtros_salvas']
         st.session_state.colunas_valor_salvas = data['colunas_valor_salvas']
+        st.session_state.colunas_centavos_salvas = data.get('colunas_centavos') or []
         st.session_state.current_dataset_name = dataset_name
         
         # Carrega o tipo de métrica principal
         st.session_state.main_metric_type = data.get('main_metric_type', 'VALUE')
         
-        default_exclude = [col for col in data['df'].columns if col in ['emp', 'eve', 'seq', 'nr_func']]
+        default_exclude = [col for col in data.get('colunas', []) if col in ['emp', 'eve', 'seq', 'nr_func']]
         st.session_state.cols_to_exclude_analysis = default_exclude
+        st.session_state.coortes_salvas = {} # Coortes salvas usam filtros do dataset anterior
         
         # APENAS RESETA O TRIGGER para forçar o recálculo do cache com os novos dados
         st.session_state['filtro_reset_trigger'] += 1
@@ -142,36 +374,191 @@ def get_clean_dataset_name(original_file_names, existing_names, user_input_name)
     return clean_name
 
 
-def processar_dados_atuais(df_novo, colunas_filtros, colunas_valor, dataset_name, original_file_names, main_metric_type):
+# Etapas das tarefas de ingestão (a fração concluída no painel de progresso é calculada sobre elas)
+ETAPAS_INGESTAO = ['Categorias e tipos compactos', 'Índice de opções', 'Cubo pré-agregado', 'Gravação no catálogo']
+ETAPAS_INGESTAO_EM_BLOCOS = ['Leitura, conversão e gravação em blocos', 'Índice e cubo combinados', 'Registro no catálogo']
+
+def processar_dados_atuais(tarefa, df_novo, base_name, colunas_filtros, colunas_valor, main_metric_type, fingerprint, registro, colunas_centavos=()):
     """
-    Salva o novo DataFrame processado no catálogo e o define como ativo.
+    Tarefa em segundo plano: salva o novo DataFrame processado no catálogo com o nome 'base_name'
+    (já único e reservado pelo registro de tarefas). Não usa o Streamlit: o resultado é aplicado à
+    sessão por concluir_tarefas_da_sessao quando a tarefa termina.
+    O fingerprint (bytes enviados + configuração de colunas) identifica o dataset nos caches.
+    'colunas_centavos' são as colunas de moeda gravadas como centavos inteiros (int64).
     """
+    colunas_centavos = list(colunas_centavos)
+    
+    with tarefa.etapa('Categorias e tipos compactos'):
+        # Colunas de filtro armazenadas como categóricas (códigos inteiros) para o motor de filtros
+        df_novo = garantir_categoricas(df_novo, colunas_filtros)
+        # Menor representação segura para as demais colunas (inteiros reduzidos, categorias, strings Arrow)
+        df_novo, memoria_antes, memoria_depois = compactar_tipos(df_novo, colunas_filtros + colunas_centavos)
+    
+    with tarefa.etapa('Índice de opções'):
+        # Índice de opções (valores distintos + contagens) persistido junto ao dataset
+        anexos = {'opcoes': construir_indice_opcoes(df_novo, colunas_filtros)}
+    
+    with tarefa.etapa('Cubo pré-agregado'):
+        # Cubo pré-agregado para os KPIs de BASE vs COMPARAÇÃO (opcional: só se for bem menor que o dataset)
+        cubo = construir_cubo(df_novo, colunas_filtros, colunas_valor)
+        if cubo:
+            anexos.update(cubo)
+
+    metadados = {
+        'colunas_filtros_salvas': colunas_filtros,
+        'colunas_valor_salvas': colunas_valor,
+        'main_metric_type': main_metric_type, 
+        'fingerprint': fingerprint,
+        'memoria_bytes': {'antes': memoria_antes, 'depois': memoria_depois},
+        'colunas_centavos': colunas_centavos,
+    }
     
-    existing_names = list(st.session_state.data_sets_catalog.keys())
+    with tarefa.etapa('Gravação no catálogo'):
+        # Parquet e anexos gravados numa versão nova, ao lado da atual; a troca acontece na gravação do manifesto
+        catalogo_colunar.salvar_dataset(base_name, df_novo, metadados, anexos)
+        registro.registrar(base_name, df_novo, anexos)
     
-    # Gera o nome de catálogo limpo e único
-    base_name = get_clean_dataset_name(original_file_names, existing_names, dataset_name)
-             
+    return {
+        'nome': base_name,
+        'colunas_filtros': colunas_filtros,
+        'colunas_valor': colunas_valor,
+        'main_metric_type': main_metric_type,
+        'colunas': list(df_novo.columns),
+        'colunas_centavos': colunas_centavos,
+        'memoria': (memoria_antes, memoria_depois),
+    }
 
-    st.session_state.data_sets_catalog[base_name] = {
-        'df': df_novo,
+def processar_dados_em_blocos(tarefa, caminhos, plano, colunas_texto, colunas_moeda, base_name, colunas_filtros, colunas_valor, main_metric_type, fingerprint, colunas_centavos=()):
+    """
+    Versão em streaming de processar_dados_atuais para arquivos grandes (também executada como tarefa
+    em segundo plano): cada bloco é convertido e gravado no Parquet do dataset assim que é lido, e o
+    índice de opções e o cubo são acumulados bloco a bloco. O dataset completo nunca fica em memória.
+    Os arquivos enviados ('caminhos') são removidos ao final, com ou sem sucesso.
+    """
+    colunas_centavos = list(colunas_centavos)
+    
+    # Colunas de filtro sempre gravadas como categóricas, independente do que a amostra inferiu
+    plano = {col: ('category' if col in colunas_filtros else tipo) for col, tipo in plano.items()}
+    
+    def converter(bloco):
+        bloco = inferir_e_converter_tipos(bloco, colunas_texto, colunas_moeda, moeda_em_centavos=bool(colunas_centavos))
+        return garantir_categoricas(bloco, colunas_filtros)
+    
+    # Estruturas derivadas acumuladas por bloco e compactadas periodicamente (memória limitada)
+    parciais = {'indices': [], 'cubos': []}
+    # Valores que não couberam no tipo da amostra (ex.: texto numa coluna numérica), por coluna
+    descartados = {}
+    
+    def acumular(bloco, linhas):
+        parciais['indices'].append(construir_indice_opcoes(bloco, colunas_filtros))
+        if parciais['cubos'] != [None]:
+            parciais['cubos'].append(construir_cubo(bloco, colunas_filtros, colunas_valor, proporcao_maxima=None))
+        if len(parciais['indices']) >= 8:
+            parciais['indices'] = [combinar_indices_opcoes(parciais['indices'])]
+            parciais['cubos'] = [combinar_cubos(parciais['cubos'], linhas)]
+        tarefa.informar(f"{linhas:,} linhas gravadas".replace(",", "."))
+    
+    metadados = {
         'colunas_filtros_salvas': colunas_filtros,
         'colunas_valor_salvas': colunas_valor,
         'main_metric_type': main_metric_type, 
+        'fingerprint': fingerprint,
+        'colunas_centavos': colunas_centavos,
+    }
+    
+    try:
+        with catalogo_colunar.iniciar_dataset(base_name) as escritor:
+            with tarefa.etapa('Leitura, conversão e gravação em blocos'):
+                linhas = ingerir_em_blocos(caminhos, escritor, converter, plano, ao_concluir_bloco=acumular, descartados=descartados)
+            with tarefa.etapa('Índice e cubo combinados'):
+                anexos = {'opcoes': combinar_indices_opcoes(parciais['indices'])}
+                cubo = combinar_cubos(parciais['cubos'], linhas)
+                if cubo:
+                    anexos.update(cubo)
+            with tarefa.etapa('Registro no catálogo'):
+                entrada_manifesto = escritor.concluir(metadados, anexos)
+    finally:
+        remover_uploads(caminhos)
+    
+    return {
+        'nome': base_name,
+        'colunas_filtros': colunas_filtros,
+        'colunas_valor': colunas_valor,
+        'main_metric_type': main_metric_type,
+        'colunas': entrada_manifesto['colunas'],
+        'colunas_centavos': colunas_centavos,
+        'memoria': None,
+        'descartados': descartados,
     }
+
+def concluir_tarefas_da_sessao():
+    """
+    Aplica à sessão o resultado das tarefas de ingestão iniciadas por ela que já terminaram:
+    o dataset gravado passa a ser o ativo. Tarefas com erro só saem da lista (o erro fica no painel).
+    """
+    registro_tarefas = get_job_registry()
+    for id_tarefa in list(st.session_state.tarefas_sessao):
+        tarefa = registro_tarefas.obter(id_tarefa)
+        if tarefa is not None and not tarefa.finalizada:
+            continue
+        st.session_state.tarefas_sessao.remove(id_tarefa)
+        if tarefa is None or tarefa.estado != ESTADO_CONCLUIDA:
+            continue
+        
+        resultado = tarefa.resultado
+        ativar_dataset_processado(
+            resultado['nome'], resultado['colunas_filtros'], resultado['colunas_valor'],
+            resultado['main_metric_type'], resultado['colunas'], resultado['colunas_centavos']
+        )
+        if resultado['memoria']:
+            st.session_state.relatorio_memoria = (resultado['nome'],) + tuple(resultado['memoria'])
+        # Substitui o aviso de um processamento anterior (None quando nada foi descartado)
+        st.session_state.relatorio_descartados = (resultado['nome'], resultado['descartados']) if resultado.get('descartados') else None
+        st.session_state.dataset_recem_processado = resultado['nome']
+        limpar_filtros_salvos()
+
+def exibir_tarefas():
+    """Painel de tarefas de ingestão na sidebar: progresso e tempo de cada etapa."""
+    tarefas = get_job_registry().tarefas()
+    if not tarefas:
+        return
     
-    save_catalog(st.session_state.data_sets_catalog)
+    st.markdown("##### ⏳ Processamentos")
+    for resumo in (tarefa.resumo() for tarefa in tarefas):
+        icone = {ESTADO_CONCLUIDA: '✅', ESTADO_ERRO: '❌'}.get(resumo['estado'], '⏳')
+        st.markdown(f"{icone} **{resumo['nome']}**")
+        if resumo['estado'] not in ESTADOS_FINAIS:
+            texto = resumo['etapa_atual'] or resumo['estado'].capitalize()
+            if resumo['detalhe']:
+                texto += f" — {resumo['detalhe']}"
+            st.progress(resumo['progresso'], text=texto)
+        if resumo['etapas']:
+            st.caption(" | ".join(
+                f"{nome}: {duracao:,.1f} s".replace(".", ",") + ("" if terminada else "…")
+                for nome, duracao, terminada in resumo['etapas']
+            ))
+        if resumo['erro']:
+            st.error(f"Erro ao processar: {resumo['erro']}")
     
-    st.session_state.dados_atuais = df_novo 
+    # Uma tarefa desta sessão terminou: rerun completo para ativar o dataset gravado
+    registro_tarefas = get_job_registry()
+    if any((tarefa := registro_tarefas.obter(id_tarefa)) is None or tarefa.finalizada for id_tarefa in st.session_state.tarefas_sessao):
+        st.rerun()
+
+# Enquanto houver tarefas em andamento, o painel se atualiza sozinho (só o fragmento roda, não a página)
+exibir_tarefas_ao_vivo = st.fragment(run_every=INTERVALO_ATUALIZACAO_TAREFAS)(exibir_tarefas)
+
+def ativar_dataset_processado(base_name, colunas_filtros, colunas_valor, main_metric_type, colunas, colunas_centavos=()):
+    """Define um dataset recém-gravado no catálogo como o ativo da sessão."""
     st.session_state.colunas_filtros_salvas = colunas_filtros
     st.session_state.colunas_valor_salvas = colunas_valor
+    st.session_state.colunas_centavos_salvas = list(colunas_centavos)
     st.session_state.current_dataset_name = base_name 
     st.session_state.main_metric_type = main_metric_type 
     
-    default_exclude = [col for col in df_novo.columns if col in ['emp', 'eve', 'seq', 'nr_func']]
+    default_exclude = [col for col in colunas if col in ['emp', 'eve', 'seq', 'nr_func']]
     st.session_state.cols_to_exclude_analysis = default_exclude
-    
-    return True, df_novo
+    st.session_state.coortes_salvas = {}
 
 def initialize_widget_state(key, initial_default_calc):
     if key not in st.session_state:
@@ -179,81 +566,143 @@ def initialize_widget_state(key, initial_default_calc):
 # ==============================================================================
 
 # --- Inicialização de Estado da Sessão ---
-if 'data_sets_catalog' not in st.session_state: st.session_state.data_sets_catalog = load_catalog()
+# A sessão guarda apenas o nome do dataset ativo, as configurações de colunas e o estado dos filtros.
+data_sets_catalog = load_catalog()
 if 'filtro_reset_trigger' not in st.session_state: st.session_state['filtro_reset_trigger'] = 0
 
-initial_df = pd.DataFrame()
 initial_filters = []
 initial_values = []
+initial_centavos = []
+initial_columns = []
 initial_name = ""
 initial_metric_type = 'VALUE'
 
 # Lógica para carregar o estado inicial (último dataset usado ou o primeiro do catálogo)
-if st.session_state.data_sets_catalog:
-    if 'current_dataset_name' in st.session_state and st.session_state.current_dataset_name in st.session_state.data_sets_catalog:
+if data_sets_catalog:
+    if 'current_dataset_name' in st.session_state and st.session_state.current_dataset_name in data_sets_catalog:
         initial_name = st.session_state.current_dataset_name
     else:
-        initial_name = list(st.session_state.data_sets_catalog.keys())[-1]
+        initial_name = list(data_sets_catalog.keys())[-1]
         
-    data = st.session_state.data_sets_catalog[initial_name]
-    initial_df = data['df']
+    data = data_sets_catalog[initial_name]
     initial_filters = data['colunas_filtros_salvas']
     initial_values = data['colunas_valor_salvas']
+    initial_centavos = data.get('colunas_centavos') or []
+    initial_columns = data.get('colunas', [])
     initial_metric_type = data.get('main_metric_type', 'VALUE')
 
+# Dataset removido do catálogo (ex.: por outra sessão): volta ao estado inicial
+if st.session_state.get('current_dataset_name') and st.session_state.current_dataset_name not in data_sets_catalog:
+    for key in ['current_dataset_name', 'colunas_filtros_salvas', 'colunas_valor_salvas', 'colunas_centavos_salvas', 'cols_to_exclude_analysis']:
+        del st.session_state[key]
 
-if 'dados_atuais' not in st.session_state: st.session_state.dados_atuais = initial_df
 if 'colunas_filtros_salvas' not in st.session_state: st.session_state.colunas_filtros_salvas = initial_filters
 if 'colunas_valor_salvas' not in st.session_state: st.session_state.colunas_valor_salvas = initial_values
+if 'colunas_centavos_salvas' not in st.session_state: st.session_state.colunas_centavos_salvas = initial_centavos
 if 'current_dataset_name' not in st.session_state: st.session_state.current_dataset_name = initial_name
 if 'main_metric_type' not in st.session_state: st.session_state.main_metric_type = initial_metric_type
     
-if 'uploaded_files_data' not in st.session_state: st.session_state.uploaded_files_data = {} 
-if 'df_filtrado_base' not in st.session_state: st.session_state.df_filtrado_base = initial_df.copy()
-if 'df_filtrado_comp' not in st.session_state: st.session_state.df_filtrado_comp = initial_df.copy()
+if 'uploaded_files_paths' not in st.session_state: st.session_state.uploaded_files_paths = {} # nome -> arquivo salvo em disco
+if 'uploaded_files_fingerprints' not in st.session_state: st.session_state.uploaded_files_fingerprints = {} 
 if 'show_reconfig_section' not in st.session_state: st.session_state.show_reconfig_section = False
+if 'tarefas_sessao' not in st.session_state: st.session_state.tarefas_sessao = [] # ids das tarefas de ingestão desta sessão
 if 'active_filters_base' not in st.session_state: st.session_state.active_filters_base = {} 
 if 'active_filters_comp' not in st.session_state: st.session_state.active_filters_comp = {} 
+if 'coortes_salvas' not in st.session_state: st.session_state.coortes_salvas = {} # nome -> (assinatura dos filtros, período)
 if 'cols_to_exclude_analysis' not in st.session_state: 
-    st.session_state.cols_to_exclude_analysis = [col for col in initial_df.columns if col in ['emp', 'eve', 'seq', 'nr_func']]
+    st.session_state.cols_to_exclude_analysis = [col for col in initial_columns if col in ['emp', 'eve', 'seq', 'nr_func']]
 
+# Tarefas de ingestão desta sessão que terminaram: o dataset gravado passa a ser o ativo
+concluir_tarefas_da_sessao()
+data_sets_catalog = load_catalog()
 
-# --- Aplicação de Filtros (Função Caching) ---
-@st.cache_data(show_spinner="Aplicando filtros de Base e Comparação...")
-def aplicar_filtros_comparacao(df_base, col_filtros, filtros_ativos_base, filtros_ativos_comp, col_data, trigger):
-    
-    def _aplicar_filtro_single(df, col_filtros_list, filtros_ativos_dict):
-        df_filtrado_temp = df.copy()
-        
-        # 1. Filtros Categóricos (incluindo ano e mês)
-        for col in col_filtros_list:
-            selecao = filtros_ativos_dict.get(col)
-            if col not in df_filtrado_temp.columns: continue
 
-            # Não é necessário saber todas as opções, apenas se o filtro está ativo.
-            # Um filtro está ativo se 'selecao' não for vazio E não for 'selecionar tudo'.
-            
-            # Filtro ativo só se a lista de seleção não for vazia
-            if selecao and len(selecao) > 0:
-                 # Se o total de opções selecionadas for menor que o total no DF base
-                 opcoes_unicas_df_completo = df_base[col].astype(str).fillna('N/A').unique().tolist()
-                 
-                 if len(selecao) < len(opcoes_unicas_df_completo):
-                    # Converte a coluna para string para garantir a comparação
-                    df_filtrado_temp = df_filtrado_temp[df_filtrado_temp[col].astype(str).isin(selecao)]
-            # Note: Se len(selecao) == len(opcoes_unicas_df_completo), o filtro é ignorado (TOTAL).
-        
-        return df_filtrado_temp
+# --- Leitura dos Arquivos Enviados (Função Caching) ---
+@st.cache_data(show_spinner="Lendo arquivos enviados...")
+def ler_arquivos_pendentes(_arquivos, fingerprint_upload, nrows):
+    """
+    Lê os arquivos pendentes (nome -> caminho em disco) e normaliza suas colunas, um arquivo por processo
+    do pool. Com 'nrows', lê só o início de cada arquivo (pré-visualização do modo em blocos).
+    A chave do cache é o fingerprint dos arquivos.
+    Retorna (lista de DataFrames, colunas críticas renomeadas, mensagens de erro).
+    """
+    resultados = mapear_em_paralelo(
+        ler_e_normalizar_arquivo,
+        [(caminho, nrows) for caminho in _arquivos.values()],
+        get_process_pool()
+    )
     
-    df_base_filtrado = _aplicar_filtro_single(df_base, col_filtros, filtros_ativos_base)
-    df_comp_filtrado = _aplicar_filtro_single(df_base, col_filtros, filtros_ativos_comp)
+    all_dataframes = []
+    colunas_renomeadas = {}
+    erros = []
+    for file_name, (resultado, erro) in zip(_arquivos, resultados):
+        if erro is not None:
+            erros.append(f"Erro ao ler o arquivo {file_name}: {erro}")
+            continue
+        df_temp, renomeadas = resultado
+        if not df_temp.empty:
+            all_dataframes.append(df_temp)
+            colunas_renomeadas.update(renomeadas)
+    return all_dataframes, colunas_renomeadas, erros
+
+
+# --- Inferência de Tipos (Função Caching) ---
+@st.cache_data(show_spinner="Processando e inferindo tipos de dados...")
+def inferir_tipos_cache(_frames, fingerprint, colunas_texto, colunas_moeda, moeda_em_centavos=False):
+    """
+    Converte os tipos de cada arquivo em paralelo (inferir_e_converter_tipos) e os concatena com o esquema
+    alinhado. Os DataFrames (prefixo '_') não são hasheados pelo Streamlit: a chave do cache é o fingerprint
+    dos arquivos enviados + as colunas selecionadas.
+    """
+    resultados = mapear_em_paralelo(
+        converter_arquivo,
+        [(df, colunas_texto, colunas_moeda, moeda_em_centavos) for df in _frames],
+        get_process_pool()
+    )
+    for _, erro in resultados:
+        if erro is not None:
+            raise erro
+    return concatenar_alinhado([df for df, _ in resultados])
+
+
+# --- Aplicação de Filtros (Função Caching) ---
+def mascara_janela(indice_datas, periodo):
+    """Máscara de um período (data inicial, data final) do seletor de datas; a data final vale o dia inteiro."""
+    if indice_datas is None or not periodo:
+        return None
+    inicio, fim = periodo
+    return mascara_periodo(indice_datas, pd.Timestamp(inicio), pd.Timestamp(fim) + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns'))
+
+@st.cache_data(show_spinner="Aplicando filtros de Base e Comparação...")
+def aplicar_filtros_comparacao(_df_base, _indice_opcoes, _indice_datas, fingerprint, col_filtros, assinatura_base, assinatura_comp, col_data, periodo_base, periodo_comp, trigger):
+    """
+    Aplica os filtros de BASE e COMPARAÇÃO. O DataFrame não entra na chave do cache:
+    ela é formada pelo fingerprint do dataset, pela assinatura canônica de cada conjunto de filtros
+    e pelo período (janela de datas na coluna 'col_data') de cada lado.
     
-    return df_base_filtrado, df_comp_filtrado
+    Retorna as posições das linhas de cada lado (None = todas as linhas), não cópias do DataFrame.
+    """
+    # Filtros Categóricos (incluindo ano e mês): consulta por códigos inteiros + AND das máscaras.
+    # A máscara de cada coluna é calculada uma vez e compartilhada por BASE e COMPARAÇÃO.
+    # Seleções vazias ou com todas as opções (TOTAL) são ignoradas.
+    mascara_base, mascara_comp = mascaras_comparacao(
+        _df_base, col_filtros, dict(assinatura_base), dict(assinatura_comp), _indice_opcoes
+    )
+    # Períodos: fatias do índice de datas ordenado (busca binária), combinadas às máscaras categóricas
+    mascara_base = combinar_mascaras(mascara_base, mascara_janela(_indice_datas, periodo_base))
+    mascara_comp = combinar_mascaras(mascara_comp, mascara_janela(_indice_datas, periodo_comp))
+    return posicoes_de_mascara(mascara_base), posicoes_de_mascara(mascara_comp)
 
 
 # --- FUNÇÃO PARA TABELA DE RESUMO E MÉTRICAS "EXPERT" ---
 
-def gerar_analise_expert(df_completo, df_base, df_comp, filtros_ativos_base, filtros_ativos_comp, colunas_data):
+def gerar_analise_expert(df_completo, pos_base, pos_comp, filtros_ativos_base, filtros_ativos_comp, colunas_data, indice_opcoes,
+                         periodo_base=None, periodo_comp=None, limites_data=None):
+    """
+    Painel de KPIs e tabela de variação. 'pos_base' e 'pos_comp' são as posições das linhas
+    filtradas (None = todas); colunas só são materializadas quando o cubo não atende aos filtros.
+    'periodo_base'/'periodo_comp' são as janelas de datas de cada lado (None = sem restrição de data).
+    """
     
     colunas_valor_salvas = st.session_state.colunas_valor_salvas
     
@@ -262,8 +711,8 @@ def gerar_analise_expert(df_completo, df_base, df_comp, filtros_ativos_base, fil
     # -------------------------------------------------------------
     st.markdown("#### 📝 Contexto do Filtro Ativo")
     
-    rotulo_base = gerar_rotulo_filtro(df_completo, filtros_ativos_base, colunas_data, None)
-    rotulo_comp = gerar_rotulo_filtro(df_completo, filtros_ativos_comp, colunas_data, None)
+    rotulo_base = gerar_rotulo_filtro(df_completo, filtros_ativos_base, colunas_data, periodo_base, indice_opcoes, limites_data)
+    rotulo_comp = gerar_rotulo_filtro(df_completo, filtros_ativos_comp, colunas_data, periodo_comp, indice_opcoes, limites_data)
 
     st.markdown(f"""
         <div style="padding: 10px; border: 1px solid #007bff; border-radius: 5px; margin-bottom: 15px; background-color: #e9f7ff;">
@@ -298,29 +747,33 @@ def gerar_analise_expert(df_completo, df_base, df_comp, filtros_ativos_base, fil
         st.error(f"Erro Crítico: A coluna '{col_func}' (nome_funcionario) não foi encontrada no DataFrame. Por favor, reconfigure.")
         return
 
-    def calcular_venc_desc(df, is_value_mode_internal):
-        if df.empty:
-            return 0, 0, 0, 0 # Vencimentos, Descontos, Liquido, Contagem Func
-            
-        func_count = df[col_func].astype(str).str.strip().replace('', np.nan).dropna().nunique()
-        
-        if not is_value_mode_internal:
-            # No modo COUNT, valores monetários são ZERO. O primeiro retorno é a contagem de registros.
-            return len(df), 0, 0, func_count 
-            
-        else:
-            # Modo VALUE
-            df_clean = df.dropna(subset=[col_valor, col_tipo_evento])
-
-            vencimentos = df_clean[df_clean[col_tipo_evento] == 'C'][col_valor].sum()
-            descontos = df_clean[df_clean[col_tipo_evento] == 'D'][col_valor].sum()
-            liquido = vencimentos - descontos
-            
-            return vencimentos, descontos, liquido, func_count
-
-    venc_base, desc_base, liq_base, func_base = calcular_venc_desc(df_base, is_value_mode)
-    venc_comp, desc_comp, liq_comp, func_comp = calcular_venc_desc(df_comp, is_value_mode)
-    venc_total, desc_total, liq_total, func_total = calcular_venc_desc(df_completo, is_value_mode)
+    colunas_moeda_outras = [col for col in st.session_state.colunas_valor_salvas if col not in ['valor']] 
+    cubo = get_active_cube()
+    
+    colunas_kpi = [col_func, col_valor, col_tipo_evento] + colunas_moeda_outras
+    
+    colunas_centavos = st.session_state.colunas_centavos_salvas
+    
+    def em_reais(kpis, somas):
+        # Colunas em centavos somam inteiros (exato); a conversão para reais só acontece no total, para exibição
+        venc, desc, liq, func = kpis
+        if is_value_mode and col_valor in colunas_centavos:
+            venc, desc, liq = centavos_para_reais(venc), centavos_para_reais(desc), centavos_para_reais(liq)
+        somas = {col: centavos_para_reais(soma) if col in colunas_centavos else soma for col, soma in somas.items()}
+        return (venc, desc, liq, func), somas
+    
+    def calcular_kpis(posicoes, filtros_ativos, periodo=None):
+        # Usa o cubo pré-agregado quando os filtros ativos são todos dimensões dele (sem varrer as linhas);
+        # um período de datas não é dimensão do cubo, então as linhas filtradas são somadas
+        if not periodo and cubo_atende_filtros(cubo, filtros_ativos, indice_opcoes):
+            return em_reais(*kpis_do_cubo(cubo, filtros_ativos, indice_opcoes, is_value_mode, colunas_moeda_outras))
+        df = selecionar_linhas(df_completo, posicoes, colunas_kpi)
+        somas = {col: df[col].sum() for col in colunas_moeda_outras if col in df.columns} if is_value_mode else {}
+        return em_reais(calcular_venc_desc(df, is_value_mode, col_func, col_tipo_evento, col_valor), somas)
+    
+    (venc_base, desc_base, liq_base, func_base), somas_base = calcular_kpis(pos_base, filtros_ativos_base, periodo_base)
+    (venc_comp, desc_comp, liq_comp, func_comp), somas_comp = calcular_kpis(pos_comp, filtros_ativos_comp, periodo_comp)
+    (venc_total, desc_total, liq_total, func_total), somas_total = calcular_kpis(None, {})
 
     # Função Helper para o Delta (permanece inalterada)
     def get_delta(comp, base, is_currency=True):
@@ -406,7 +859,7 @@ def gerar_analise_expert(df_completo, df_base, df_comp, filtros_ativos_base, fil
     dados_resumo = []
     
     # Linhas de Contagem são sempre exibidas
-    dados_resumo.append({'Métrica': 'CONT. DE REGISTROS', 'Total Geral': len(df_completo), 'Base (Filtrado)': len(df_base), 'Comparação (Filtrado)': len(df_comp), 'Tipo': 'Contagem'})
+    dados_resumo.append({'Métrica': 'CONT. DE REGISTROS', 'Total Geral': len(df_completo), 'Base (Filtrado)': contar_linhas(df_completo, pos_base), 'Comparação (Filtrado)': contar_linhas(df_completo, pos_comp), 'Tipo': 'Contagem'})
     dados_resumo.append({'Métrica': 'CONT. DE FUNCIONÁRIOS ÚNICOS', 'Total Geral': func_total, 'Base (Filtrado)': func_base, 'Comparação (Filtrado)': func_comp, 'Tipo': 'Contagem'})
     
     # Linhas de Valor só são exibidas no modo VALUE
@@ -415,37 +868,27 @@ def gerar_analise_expert(df_completo, df_base, df_comp, filtros_ativos_base, fil
         dados_resumo.append({'Métrica': 'TOTAL DE DESCONTOS (DÉBITO)', 'Total Geral': desc_total, 'Base (Filtrado)': desc_base, 'Comparação (Filtrado)': desc_comp, 'Tipo': 'Moeda'})
         dados_resumo.append({'Métrica': 'VALOR LÍQUIDO (Venc - Desc)', 'Total Geral': liq_total, 'Base (Filtrado)': liq_base, 'Comparação (Filtrado)': liq_comp, 'Tipo': 'Moeda'})
 
-        colunas_moeda_outras = [col for col in st.session_state.colunas_valor_salvas if col not in ['valor']] 
         for col in colunas_moeda_outras:
-            total_geral_soma = df_completo[col].sum()
-            total_base_soma = df_base[col].sum()
-            total_comp_soma = df_comp[col].sum()
+            total_geral_soma = somas_total.get(col, 0)
+            total_base_soma = somas_base.get(col, 0)
+            total_comp_soma = somas_comp.get(col, 0)
             dados_resumo.append({'Métrica': f"SOMA: {col.upper().replace('_', ' ')}", 'Total Geral': total_geral_soma, 'Base (Filtrado)': total_base_soma, 'Comparação (Filtrado)': total_comp_soma, 'Tipo': 'Moeda'})
                 
     df_resumo = pd.DataFrame(dados_resumo)
     
-    def calcular_variacao(row):
-        base = row['Base (Filtrado)']
-        comp = row['Comparação (Filtrado)']
-        
-        if base == 0:
-            return 0 if comp == 0 else np.inf
-        return ((comp - base) / base) * 100
-
-    df_resumo['Variação %'] = df_resumo.apply(calcular_variacao, axis=1)
+    # Variação % por coluna inteira (base 0: 0 se a comparação também for 0, senão infinito)
+    base = df_resumo['Base (Filtrado)'].to_numpy(dtype='float64')
+    comp = df_resumo['Comparação (Filtrado)'].to_numpy(dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df_resumo['Variação %'] = np.where(base == 0, np.where(comp == 0, 0.0, np.inf), (comp - base) / base * 100)
 
     df_tabela = df_resumo.copy()
     
-    def format_value(row, col_name):
-        val = row[col_name]
-        if row['Tipo'] == 'Moeda':
-            return formatar_moeda(val)
-        else:
-            return f"{val:,.0f}".replace(",", "X").replace(".", ",").replace("X", ".")
-            
-    df_tabela['TOTAL GERAL (Sem Filtro)'] = df_tabela.apply(lambda row: format_value(row, 'Total Geral'), axis=1)
-    df_tabela['BASE (FILTRADO)'] = df_tabela.apply(lambda row: format_value(row, 'Base (Filtrado)'), axis=1)
-    df_tabela['COMPARAÇÃO (FILTRADO)'] = df_tabela.apply(lambda row: format_value(row, 'Comparação (Filtrado)'), axis=1)
+    # Formatação vetorizada: cada coluna é formatada de uma vez como moeda e como contagem, e a linha escolhe pelo 'Tipo'
+    eh_moeda = (df_tabela['Tipo'] == 'Moeda').to_numpy()
+    for origem, destino in [('Total Geral', 'TOTAL GERAL (Sem Filtro)'), ('Base (Filtrado)', 'BASE (FILTRADO)'), ('Comparação (Filtrado)', 'COMPARAÇÃO (FILTRADO)')]:
+        valores = df_tabela[origem].to_numpy(dtype='float64')
+        df_tabela[destino] = np.where(eh_moeda, formatar_moeda_series(valores).to_numpy(), formatar_numero_series(valores).to_numpy())
 
     def format_variacao_tabela(val):
         if not np.isfinite(val):
@@ -472,6 +915,405 @@ def gerar_analise_expert(df_completo, df_base, df_comp, filtros_ativos_base, fil
     st.markdown("##### 🔍 Comparativo Detalhado de Métricas Chave")
     st.markdown(df_final_exibicao.to_html(escape=False, index=False), unsafe_allow_html=True)
 
+    # -------------------------------------------------------------
+    # 5. DRILL-DOWN: QUAIS FUNCIONÁRIOS EXPLICAM A VARIAÇÃO
+    # -------------------------------------------------------------
+    st.markdown("---")
+    exibir_variacao_por_funcionario(df_completo, pos_base, pos_comp, is_value_mode, colunas_centavos)
+
+    # -------------------------------------------------------------
+    # 6. QUAIS EVENTOS (RUBRICAS) EXPLICAM A VARIAÇÃO
+    # -------------------------------------------------------------
+    st.markdown("---")
+    # Sem período de datas, o cubo (que tem eve/descricao_evento como dimensões) responde sem ler as linhas
+    cubo_eventos = cubo if not (periodo_base or periodo_comp) else None
+    exibir_variacao_por_evento(
+        df_completo, pos_base, pos_comp, is_value_mode, colunas_centavos, 
+        cubo_eventos, filtros_ativos_base, filtros_ativos_comp, indice_opcoes
+    )
+
+
+# --- DRILL-DOWN DA VARIAÇÃO BASE vs COMPARAÇÃO ---
+
+COLUNAS_FUNCIONARIO = ['nome_funcionario', 'nr_func'] # Chaves possíveis do drill-down por funcionário
+COLUNAS_EVENTO = ['descricao_evento', 'eve'] # Chaves possíveis da quebra por evento (rubrica)
+TOP_N_PADRAO = 20
+
+def formatar_contagem(valor):
+    return f"{valor:,.0f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+def variacao_em_reais(variacao, colunas_centavos, col_valor='valor'):
+    """Converte as colunas monetárias da variação de centavos para reais (só quando 'valor' está em centavos)."""
+    if col_valor not in colunas_centavos:
+        return variacao
+    colunas_dinheiro = [col for col in variacao.columns if col.startswith(('vencimentos_', 'descontos_', 'liquido_'))]
+    if not colunas_dinheiro:
+        return variacao
+    variacao = variacao.copy(deep=False)
+    for col in colunas_dinheiro + ['delta']:
+        variacao[col] = centavos_para_reais(variacao[col])
+    return variacao
+
+def tabela_variacao_top_n(variacao, col_grupo, rotulo_grupo, selecao, top_n, is_value_mode):
+    """
+    Linhas de 'variacao' (máscara 'selecao') com os 'top_n' maiores |delta|, já formatadas para exibição.
+    A seleção do top-N é parcial (argpartition); só as linhas exibidas são formatadas.
+    """
+    candidatas = np.flatnonzero(selecao)
+    ordem = indices_top_n(np.abs(variacao['delta'].to_numpy()[candidatas]), top_n)
+    linhas = variacao.iloc[candidatas[ordem]]
+    
+    tabela = pd.DataFrame({rotulo_grupo: linhas[col_grupo].to_numpy()})
+    if 'situacao' in linhas.columns:
+        tabela['Situação'] = linhas['situacao'].to_numpy()
+    if is_value_mode:
+        for medida, rotulo in [('vencimentos', 'Vencimentos'), ('descontos', 'Descontos'), ('liquido', 'Líquido')]:
+            tabela[f'{rotulo} BASE'] = formatar_moeda_series(linhas[f'{medida}_base'].to_numpy()).to_numpy()
+            tabela[f'{rotulo} COMP'] = formatar_moeda_series(linhas[f'{medida}_comp'].to_numpy()).to_numpy()
+        tabela['Δ Líquido'] = formatar_moeda_series(linhas['delta'].to_numpy()).to_numpy()
+    else:
+        tabela['Registros BASE'] = formatar_numero_series(linhas['registros_base'].to_numpy()).to_numpy()
+        tabela['Registros COMP'] = formatar_numero_series(linhas['registros_comp'].to_numpy()).to_numpy()
+        tabela['Δ Registros'] = formatar_numero_series(linhas['delta'].to_numpy()).to_numpy()
+    return tabela
+
+def exibir_variacao_por_funcionario(df_completo, pos_base, pos_comp, is_value_mode, colunas_centavos):
+    """
+    Drill-down por funcionário: variação de cada um entre BASE e COMPARAÇÃO (líquido, ou registros no
+    modo contagem), funcionários novos/removidos e os top-N que mais movimentaram o total.
+    A agregação dos dois lados é uma única passada vetorizada (ver analises.variacao_por_grupo).
+    """
+    st.markdown("##### 👥 Variação por Funcionário (BASE vs COMPARAÇÃO)")
+    
+    colunas_funcionario = [col for col in COLUNAS_FUNCIONARIO if col in df_completo.columns]
+    if not colunas_funcionario:
+        st.info("Nenhuma coluna de funcionário ('nome_funcionario' ou 'nr_func') no dataset ativo.")
+        return
+    
+    col_chave, col_top = st.columns([3, 1])
+    with col_chave:
+        col_grupo = st.radio(
+            "Identificar funcionário por:", 
+            options=colunas_funcionario, 
+            format_func=lambda col: col.replace('_', ' ').title(), 
+            horizontal=True, 
+            key='drill_coluna_funcionario'
+        )
+    with col_top:
+        top_n = st.number_input("Top N:", min_value=5, max_value=1000, value=TOP_N_PADRAO, step=5, key='drill_top_n_funcionarios')
+    
+    variacao = variacao_em_reais(variacao_por_grupo(df_completo, pos_base, pos_comp, col_grupo, is_value_mode), colunas_centavos)
+    if variacao.empty:
+        st.info("Nenhum funcionário nos recortes de BASE e COMPARAÇÃO.")
+        return
+    
+    situacoes = variacao['situacao'].to_numpy()
+    deltas = variacao['delta'].to_numpy()
+    formatar_impacto = (lambda v: formatar_moeda(v).replace('R$', '').strip()) if is_value_mode else formatar_contagem
+    
+    cartoes = [
+        (SITUACAO_NOVO, "🆕 Novos (só na COMPARAÇÃO)"), 
+        (SITUACAO_REMOVIDO, "🚪 Removidos (só na BASE)"), 
+        (SITUACAO_MANTIDO, "🔁 Presentes nos dois")
+    ]
+    for coluna_st, (situacao, rotulo) in zip(st.columns(len(cartoes)), cartoes):
+        selecionados = situacoes == situacao
+        coluna_st.metric(
+            label=rotulo, 
+            value=formatar_contagem(int(selecionados.sum())), 
+            delta=formatar_impacto(deltas[selecionados].sum())
+        )
+    
+    rotulo_grupo = col_grupo.replace('_', ' ').title()
+    tab_movers, tab_novos, tab_removidos = st.tabs([
+        f"Maiores Variações (Top {top_n})", 
+        f"Novos ({formatar_contagem(int((situacoes == SITUACAO_NOVO).sum()))})", 
+        f"Removidos ({formatar_contagem(int((situacoes == SITUACAO_REMOVIDO).sum()))})"
+    ])
+    for tab, selecao in [(tab_movers, deltas != 0), (tab_novos, situacoes == SITUACAO_NOVO), (tab_removidos, situacoes == SITUACAO_REMOVIDO)]:
+        with tab:
+            tabela = tabela_variacao_top_n(variacao, col_grupo, rotulo_grupo, selecao, top_n, is_value_mode)
+            if tabela.empty:
+                st.caption("Nenhum funcionário nesta categoria.")
+            else:
+                st.dataframe(tabela, use_container_width=True, hide_index=True)
+                st.caption(f"Exibindo {formatar_contagem(len(tabela))} de {formatar_contagem(int(selecao.sum()))} funcionários, ordenados por |Δ|.")
+
+def exibir_variacao_por_evento(df_completo, pos_base, pos_comp, is_value_mode, colunas_centavos, cubo, filtros_base, filtros_comp, indice_opcoes):
+    """
+    Quebra da variação por evento da folha (eve/descricao_evento): quais rubricas (horas extras, INSS,
+    IRRF, benefícios...) explicam o Δ líquido entre BASE e COMPARAÇÃO. Usa o cubo pré-agregado quando
+    o evento é dimensão dele e os filtros o permitem; senão agrega as linhas filtradas. Só os top-N
+    eventos por |Δ| são ordenados e exibidos.
+    """
+    st.markdown("##### 🧾 Variação por Evento (Rubrica)")
+    
+    colunas_evento = [col for col in COLUNAS_EVENTO if col in df_completo.columns]
+    if not colunas_evento:
+        st.info("Nenhuma coluna de evento ('descricao_evento' ou 'eve') no dataset ativo.")
+        return
+    
+    col_chave, col_top = st.columns([3, 1])
+    with col_chave:
+        col_grupo = st.radio(
+            "Identificar evento por:", 
+            options=colunas_evento, 
+            format_func=lambda col: col.replace('_', ' ').title(), 
+            horizontal=True, 
+            key='drill_coluna_evento'
+        )
+    with col_top:
+        top_n = st.number_input("Top N:", min_value=5, max_value=1000, value=TOP_N_PADRAO, step=5, key='drill_top_n_eventos')
+    
+    variacao = variacao_por_grupo_no_cubo(cubo, filtros_base, filtros_comp, indice_opcoes, col_grupo, is_value_mode)
+    if variacao is None:
+        variacao = variacao_por_grupo(df_completo, pos_base, pos_comp, col_grupo, is_value_mode)
+    variacao = variacao_em_reais(variacao, colunas_centavos)
+    if variacao.empty:
+        st.info("Nenhum evento nos recortes de BASE e COMPARAÇÃO.")
+        return
+    
+    deltas = variacao['delta'].to_numpy()
+    selecao = deltas != 0
+    tabela = tabela_variacao_top_n(variacao, col_grupo, col_grupo.replace('_', ' ').title(), selecao, top_n, is_value_mode)
+    if tabela.empty:
+        st.caption("Nenhum evento com variação entre BASE e COMPARAÇÃO.")
+        return
+    
+    st.dataframe(tabela, use_container_width=True, hide_index=True)
+    
+    # Quanto do Δ total os eventos exibidos explicam (soma dos Δ exibidos / Δ total)
+    delta_total = deltas.sum()
+    delta_exibido = deltas[np.flatnonzero(selecao)[indices_top_n(np.abs(deltas[selecao]), top_n)]].sum()
+    percentual = f"{delta_exibido / delta_total * 100:,.1f}".replace(",", "X").replace(".", ",").replace("X", ".") if delta_total else None
+    cobertura = f" Eles somam {percentual}% do Δ total." if percentual else ""
+    st.caption(f"Exibindo {formatar_contagem(len(tabela))} de {formatar_contagem(int(selecao.sum()))} eventos com variação, ordenados por |Δ|.{cobertura}")
+
+
+# --- COMPARAÇÃO MULTI-COORTE (N PERÍODOS LADO A LADO) ---
+
+MAX_COORTES = 36 # Colunas exibidas na comparação multi-coorte
+MODO_COORTES_DIMENSAO = "Uma coorte por valor de uma coluna"
+MODO_COORTES_SALVAS = "Conjuntos de filtros salvos"
+
+# (chave em metricas_por_coorte, rótulo da linha, tipo) na mesma ordem e nomenclatura de df_resumo
+METRICAS_COORTE = [
+    ('registros', 'CONT. DE REGISTROS', 'Contagem'),
+    ('funcionarios', 'CONT. DE FUNCIONÁRIOS ÚNICOS', 'Contagem'),
+    ('vencimentos', 'TOTAL DE VENCIMENTOS (CRÉDITO)', 'Moeda'),
+    ('descontos', 'TOTAL DE DESCONTOS (DÉBITO)', 'Moeda'),
+    ('liquido', 'VALOR LÍQUIDO (Venc - Desc)', 'Moeda'),
+]
+
+@st.cache_data(show_spinner="Calculando coortes...")
+def calcular_coortes(_df_base, _indice_opcoes, _indice_datas, fingerprint, col_filtros, definicao, is_value_mode, colunas_soma, trigger):
+    """
+    Métricas de N coortes numa única passada agrupada (ver analises.metricas_por_coorte). 'definicao':
+      - (MODO_COORTES_DIMENSAO, coluna, assinatura, período): uma coorte por valor da coluna, dentro dos filtros dados;
+      - (MODO_COORTES_SALVAS, ((nome, assinatura, período), ...)): uma coorte por conjunto de filtros (podem se sobrepor).
+    Retorna (nomes das coortes, DataFrame de métricas por coorte, total de coortes antes do limite MAX_COORTES).
+    """
+    def posicoes_do_filtro(assinatura, periodo):
+        mascara = mascara_filtros(_df_base, col_filtros, dict(assinatura), _indice_opcoes)
+        return posicoes_de_mascara(combinar_mascaras(mascara, mascara_janela(_indice_datas, periodo)))
+    
+    if definicao[0] == MODO_COORTES_DIMENSAO:
+        _, coluna, assinatura, periodo = definicao
+        posicoes = posicoes_do_filtro(assinatura, periodo)
+        rotulos, nomes = coortes_por_dimensao(_df_base[coluna], posicoes)
+    else:
+        coortes = definicao[1]
+        nomes = [nome for nome, _, _ in coortes]
+        posicoes, rotulos = coortes_por_posicoes([posicoes_do_filtro(assinatura, periodo) for _, assinatura, periodo in coortes], len(_df_base))
+    
+    total_coortes = len(nomes)
+    if total_coortes > MAX_COORTES:
+        rotulos = np.where(rotulos < MAX_COORTES, rotulos, -1)
+        nomes = nomes[:MAX_COORTES]
+    metricas = metricas_por_coorte(_df_base, rotulos, len(nomes), posicoes, is_value_mode, colunas_soma)
+    return nomes, metricas, total_coortes
+
+def salvar_coorte(filtros, periodo):
+    """Callback: guarda os filtros (e o período) atuais da BASE como uma coorte nomeada."""
+    nome = st.session_state.get('coorte_nome_nova', '').strip()
+    if not nome:
+        nome = f"Coorte {len(st.session_state.coortes_salvas) + 1}"
+    st.session_state.coortes_salvas[nome] = (assinatura_filtros(filtros), periodo)
+    st.session_state.coorte_nome_nova = ''
+
+def formatar_variacao_percentual(valor):
+    if not np.isfinite(valor):
+        return "N/A"
+    icone = '▲' if valor > 0 else ('▼' if valor < 0 else '—')
+    return f"{icone} {valor:,.2f} %".replace(",", "X").replace(".", ",").replace("X", ".")
+
+def exibir_comparacao_coortes(df_completo, indice_opcoes, indice_datas, fingerprint, colunas_filtro, coluna_data, filtros_base, periodo_base):
+    """
+    Comparação de N coortes lado a lado (ex.: 12 meses): as métricas de df_resumo em colunas por coorte,
+    com a variação de cada coorte em relação à anterior. Todas as coortes saem de uma única passada agrupada.
+    """
+    st.markdown("### 📅 Comparação Multi-Coorte")
+    
+    col_valor, col_tipo_evento = 'valor', 't'
+    is_value_mode = st.session_state.main_metric_type == 'VALUE' and col_valor in df_completo.columns and col_tipo_evento in df_completo.columns
+    colunas_moeda_outras = [col for col in st.session_state.colunas_valor_salvas if col != col_valor and col in df_completo.columns] if is_value_mode else []
+    colunas_centavos = st.session_state.colunas_centavos_salvas
+    
+    modo = st.radio("Coortes:", options=[MODO_COORTES_DIMENSAO, MODO_COORTES_SALVAS], horizontal=True, key='coortes_modo', label_visibility="collapsed")
+    
+    if modo == MODO_COORTES_DIMENSAO:
+        opcoes_dimensao = [col for col in colunas_filtro if col in df_completo.columns] + ([coluna_data] if coluna_data else [])
+        if not opcoes_dimensao:
+            st.info("Nenhuma coluna de filtro ou de data para formar coortes.")
+            return
+        dimensao = st.selectbox(
+            "Uma coorte por valor de:", 
+            options=opcoes_dimensao, 
+            index=opcoes_dimensao.index('mes') if 'mes' in opcoes_dimensao else 0, 
+            key='coortes_dimensao'
+        )
+        st.caption("As coortes respeitam os filtros e o período da BASE.")
+        definicao = (MODO_COORTES_DIMENSAO, dimensao, assinatura_filtros(filtros_base), periodo_base)
+    else:
+        col_nome, col_salvar, col_limpar = st.columns([3, 2, 1])
+        with col_nome:
+            st.text_input("Nome da coorte", key='coorte_nome_nova', placeholder="ex.: Março/2024", label_visibility="collapsed")
+        with col_salvar:
+            st.button("➕ Salvar filtros da BASE como coorte", on_click=salvar_coorte, args=(filtros_base, periodo_base), use_container_width=True)
+        with col_limpar:
+            if st.button("🗑️ Limpar", key='coortes_limpar', use_container_width=True):
+                st.session_state.coortes_salvas = {}
+        if not st.session_state.coortes_salvas:
+            st.info("Ajuste os filtros da BASE e salve cada conjunto como uma coorte (ex.: um por mês).")
+            return
+        definicao = (MODO_COORTES_SALVAS, tuple((nome, assinatura, periodo) for nome, (assinatura, periodo) in st.session_state.coortes_salvas.items()))
+    
+    nomes, metricas, total_coortes = calcular_coortes(
+        df_completo, indice_opcoes, indice_datas, fingerprint, colunas_filtro, 
+        definicao, is_value_mode, tuple(colunas_moeda_outras), st.session_state['filtro_reset_trigger']
+    )
+    if not nomes:
+        st.info("Nenhuma linha nas coortes selecionadas.")
+        return
+    if total_coortes > len(nomes):
+        st.warning(f"{total_coortes} coortes encontradas: exibindo as {len(nomes)} primeiras.")
+    
+    # Linhas do resumo (métricas x coortes), com as colunas em centavos convertidas para reais
+    linhas = [(chave, rotulo, tipo) for chave, rotulo, tipo in METRICAS_COORTE if chave in metricas.columns]
+    linhas += [(f'soma_{col}', f"SOMA: {col.upper().replace('_', ' ')}", 'Moeda') for col in colunas_moeda_outras if f'soma_{col}' in metricas.columns]
+    valores = metricas[[chave for chave, _, _ in linhas]].to_numpy(dtype='float64').T
+    for i, (chave, _, tipo) in enumerate(linhas):
+        coluna_origem = chave[len('soma_'):] if chave.startswith('soma_') else col_valor
+        if tipo == 'Moeda' and coluna_origem in colunas_centavos:
+            valores[i] = centavos_para_reais(valores[i])
+    
+    rotulos_metricas = [rotulo for _, rotulo, _ in linhas]
+    eh_moeda = np.array([tipo == 'Moeda' for _, _, tipo in linhas])
+    tabela = pd.DataFrame({'Métrica': rotulos_metricas})
+    for j, nome in enumerate(nomes):
+        tabela[nome] = np.where(eh_moeda, formatar_moeda_series(valores[:, j]).to_numpy(), formatar_numero_series(valores[:, j]).to_numpy())
+    st.markdown(f"##### Métricas por Coorte ({len(nomes)} coortes)")
+    st.dataframe(tabela, use_container_width=True, hide_index=True)
+    
+    # Variação de cada coorte em relação à anterior (base 0: 0 se a atual também for 0, senão infinito)
+    if len(nomes) > 1:
+        anterior, atual = valores[:, :-1], valores[:, 1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variacao = np.where(anterior == 0, np.where(atual == 0, 0.0, np.inf), (atual - anterior) / anterior * 100)
+        tabela_variacao = pd.DataFrame({'Métrica': rotulos_metricas})
+        for j in range(1, len(nomes)):
+            tabela_variacao[f"{nomes[j - 1]} → {nomes[j]}"] = [formatar_variacao_percentual(v) for v in variacao[:, j - 1]]
+        st.markdown("##### Variação em Relação à Coorte Anterior")
+        st.dataframe(tabela_variacao, use_container_width=True, hide_index=True)
+
+
+# --- DIFERENÇA ENTRE DOIS DATASETS DO CATÁLOGO (RECONCILIAÇÃO) ---
+
+TODAS_SITUACOES = "Todas"
+
+@st.cache_data(show_spinner="Reconciliando datasets...", max_entries=4)
+def calcular_diferenca(nome_antigo, fingerprint_antigo, nome_novo, fingerprint_novo, chaves, colunas_valor):
+    """
+    Diferença entre dois datasets do catálogo (a chave do cache inclui os fingerprints). Só as colunas de
+    chave e de valor são lidas; colunas em centavos são comparadas em reais.
+    """
+    catalog = load_catalog()
+    registro = get_dataset_registry()
+    colunas = list(chaves) + list(colunas_valor)
+    df_antigo = reais_para_exibicao(registro.obter_colunas(nome_antigo, colunas), catalog[nome_antigo].get('colunas_centavos') or [])
+    df_novo = reais_para_exibicao(registro.obter_colunas(nome_novo, colunas), catalog[nome_novo].get('colunas_centavos') or [])
+    return diferenca_datasets(df_antigo, df_novo, list(chaves), list(colunas_valor))
+
+def exibir_diferenca_datasets(catalog):
+    """
+    Reconciliação entre dois datasets do catálogo (ex.: importação deste mês contra a do mês anterior),
+    alinhados por uma chave (padrão: nr_func, eve, seq): chaves novas, removidas e alteradas, com os deltas de valor.
+    """
+    st.markdown("### 🔀 Diferença entre Datasets do Catálogo")
+    
+    nomes = list(catalog.keys())
+    if len(nomes) < 2:
+        st.info("Carregue ao menos dois datasets para compará-los.")
+        return
+    
+    ativo = st.session_state.current_dataset_name
+    indice_novo = nomes.index(ativo) if ativo in nomes else len(nomes) - 1
+    indice_antigo = indice_novo - 1 if indice_novo > 0 else 1
+    col_antigo, col_novo = st.columns(2)
+    nome_antigo = col_antigo.selectbox("Dataset anterior:", options=nomes, index=indice_antigo, key='diferenca_antigo')
+    nome_novo = col_novo.selectbox("Dataset atual:", options=nomes, index=indice_novo, key='diferenca_novo')
+    if nome_antigo == nome_novo:
+        st.warning("Escolha dois datasets diferentes.")
+        return
+    
+    entrada_antiga, entrada_nova = catalog[nome_antigo], catalog[nome_novo]
+    colunas_comuns = [col for col in entrada_nova.get('colunas', []) if col in set(entrada_antiga.get('colunas', []))]
+    chaves = st.multiselect(
+        "Chave de alinhamento:", 
+        options=colunas_comuns, 
+        default=[col for col in CHAVES_DIFERENCA if col in colunas_comuns], 
+        key='diferenca_chaves'
+    )
+    # Colunas de valor numéricas nos dois datasets
+    tipos_antigos, tipos_novos = entrada_antiga.get('tipos', {}), entrada_nova.get('tipos', {})
+    eh_numerico = lambda tipo: tipo.lower().startswith(('int', 'uint', 'float'))
+    colunas_valor = [
+        col for col in entrada_nova.get('colunas_valor_salvas', []) 
+        if col in colunas_comuns and col not in chaves and eh_numerico(tipos_antigos.get(col, '')) and eh_numerico(tipos_novos.get(col, ''))
+    ]
+    if not chaves or not colunas_valor:
+        st.info("Selecione a chave de alinhamento (os datasets precisam de uma coluna de valor numérica em comum).")
+        return
+    
+    definicao = (nome_antigo, entrada_antiga.get('fingerprint'), nome_novo, entrada_nova.get('fingerprint'), tuple(chaves), tuple(colunas_valor))
+    if st.button("🔀 Comparar Datasets", key='diferenca_btn'):
+        st.session_state.diferenca_ativa = definicao
+    if st.session_state.get('diferenca_ativa') != definicao:
+        return
+    
+    resultado, resumo = calcular_diferenca(*definicao)
+    
+    situacoes = [SITUACAO_NOVO, SITUACAO_REMOVIDO, SITUACAO_ALTERADO, SITUACAO_MANTIDO]
+    cartoes = st.columns(len(situacoes) + 1)
+    for coluna_st, situacao in zip(cartoes, situacoes):
+        coluna_st.metric(f"Chaves: {situacao}", formatar_contagem(resumo[situacao]))
+    col_principal = colunas_valor[0]
+    cartoes[-1].metric(f"Δ {col_principal.replace('_', ' ').title()}", formatar_moeda(resumo[f'delta_{col_principal}']))
+    
+    if resultado.empty:
+        st.success("Nenhuma diferença entre os datasets nas chaves escolhidas.")
+        return
+    
+    mostrar = st.radio("Mostrar:", options=[TODAS_SITUACOES, SITUACAO_NOVO, SITUACAO_REMOVIDO, SITUACAO_ALTERADO], horizontal=True, key='diferenca_situacao')
+    posicoes = None if mostrar == TODAS_SITUACOES else np.flatnonzero(resultado['situacao'].to_numpy() == mostrar)
+    colunas_moeda = [col for col in resultado.columns if col.startswith(tuple(f'{c}_' for c in colunas_valor) + ('delta_',))]
+    exibir_tabela_paginada(resultado, 'diferenca', assinatura=(definicao, mostrar), posicoes=posicoes, colunas_moeda=colunas_moeda)
+    exibir_botoes_exportacao(
+        resultado, 'diferenca',
+        f'diferenca_{nome_antigo}_{nome_novo}_{datetime.now().strftime("%Y%m%d_%H%M")}',
+        posicoes=posicoes
+    )
+
 
 # --- SIDEBAR (CONFIGURAÇÕES E UPLOAD) ---
 with st.sidebar:
@@ -480,22 +1322,21 @@ with st.sidebar:
     
     if st.button("Limpar Cache de Dados e Persistência"):
         st.cache_data.clear()
-        if os.path.exists(PERSISTENCE_PATH):
+        if os.path.exists(catalogo_colunar.caminho_manifesto):
             try:
-                os.remove(PERSISTENCE_PATH)
-                st.session_state.data_sets_catalog = {}
-                st.session_state.dados_atuais = pd.DataFrame()
+                catalogo_colunar.limpar()
+                get_dataset_registry().descartar()
                 st.sidebar.success("Cache e dados de persistência limpos.")
             except Exception as e:
-                st.sidebar.error(f"Erro ao remover arquivo de persistência: {e}")
+                st.sidebar.error(f"Erro ao remover arquivos de persistência: {e}")
+        remover_uploads(st.session_state.get('uploaded_files_paths', {}).values())
         
         keys_to_clear = [k for k in st.session_state.keys() if not k.startswith('_')]
         for key in keys_to_clear:
-            if key not in ['data_sets_catalog', 'dados_atuais']:
-                try:
-                    del st.session_state[key]
-                except:
-                    pass
+            try:
+                del st.session_state[key]
+            except:
+                pass
         st.info("Estado da sessão limpo! Recarregando...")
         st.rerun()
     
@@ -529,8 +1370,37 @@ with st.sidebar:
     # Seção 1: Upload e Processamento
     st.header("1. Upload e Processamento")
     
+    # Resultado do planejador de tipos no último processamento desta sessão
+    if st.session_state.get('relatorio_memoria'):
+        nome_relatorio, memoria_antes, memoria_depois = st.session_state.relatorio_memoria
+        reducao = 1 - memoria_depois / memoria_antes if memoria_antes else 0
+        st.caption(
+            f"💾 '{nome_relatorio}' em memória: {memoria_antes / (1024 * 1024):,.1f} MB → "
+            f"{memoria_depois / (1024 * 1024):,.1f} MB ({reducao:.0%} menor)"
+        )
+    
+    # Valores que a ingestão em blocos não conseguiu converter ao tipo da amostra (gravados como ausentes)
+    if st.session_state.get('relatorio_descartados'):
+        nome_relatorio, descartados = st.session_state.relatorio_descartados
+        detalhes = "; ".join(f"'{col}': {formatar_contagem(qtd)}" for col, qtd in descartados.items())
+        st.warning(
+            f"⚠️ '{nome_relatorio}': valores incompatíveis com o tipo definido pela amostra foram gravados como "
+            f"ausentes ({detalhes})."
+        )
+    
+    # Dataset de uma tarefa desta sessão que acabou de ser ativado
+    if st.session_state.get('dataset_recem_processado'):
+        st.success(f"Dataset '{st.session_state.pop('dataset_recem_processado')}' processado e salvo no catálogo!")
+        st.balloons()
+    
+    # Tarefas de ingestão em segundo plano (o painel se atualiza sozinho enquanto houver alguma em andamento)
+    if get_job_registry().em_andamento():
+        exibir_tarefas_ao_vivo()
+    else:
+        exibir_tarefas()
+    
     # Lista de nomes de arquivo carregados, para o processamento
-    uploaded_file_names = list(st.session_state.uploaded_files_data.keys())
+    uploaded_file_names = list(st.session_state.uploaded_files_paths.keys())
     
     # Nome padrão baseado no upload
     if len(uploaded_file_names) == 1:
@@ -553,14 +1423,17 @@ with st.sidebar:
         if submit_upload and uploaded_files_new:
             newly_added = []
             for file in uploaded_files_new:
-                st.session_state.uploaded_files_data[file.name] = file.read()
+                # O conteúdo vai para o disco (em blocos); a sessão guarda apenas o caminho e o fingerprint
+                caminho, fingerprint_arquivo = salvar_upload(file, UPLOAD_DIR)
+                st.session_state.uploaded_files_paths[file.name] = caminho
+                st.session_state.uploaded_files_fingerprints[file.name] = fingerprint_arquivo
                 newly_added.append(file.name)
             st.success(f"Arquivos adicionados: {', '.join(newly_added)}. Clique em 'Processar' abaixo.")
             st.session_state.show_reconfig_section = True 
             st.session_state.current_dataset_name_input = dataset_name_input
             st.rerun()
 
-    if st.session_state.uploaded_files_data:
+    if st.session_state.uploaded_files_paths:
         st.markdown("---")
         st.markdown("##### Arquivos Pendentes para Processamento:")
         st.button("🔁 Reconfigurar e Processar", 
@@ -571,85 +1444,46 @@ with st.sidebar:
         st.markdown("---")
         
         if st.session_state.show_reconfig_section:
-            df_novo = pd.DataFrame()
-            all_dataframes = []
+            arquivos_pendentes = st.session_state.uploaded_files_paths
             
-            # --- Leitura dos arquivos e concatenação (sem alteração) ---
-            for file_name, file_bytes in st.session_state.uploaded_files_data.items():
-                try:
-                    uploaded_file_stream = BytesIO(file_bytes)
-                    if file_name.endswith('.csv'):
-                        try:
-                            df_temp = pd.read_csv(uploaded_file_stream, sep=';', decimal=',', encoding='utf-8')
-                        except Exception:
-                            uploaded_file_stream.seek(0)
-                            df_temp = pd.read_csv(uploaded_file_stream, sep=',', decimal='.', encoding='utf-8')
-                    elif file_name.endswith('.xlsx'):
-                        df_temp = pd.read_excel(uploaded_file_stream)
-                    
-                    if not df_temp.empty:
-                        all_dataframes.append(df_temp)
-                        
-                except Exception as e:
-                    st.error(f"Erro ao ler o arquivo {file_name}: {e}")
-                    pass 
-
-            if all_dataframes:
-                df_novo = pd.concat(all_dataframes, ignore_index=True)
+            # Fingerprint dos arquivos pendentes (hash calculado uma única vez, ao salvar o upload em disco)
+            fingerprints_arquivos = {nome: st.session_state.uploaded_files_fingerprints[nome] for nome in arquivos_pendentes}
+            fingerprint_upload = calcular_fingerprint(fingerprints_arquivos)
+            
+            # CSVs muito grandes: configura as colunas numa amostra e processa o arquivo completo em blocos
+            modo_em_blocos = usar_modo_em_blocos(arquivos_pendentes.values())
             
-            if df_novo.empty:
+            # --- Leitura e normalização dos arquivos (um processo por arquivo) ---
+            frames_pendentes, colunas_renomeadas, erros_leitura = ler_arquivos_pendentes(
+                arquivos_pendentes, fingerprint_upload, LINHAS_PREVIEW if modo_em_blocos else None
+            )
+            for erro in erros_leitura:
+                st.error(erro)
+            
+            if not frames_pendentes:
                 st.error("O conjunto de dados consolidado está vazio.")
-                st.session_state.dados_atuais = pd.DataFrame() 
             else:
                 
-                # --- Limpeza de Colunas (Limpeza agressiva) ---
-                raw_columns = df_novo.columns.copy()
-                cleaned_columns = (
-                    raw_columns.astype(str)
-                    .str.strip()
-                    .str.lower()
-                    .str.normalize('NFKD')
-                    .str.encode('ascii', 'ignore').str.decode('utf-8')
-                    .str.replace(r'[^a-z0-9]+', '_', regex=True) 
-                    .str.strip('_') 
-                )
-                df_novo.columns = cleaned_columns
-                colunas_disponiveis = df_novo.columns.tolist()
-
-                # --- VERIFICAÇÃO E RENOMEAÇÃO CRÍTICA (NOME_FUNCIONARIO, T, VALOR) ---
-                
-                # 1. Renomeação de NOME_FUNCIONARIO
-                target_col_func = 'nome_funcionario'
-                if target_col_func not in colunas_disponiveis:
-                    func_candidates = [col for col in colunas_disponiveis if 'nome' in col and 'func' in col]
-                    if func_candidates:
-                        df_novo.rename(columns={func_candidates[0]: target_col_func}, inplace=True)
-                        colunas_disponiveis = df_novo.columns.tolist() 
-                        st.sidebar.info(f"Col. de Funcionário renomeada para '{target_col_func}'.")
-
-                # 2. Renomeação de T (Tipo de Evento: Crédito/Débito)
-                target_col_t = 't'
-                if target_col_t not in colunas_disponiveis:
-                    t_candidates = [col for col in colunas_disponiveis if 'tipo' in col and any(k in col for k in ['eve', 'mov', 'lan', 't'])]
-                    if t_candidates:
-                        df_novo.rename(columns={t_candidates[0]: target_col_t}, inplace=True)
-                        colunas_disponiveis = df_novo.columns.tolist()
-                        st.sidebar.info(f"Col. de Tipo de Evento renomeada para '{target_col_t}'.")
-                
-                # 3. Renomeação de VALOR (O Valor Monetário)
-                target_col_valor = 'valor'
-                if target_col_valor not in colunas_disponiveis:
-                    valor_candidates = [col for col in colunas_disponiveis if any(k in col for k in ['vlr', 'vl', 'montante', 'total']) and not any(k in col for k in ['base', 'liqui', 'bruto', 'horas', 'rateio'])]
-                    if valor_candidates:
-                        df_novo.rename(columns={valor_candidates[0]: target_col_valor}, inplace=True)
-                        colunas_disponiveis = df_novo.columns.tolist()
-                        st.sidebar.info(f"Col. de Valor renomeada para '{target_col_valor}'.")
-
-                # --- FIM DA VERIFICAÇÃO CRÍTICA ---
+                # --- Limpeza de Colunas + VERIFICAÇÃO E RENOMEAÇÃO CRÍTICA (NOME_FUNCIONARIO, T, VALOR), feitas na leitura ---
+                colunas_disponiveis = colunas_alinhadas(frames_pendentes)
+                total_linhas_pendentes = sum(len(df) for df in frames_pendentes)
                 
+                if 'nome_funcionario' in colunas_renomeadas:
+                    st.sidebar.info("Col. de Funcionário renomeada para 'nome_funcionario'.")
+                if 't' in colunas_renomeadas:
+                    st.sidebar.info("Col. de Tipo de Evento renomeada para 't'.")
+                if 'valor' in colunas_renomeadas:
+                    st.sidebar.info("Col. de Valor renomeada para 'valor'.")
                 
                 # --- Seleção de Tipos e Filtros ---
-                st.info(f"Total de {len(df_novo)} linhas para configurar.")
+                if modo_em_blocos:
+                    tamanho_mb = sum(os.path.getsize(c) for c in arquivos_pendentes.values()) / (1024 * 1024)
+                    st.info(
+                        f"Arquivos grandes ({tamanho_mb:,.0f} MB): configuração feita sobre as primeiras {total_linhas_pendentes} linhas. "
+                        f"O processamento lerá os arquivos completos em blocos de {LINHAS_POR_BLOCO} linhas."
+                    )
+                else:
+                    st.info(f"Total de {total_linhas_pendentes} linhas para configurar.")
                 
                 moeda_default = [col for col in colunas_disponiveis if any(word in col for word in ['valor', 'salario', 'custo', 'receita', 'montante'])]
                 if 'moeda_select' not in st.session_state: initialize_widget_state('moeda_select', moeda_default)
@@ -665,13 +1499,19 @@ with st.sidebar:
                 
                 st.markdown("##### 💰 Colunas de VALOR (R$)")
                 colunas_moeda = st.multiselect("Selecione:", options=colunas_disponiveis, default=st.session_state.moeda_select, key='moeda_select', label_visibility="collapsed")
+                moeda_em_centavos = st.checkbox(
+                    "Somas exatas (centavos inteiros)",
+                    key='moeda_centavos_check',
+                    help="Grava as colunas de valor como centavos em inteiro de 64 bits: somas sem erro de arredondamento em milhões de eventos."
+                )
                 
                 st.markdown("---")
                 st.markdown("##### 📝 Colunas TEXTO/ID")
                 colunas_texto = st.multiselect("Selecione:", options=colunas_disponiveis, default=st.session_state.texto_select, key='texto_select', label_visibility="collapsed")
                 st.markdown("---")
                 
-                df_processado = inferir_e_converter_tipos(df_novo, colunas_texto, colunas_moeda)
+                df_processado = inferir_tipos_cache(frames_pendentes, fingerprint_upload, colunas_texto, colunas_moeda, moeda_em_centavos)
+                colunas_centavos = [col for col in colunas_moeda if col in df_processado.columns] if moeda_em_centavos else []
                 
                 colunas_para_filtro_options = df_processado.select_dtypes(include=['object', 'category']).columns.tolist()
                 filtro_default = [c for c in colunas_para_filtro_options if c in ['t', 'descricao_evento', 'nome_funcionario', 'emp', 'mes', 'ano', 'tipo_processo']] 
@@ -691,26 +1531,62 @@ with st.sidebar:
                         st.warning("Selecione pelo menos uma coluna na seção 'Colunas para FILTROS'.")
                     else:
                         dataset_name_to_save = st.session_state.get('current_dataset_name_input', default_dataset_name)
+                        fingerprint_dataset = calcular_fingerprint(fingerprints_arquivos, {
+                            'colunas_moeda': colunas_moeda,
+                            'colunas_texto': colunas_texto,
+                            'colunas_filtros': colunas_para_filtro,
+                            'main_metric_type': st.session_state.main_metric_type,
+                            'moeda_em_centavos': moeda_em_centavos,
+                        })
                         
-                        sucesso, df_processado_salvo = processar_dados_atuais(
-                            df_processado, 
-                            colunas_para_filtro, 
-                            colunas_valor_dashboard, 
-                            dataset_name_to_save,
+                        # Nome único também entre as tarefas ainda em andamento (que não estão no catálogo)
+                        registro_tarefas = get_job_registry()
+                        base_name = get_clean_dataset_name(
                             uploaded_file_names,
-                            st.session_state.main_metric_type # Usa a Métrica Global
+                            list(load_catalog().keys()) + list(registro_tarefas.nomes_reservados()),
+                            dataset_name_to_save
                         )
-                        if sucesso:
-                            st.success(f"Dataset '{st.session_state.current_dataset_name}' processado e salvo no catálogo!")
-                            st.session_state.uploaded_files_data = {} 
-                            st.session_state.show_reconfig_section = False
-                            st.balloons()
-                            limpar_filtros_salvos() 
-                            st.rerun() 
+                        
+                        # O processamento roda em segundo plano: a página continua respondendo e o
+                        # trabalho não é perdido se ela for recarregada
+                        if modo_em_blocos:
+                            tarefa = registro_tarefas.iniciar(
+                                base_name, ETAPAS_INGESTAO_EM_BLOCOS, processar_dados_em_blocos,
+                                list(arquivos_pendentes.values()),
+                                plano_de_tipos(df_processado, colunas_centavos), # Tipos da amostra valem para todos os blocos
+                                colunas_texto,
+                                colunas_moeda,
+                                base_name,
+                                colunas_para_filtro, 
+                                colunas_valor_dashboard, 
+                                st.session_state.main_metric_type, # Usa a Métrica Global
+                                fingerprint_dataset,
+                                colunas_centavos
+                            )
+                        else:
+                            tarefa = registro_tarefas.iniciar(
+                                base_name, ETAPAS_INGESTAO, processar_dados_atuais,
+                                df_processado, 
+                                base_name,
+                                colunas_para_filtro, 
+                                colunas_valor_dashboard, 
+                                st.session_state.main_metric_type, # Usa a Métrica Global
+                                fingerprint_dataset,
+                                get_dataset_registry(),
+                                colunas_centavos
+                            )
+                            # Os dados já estão em memória: os arquivos enviados não são mais necessários
+                            remover_uploads(arquivos_pendentes.values())
+                        
+                        st.session_state.tarefas_sessao.append(tarefa.id)
+                        st.session_state.uploaded_files_paths = {} 
+                        st.session_state.uploaded_files_fingerprints = {} 
+                        st.session_state.show_reconfig_section = False
+                        st.rerun() 
             
     else: 
         st.session_state.show_reconfig_section = False
-        if not st.session_state.data_sets_catalog:
+        if not data_sets_catalog:
              st.info("Sistema pronto. O Dashboard será exibido após carregar, processar e selecionar um Dataset.")
 
 
@@ -718,16 +1594,18 @@ with st.sidebar:
 
 st.markdown("---") 
 
-if st.session_state.dados_atuais.empty: 
+df_analise_completo = get_active_df() # DataFrame compartilhado (somente leitura), sem cópia por sessão
+
+if df_analise_completo.empty: 
     st.info("Sistema pronto. O Dashboard será exibido após carregar, processar e selecionar um Dataset.")
 else:
-    df_analise_completo = st.session_state.dados_atuais.copy()
     
     # ====================================================================
     # NOVO: PAINEL DE NAVEGAÇÃO POR DATASET (BOTÕES)
     # ====================================================================
     st.markdown("#### 🔄 Dataset Ativo:")
-    dataset_names = list(st.session_state.data_sets_catalog.keys())
+    data_sets_catalog = load_catalog()
+    dataset_names = list(data_sets_catalog.keys())
     
     if dataset_names:
         # Cria as colunas de botões
@@ -746,6 +1624,7 @@ else:
                     on_click=switch_dataset, 
                     args=(name,),
                     type=button_type,
+                    help=describe_dataset(data_sets_catalog[name]),
                     use_container_width=True
                 )
                 
@@ -759,7 +1638,11 @@ else:
 
 
     colunas_categoricas_filtro = st.session_state.colunas_filtros_salvas
+    indice_opcoes_ativo = get_active_options_index()
     _, colunas_data = encontrar_colunas_tipos(df_analise_completo) 
+    # Índice de datas ordenado: a janela de datas de cada lado vira uma busca binária
+    coluna_data, indice_datas_ativo = get_active_date_index(df_analise_completo, colunas_data)
+    limites_data = limites_indice_datas(indice_datas_ativo) if indice_datas_ativo is not None else None
     
     st.markdown("#### 🔍 Configuração de Análise de Variação")
     col_reset_btn = st.columns([4, 1])[1]
@@ -768,10 +1651,10 @@ else:
     
     tab_base, tab_comparacao = st.tabs(["Filtros da BASE (Referência)", "Filtros de COMPARAÇÃO (Alvo)"])
 
-    def render_filter_panel(tab_container, suffix, colunas_filtro_a_exibir, df_analise_base):
+    def render_filter_panel(tab_container, suffix, colunas_filtro_a_exibir, df_analise_base, indice_opcoes, coluna_data=None, limites_data=None):
         
         current_active_filters_dict = {}
-        df_base_temp = df_analise_base.copy()
+        df_base_temp = df_analise_base
         
         with tab_container:
             
@@ -799,8 +1682,8 @@ else:
                     
                     if col not in df_base_temp.columns: continue
                     
-                    options = df_base_temp[col].astype(str).fillna('N/A').unique().tolist()
-                    options.sort()
+                    # Opções já ordenadas no índice do dataset (construído no processamento)
+                    options = opcoes_coluna(indice_opcoes, col)
                     
                     widget_key = f'filtro_key_{suffix}_{col}'
                     
@@ -840,54 +1723,124 @@ else:
                     
                     col_index += 1
             
+            # Período de datas próprio de cada lado (ex.: BASE = março, COMPARAÇÃO = abril)
+            periodo = None
+            if limites_data is not None:
+                data_min, data_max = limites_data[0].date(), limites_data[1].date()
+                widget_key = f'date_range_key_{suffix}_{coluna_data}'
+                # Inicializa com o intervalo total; reinicia quando o intervalo do dataset muda (troca de dataset)
+                if widget_key not in st.session_state or st.session_state.get(f'limites_{widget_key}') != (data_min, data_max):
+                    st.session_state[widget_key] = (data_min, data_max)
+                    st.session_state[f'limites_{widget_key}'] = (data_min, data_max)
+                
+                st.markdown(f"##### 🗓️ Período ({coluna_data})")
+                selecao_datas = st.date_input(
+                    f"Período {coluna_data}",
+                    min_value=data_min,
+                    max_value=data_max,
+                    format="DD/MM/YYYY",
+                    key=widget_key,
+                    label_visibility="collapsed"
+                )
+                # Intervalo incompleto (só a data inicial escolhida) ou total não restringe linhas
+                if len(selecao_datas) == 2 and tuple(selecao_datas) != (data_min, data_max):
+                    periodo = (selecao_datas[0].isoformat(), selecao_datas[1].isoformat())
+            
             if suffix == 'base':
                 st.session_state.active_filters_base = current_active_filters_dict
             else:
                 st.session_state.active_filters_comp = current_active_filters_dict
                 
-            return current_active_filters_dict, None
+            return current_active_filters_dict, periodo
 
     
     # Execução e Aplicação de Filtros
     
-    filtros_base, _ = render_filter_panel(tab_base, 'base', colunas_categoricas_filtro, df_analise_completo)
-    filtros_comp, _ = render_filter_panel(tab_comparacao, 'comp', colunas_categoricas_filtro, df_analise_completo)
+    filtros_base, periodo_base = render_filter_panel(tab_base, 'base', colunas_categoricas_filtro, df_analise_completo, indice_opcoes_ativo, coluna_data, limites_data)
+    filtros_comp, periodo_comp = render_filter_panel(tab_comparacao, 'comp', colunas_categoricas_filtro, df_analise_completo, indice_opcoes_ativo, coluna_data, limites_data)
     
-    df_filtrado_base, df_filtrado_comp = aplicar_filtros_comparacao(
+    fingerprint_ativo = load_catalog()[st.session_state.current_dataset_name].get('fingerprint')
+    
+    pos_filtrado_base, pos_filtrado_comp = aplicar_filtros_comparacao(
         df_analise_completo, 
+        indice_opcoes_ativo,
+        indice_datas_ativo,
+        fingerprint_ativo,
         colunas_categoricas_filtro, 
-        filtros_base, 
-        filtros_comp, 
-        colunas_data, 
+        assinatura_filtros(filtros_base), 
+        assinatura_filtros(filtros_comp), 
+        coluna_data, 
+        periodo_base,
+        periodo_comp,
         st.session_state['filtro_reset_trigger']
     )
     
-    st.session_state.df_filtrado_base = df_filtrado_base
-    st.session_state.df_filtrado_comp = df_filtrado_comp
-    
     st.markdown("---")
     
     gerar_analise_expert(
         df_analise_completo, 
-        df_filtrado_base, 
-        df_filtrado_comp, 
+        pos_filtrado_base, 
+        pos_filtrado_comp, 
         filtros_base, 
         filtros_comp, 
-        colunas_data
+        [coluna_data] if coluna_data else [],
+        indice_opcoes_ativo,
+        periodo_base,
+        periodo_comp,
+        limites_data
+    )
+
+
+    st.markdown("---")
+    exibir_comparacao_coortes(
+        df_analise_completo, 
+        indice_opcoes_ativo, 
+        indice_datas_ativo, 
+        fingerprint_ativo, 
+        colunas_categoricas_filtro, 
+        coluna_data, 
+        filtros_base, 
+        periodo_base
     )
 
 
     st.markdown("---")
     st.markdown("### 💾 DataFrames Ativos (Visualização)")
     
+    # Tabelas e exportações mostram todas as colunas enviadas, não só as usadas na análise
+    df_detalhe = get_active_detail_df(df_analise_completo)
     col_base_view, col_comp_view = st.columns(2)
     
     with col_base_view:
         st.subheader("Base (Referência)")
-        st.caption(f"Linhas: {len(df_filtrado_base)}")
-        st.dataframe(df_filtrado_base.head(5))
+        exibir_tabela_paginada(
+            df_detalhe, 'base',
+            assinatura=(st.session_state.current_dataset_name, fingerprint_ativo, assinatura_filtros(filtros_base), periodo_base, st.session_state['filtro_reset_trigger']),
+            posicoes=pos_filtrado_base,
+            colunas_centavos=st.session_state.colunas_centavos_salvas
+        )
+        exibir_botoes_exportacao(
+            df_detalhe, 'base',
+            f'{st.session_state.current_dataset_name}_base_{datetime.now().strftime("%Y%m%d_%H%M")}',
+            posicoes=pos_filtrado_base,
+            colunas_centavos=st.session_state.colunas_centavos_salvas
+        )
         
     with col_comp_view:
         st.subheader("Comparação (Alvo)")
-        st.caption(f"Linhas: {len(df_filtrado_comp)}")
-        st.dataframe(df_filtrado_comp.head(5))
+        exibir_tabela_paginada(
+            df_detalhe, 'comp',
+            assinatura=(st.session_state.current_dataset_name, fingerprint_ativo, assinatura_filtros(filtros_comp), periodo_comp, st.session_state['filtro_reset_trigger']),
+            posicoes=pos_filtrado_comp,
+            colunas_centavos=st.session_state.colunas_centavos_salvas
+        )
+        exibir_botoes_exportacao(
+            df_detalhe, 'comp',
+            f'{st.session_state.current_dataset_name}_comparacao_{datetime.now().strftime("%Y%m%d_%H%M")}',
+            posicoes=pos_filtrado_comp,
+            colunas_centavos=st.session_state.colunas_centavos_salvas
+        )
+
+
+    st.markdown("---")
+    exibir_diferenca_datasets(load_catalog())
@@ -0,0 +1,103 @@
+# exportacao.py - Exportação sob demanda (CSV, Parquet, XLSX) gravada em blocos de linhas
+
+import io
+import tempfile
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils import reais_para_exibicao
+
+TAMANHO_BLOCO_EXPORTACAO = 100_000 # Linhas materializadas por vez durante a exportação
+LIMITE_MEMORIA_EXPORTACAO = 32 * 1024 * 1024 # Acima disso o arquivo gerado vai para um temporário em disco
+LIMITE_LINHAS_XLSX = 1_048_575 # Linhas de dados numa planilha do Excel (1.048.576 menos o cabeçalho)
+
+# Formato -> (extensão, tipo MIME)
+FORMATOS_EXPORTACAO = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'XLSX': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+
+def blocos_de_linhas(df, posicoes=None, colunas_centavos=(), tamanho_bloco=TAMANHO_BLOCO_EXPORTACAO):
+    """
+    Percorre uma visão filtrada ('posicoes' = linhas da visão, None = df inteiro) em blocos de até
+    'tamanho_bloco' linhas. Só o bloco atual é copiado; colunas em centavos saem em reais.
+    """
+    total = len(df) if posicoes is None else len(posicoes)
+    for inicio in range(0, total, tamanho_bloco):
+        fim = min(inicio + tamanho_bloco, total)
+        bloco = df.iloc[inicio:fim] if posicoes is None else df.iloc[np.asarray(posicoes)[inicio:fim]]
+        yield reais_para_exibicao(bloco, colunas_centavos)
+
+
+def _escrever_csv(blocos, destino):
+    # Mesmo formato da exportação original (';' e vírgula decimal), cabeçalho só no primeiro bloco
+    texto = io.TextIOWrapper(destino, encoding='utf-8', newline='')
+    for numero, bloco in enumerate(blocos):
+        bloco.to_csv(texto, index=False, header=numero == 0, sep=';', decimal=',')
+    texto.flush()
+    texto.detach() # Devolve o destino sem fechá-lo
+
+
+def _escrever_parquet(blocos, destino):
+    # Cada bloco vira um row group; o esquema do primeiro bloco vale para os demais
+    escritor = None
+    try:
+        for bloco in blocos:
+            if escritor is None:
+                tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+                escritor = pq.ParquetWriter(destino, tabela.schema)
+            else:
+                tabela = pa.Table.from_pandas(bloco, schema=escritor.schema, preserve_index=False)
+            escritor.write_table(tabela)
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+
+def _valores_xlsx(bloco):
+    """Linhas do bloco como tuplas de valores aceitos pelo openpyxl (ausentes viram célula vazia)."""
+    bloco = bloco.astype(object)
+    return bloco.where(bloco.notna(), None).itertuples(index=False, name=None)
+
+
+def _escrever_xlsx(blocos, destino):
+    from openpyxl import Workbook
+
+    # write_only: as linhas são gravadas em sequência, sem manter o modelo de células em memória
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet('Dados')
+    cabecalho = False
+    for bloco in blocos:
+        if not cabecalho:
+            aba.append([str(col) for col in bloco.columns])
+            cabecalho = True
+        for linha in _valores_xlsx(bloco):
+            aba.append(linha)
+    planilha.save(destino)
+
+
+_ESCRITORES = {'CSV': _escrever_csv, 'Parquet': _escrever_parquet, 'XLSX': _escrever_xlsx}
+
+
+def exportar(df, formato, posicoes=None, colunas_centavos=(), tamanho_bloco=TAMANHO_BLOCO_EXPORTACAO):
+    """
+    Gera o arquivo de exportação de uma visão filtrada no 'formato' pedido (chave de FORMATOS_EXPORTACAO),
+    gravando bloco a bloco num temporário (em memória até LIMITE_MEMORIA_EXPORTACAO, depois em disco).
+    Retorna o conteúdo em bytes, formato aceito por st.download_button, que de todo modo carrega o arquivo
+    inteiro: só o resultado final fica em memória. Pensada para ser chamada só quando o download é pedido.
+    """
+    total = len(df) if posicoes is None else len(posicoes)
+    if formato == 'XLSX' and total > LIMITE_LINHAS_XLSX:
+        raise ValueError(f"XLSX aceita no máximo {LIMITE_LINHAS_XLSX} linhas; a visão tem {total}.")
+
+    blocos = blocos_de_linhas(df, posicoes, colunas_centavos, tamanho_bloco)
+    if total == 0:
+        blocos = iter([reais_para_exibicao(df.iloc[:0], colunas_centavos)]) # Só o cabeçalho / esquema
+    with tempfile.SpooledTemporaryFile(max_size=LIMITE_MEMORIA_EXPORTACAO) as destino:
+        _ESCRITORES[formato](blocos, destino)
+        destino.seek(0)
+        return destino.read()
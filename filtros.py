@@ -0,0 +1,231 @@
+# filtros.py - Motor de filtros sobre colunas categóricas (códigos inteiros + tabelas de consulta)
+
+import numpy as np
+import pandas as pd
+
+# Rótulo exibido para valores ausentes; 'nan' (astype(str) sobre NaN) também é aceito na seleção
+ROTULO_AUSENTE = 'N/A'
+ROTULOS_AUSENTE_ACEITOS = {ROTULO_AUSENTE, 'nan'}
+
+
+def garantir_categoricas(df, colunas):
+    """
+    Converte as colunas de filtro para 'category' (dicionário de valores + códigos inteiros).
+    Feito uma única vez no processamento; retorna o mesmo DataFrame se nada precisar mudar.
+    """
+    a_converter = [col for col in colunas if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype)]
+    if not a_converter:
+        return df
+    df = df.copy(deep=False)
+    for col in a_converter:
+        df[col] = df[col].astype('category')
+    return df
+
+
+def rotulos_categoria(serie):
+    """Rótulos (str) das categorias de uma coluna categórica, na ordem dos códigos."""
+    return serie.cat.categories.astype(str).tolist()
+
+
+def mascara_selecao(serie, selecao):
+    """
+    Máscara booleana das linhas cujo valor (como str) está em 'selecao'.
+    Em colunas categóricas, a comparação de strings é feita só no dicionário de categorias;
+    as linhas são resolvidas por consulta inteira (tabela de consulta indexada pelos códigos).
+    """
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.astype(str).isin(selecao).to_numpy()
+
+    selecao = set(selecao)
+    # Última posição da tabela atende o código -1 (valor ausente)
+    tabela = np.zeros(len(serie.cat.categories) + 1, dtype=bool)
+    tabela[:-1] = serie.cat.categories.astype(str).isin(selecao)
+    tabela[-1] = bool(selecao & ROTULOS_AUSENTE_ACEITOS)
+    return tabela[serie.cat.codes.to_numpy()]
+
+
+def total_opcoes(serie):
+    """Quantidade de opções distintas da coluna (categorias + ausente, se houver)."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return len(serie.cat.categories) + int(bool((serie.cat.codes.to_numpy() == -1).any()))
+    return serie.astype(str).nunique()
+
+
+def _total_opcoes_coluna(df, col, indice_opcoes):
+    if indice_opcoes and col in indice_opcoes:
+        return len(indice_opcoes[col]['valores'])
+    return total_opcoes(df[col])
+
+
+def _selecoes_parciais(df, col_filtros, filtros_ativos, indice_opcoes):
+    """Gera (coluna, seleção) apenas para os filtros que restringem linhas (nem vazios nem TOTAL)."""
+    for col in col_filtros:
+        selecao = filtros_ativos.get(col)
+        if col not in df.columns or not selecao:
+            continue
+        if len(selecao) >= _total_opcoes_coluna(df, col, indice_opcoes):
+            continue # Filtro TOTAL: ignorado
+        yield col, selecao
+
+
+def mascara_filtros(df, col_filtros, filtros_ativos, indice_opcoes=None):
+    """
+    Combina (AND bit a bit) as máscaras de todas as colunas com filtro parcial.
+    Seleções vazias ou com todas as opções não restringem nada; o total de opções vem do
+    índice de opções do dataset, quando disponível.
+    Retorna None quando nenhum filtro está ativo (evita alocar a máscara).
+    """
+    mascara = None
+    for col, selecao in _selecoes_parciais(df, col_filtros, filtros_ativos, indice_opcoes):
+        mascara_col = mascara_selecao(df[col], selecao)
+        mascara = mascara_col if mascara is None else (mascara & mascara_col)
+    return mascara
+
+
+def mascaras_comparacao(df, col_filtros, filtros_base, filtros_comp, indice_opcoes=None):
+    """
+    Máscaras de BASE e COMPARAÇÃO numa única passada: a máscara de cada (coluna, seleção)
+    é calculada uma vez e reutilizada pelos dois lados quando as seleções coincidem.
+    Retorna (mascara_base, mascara_comp); None significa "todas as linhas".
+    """
+    mascaras_coluna = {}
+
+    def _combinar(filtros_ativos):
+        mascara = None
+        for col, selecao in _selecoes_parciais(df, col_filtros, filtros_ativos, indice_opcoes):
+            chave = (col, frozenset(selecao))
+            if chave not in mascaras_coluna:
+                mascaras_coluna[chave] = mascara_selecao(df[col], selecao)
+            mascara = mascaras_coluna[chave] if mascara is None else (mascara & mascaras_coluna[chave])
+        return mascara
+
+    return _combinar(filtros_base), _combinar(filtros_comp)
+
+
+def combinar_mascaras(mascara_a, mascara_b):
+    """AND de duas máscaras em que None significa "todas as linhas"."""
+    if mascara_a is None:
+        return mascara_b
+    if mascara_b is None:
+        return mascara_a
+    return mascara_a & mascara_b
+
+
+def coluna_data_principal(colunas_data):
+    """Coluna de data usada nos filtros de período: 'data_referencia' (ano/mês) se existir, senão a primeira."""
+    if not colunas_data:
+        return None
+    return 'data_referencia' if 'data_referencia' in colunas_data else colunas_data[0]
+
+
+def construir_indice_datas(serie):
+    """
+    Índice de datas ordenado de uma coluna: as posições das linhas com data preenchida em ordem cronológica
+    ('posicoes') e as datas nessa mesma ordem ('datas', datetime64[ns]). Construído uma vez por dataset;
+    um intervalo de datas vira uma fatia contígua encontrada por busca binária (searchsorted).
+    """
+    valores = pd.to_datetime(serie, errors='coerce').to_numpy(dtype='datetime64[ns]')
+    preenchidas = np.flatnonzero(~np.isnat(valores))
+    ordem = preenchidas[np.argsort(valores[preenchidas], kind='stable')]
+    if len(valores) < np.iinfo(np.int32).max:
+        ordem = ordem.astype(np.int32)
+    return {'posicoes': ordem, 'datas': valores[ordem], 'total_linhas': len(valores)}
+
+
+def limites_indice_datas(indice_datas):
+    """Primeira e última data do índice (Timestamps), ou None se a coluna não tiver datas."""
+    datas = indice_datas['datas']
+    if len(datas) == 0:
+        return None
+    return pd.Timestamp(datas[0]), pd.Timestamp(datas[-1])
+
+
+def mascara_periodo(indice_datas, inicio, fim):
+    """
+    Máscara das linhas com data em [inicio, fim] (limites inclusivos; None = sem limite daquele lado).
+    Duas buscas binárias delimitam a fatia do índice; só as linhas dela são marcadas.
+    Retorna None se o período abrange todas as linhas (nenhuma restrição).
+    """
+    datas = indice_datas['datas']
+    a = np.searchsorted(datas, pd.Timestamp(inicio).to_datetime64(), side='left') if inicio is not None else 0
+    b = np.searchsorted(datas, pd.Timestamp(fim).to_datetime64(), side='right') if fim is not None else len(datas)
+    if a == 0 and b == len(datas) == indice_datas['total_linhas']:
+        return None
+    mascara = np.zeros(indice_datas['total_linhas'], dtype=bool)
+    mascara[indice_datas['posicoes'][a:b]] = True
+    return mascara
+
+
+def posicoes_de_mascara(mascara):
+    """Converte uma máscara em posições de linha (int32 quando cabe); None continua significando "todas"."""
+    if mascara is None:
+        return None
+    posicoes = np.flatnonzero(mascara)
+    return posicoes.astype(np.int32) if len(mascara) < np.iinfo(np.int32).max else posicoes
+
+
+def contar_linhas(df, posicoes):
+    """Quantidade de linhas de uma visão (posicoes=None: DataFrame inteiro)."""
+    return len(df) if posicoes is None else len(posicoes)
+
+
+def selecionar_linhas(df, posicoes, colunas=None, limite=None):
+    """
+    Materializa uma visão filtrada: apenas as 'colunas' pedidas (as que existirem) e as linhas em 'posicoes'
+    (no máximo 'limite' linhas). Use só onde um DataFrame é realmente necessário (ex.: exibição, agregações).
+    """
+    base = df if colunas is None else df[[col for col in colunas if col in df.columns]]
+    if posicoes is None:
+        return base if limite is None else base.iloc[:limite]
+    return base.iloc[posicoes if limite is None else posicoes[:limite]]
+
+
+def construir_indice_opcoes(df, colunas):
+    """
+    Índice de opções dos filtros: para cada coluna, os valores distintos (str, ordenados) e suas contagens.
+    Construído uma única vez no processamento e reutilizado por widgets, rótulos e resets.
+    """
+    indice = {}
+    for col in colunas:
+        if col not in df.columns:
+            continue
+        serie = df[col]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos = serie.cat.codes.to_numpy()
+            contagens = np.bincount(codigos[codigos >= 0], minlength=len(serie.cat.categories))
+            pares = [(rotulo, int(qtd)) for rotulo, qtd in zip(rotulos_categoria(serie), contagens) if qtd > 0]
+            ausentes = int((codigos == -1).sum())
+        else:
+            contagem_valores = serie.dropna().astype(str).value_counts()
+            pares = [(str(rotulo), int(qtd)) for rotulo, qtd in contagem_valores.items()]
+            ausentes = int(serie.isna().sum())
+        if ausentes:
+            pares.append((ROTULO_AUSENTE, ausentes))
+        pares.sort(key=lambda par: par[0])
+        indice[col] = {
+            'valores': [rotulo for rotulo, _ in pares],
+            'contagens': [qtd for _, qtd in pares],
+        }
+    return indice
+
+
+def combinar_indices_opcoes(indices):
+    """
+    Soma índices de opções parciais (ex.: um por bloco na ingestão em streaming) num único índice
+    equivalente ao que construir_indice_opcoes geraria sobre o dataset inteiro.
+    """
+    contagens_por_coluna = {}
+    for indice in indices:
+        for col, opcoes in indice.items():
+            contagens = contagens_por_coluna.setdefault(col, {})
+            for rotulo, qtd in zip(opcoes['valores'], opcoes['contagens']):
+                contagens[rotulo] = contagens.get(rotulo, 0) + qtd
+    return {
+        col: {'valores': sorted(contagens), 'contagens': [contagens[rotulo] for rotulo in sorted(contagens)]}
+        for col, contagens in contagens_por_coluna.items()
+    }
+
+
+def opcoes_coluna(indice_opcoes, col):
+    """Valores distintos (ordenados) de uma coluna no índice de opções ([] se a coluna não estiver indexada)."""
+    return list(indice_opcoes.get(col, {}).get('valores', []))
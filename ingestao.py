@@ -0,0 +1,530 @@
+# ingestao.py - Leitura dos arquivos enviados: cópia do upload para o disco, normalização de colunas e leitura em blocos
+
+import os
+import re
+import csv
+import codecs
+import uuid
+import hashlib
+import itertools
+from datetime import date, datetime
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from utils import inferir_e_converter_tipos
+
+UPLOAD_DIR = os.path.join('data', 'uploads') # Arquivos enviados aguardando processamento
+TAMANHO_BLOCO_COPIA = 8 * 1024 * 1024 # Bytes copiados por vez do upload para o disco
+LIMITE_STREAMING_BYTES = 256 * 1024 * 1024 # CSVs acima deste tamanho são processados em blocos
+LIMITE_STREAMING_XLSX_BYTES = 32 * 1024 * 1024 # Idem para XLSX (arquivo comprimido: bem mais linhas por byte)
+LINHAS_POR_BLOCO = 250_000 # Linhas por bloco na ingestão em streaming (limita o pico de memória)
+LINHAS_PREVIEW = 50_000 # Linhas lidas para configurar as colunas quando o arquivo será processado em blocos
+MAX_PROCESSOS_INGESTAO = 4 # Processos usados para ler/converter vários arquivos em paralelo
+TAMANHO_AMOSTRA_DIALETO = 64 * 1024 # Bytes do início do CSV inspecionados para detectar o dialeto
+LINHAS_AMOSTRA_DIALETO = 50 # Linhas da amostra usadas para votar separador e decimal
+ERROS_DECODIFICACAO = 'latin1_nos_invalidos' # Tratador para bytes inválidos em UTF-8 fora da amostra
+SEPARADORES_CANDIDATOS = [';', ',', '\t', '|']
+LINHAS_BUSCA_CABECALHO = 20 # Linhas do topo da planilha examinadas para achar o cabeçalho
+
+# Números no padrão brasileiro (1.234,56) e americano (1,234.56), com e sem separador de milhar
+_RE_DECIMAL_VIRGULA = re.compile(r'[-+]?\d[\d.]*,\d+')
+_RE_DECIMAL_PONTO = re.compile(r'[-+]?\d[\d,]*\.\d+')
+_RE_MILHAR_PONTO = re.compile(r'[-+]?\d{1,3}(\.\d{3})+(,\d+)?')
+_RE_MILHAR_VIRGULA = re.compile(r'[-+]?\d{1,3}(,\d{3})+(\.\d+)?')
+
+# Colunas críticas do painel e as heurísticas usadas para encontrá-las quando o nome não é exato
+COL_FUNCIONARIO = 'nome_funcionario'
+COL_TIPO_EVENTO = 't'
+COL_VALOR = 'valor'
+
+
+def salvar_upload(arquivo_enviado, diretorio=UPLOAD_DIR):
+    """
+    Copia um arquivo enviado (UploadedFile ou qualquer objeto com read()) para o disco em blocos,
+    calculando o fingerprint no caminho. Retorna (caminho, fingerprint).
+    O fingerprint é o mesmo de utils.fingerprint_bytes sobre o conteúdo inteiro.
+    Cada chamada grava num arquivo próprio (fingerprint + identificador único): sessões que enviam
+    arquivos com o mesmo nome (ou conteúdo) nunca sobrescrevem nem removem o arquivo umas das outras.
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    identificador = uuid.uuid4().hex
+    temporario = os.path.join(diretorio, f".{identificador}.parcial")
+
+    h = hashlib.blake2b(digest_size=16)
+    arquivo_enviado.seek(0)
+    try:
+        with open(temporario, 'wb') as destino:
+            while True:
+                bloco = arquivo_enviado.read(TAMANHO_BLOCO_COPIA)
+                if not bloco:
+                    break
+                h.update(bloco)
+                destino.write(bloco)
+        # O nome final só é conhecido depois do hash do conteúdo
+        caminho = os.path.join(diretorio, f"{h.hexdigest()}_{identificador}_{os.path.basename(arquivo_enviado.name)}")
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    return caminho, h.hexdigest()
+
+
+def remover_uploads(caminhos):
+    """Remove do disco os arquivos enviados já processados (ignora os que não existem mais)."""
+    for caminho in caminhos:
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+
+def usar_modo_em_blocos(caminhos, limite_bytes=LIMITE_STREAMING_BYTES, limite_xlsx_bytes=LIMITE_STREAMING_XLSX_BYTES):
+    """Indica se algum arquivo pendente (CSV ou XLSX) é grande o bastante para ser processado em blocos."""
+    return any(
+        (caminho.lower().endswith('.csv') and os.path.getsize(caminho) > limite_bytes) or
+        (caminho.lower().endswith('.xlsx') and os.path.getsize(caminho) > limite_xlsx_bytes)
+        for caminho in caminhos
+    )
+
+
+def _ler_amostra(fonte, tamanho):
+    """Lê os primeiros 'tamanho' bytes de um caminho ou objeto de arquivo (a posição do objeto é restaurada)."""
+    if isinstance(fonte, (str, os.PathLike)):
+        with open(fonte, 'rb') as f:
+            return f.read(tamanho)
+    posicao = fonte.tell()
+    amostra = fonte.read(tamanho)
+    fonte.seek(posicao)
+    return amostra
+
+
+def _latin1_nos_invalidos(erro):
+    """
+    Tratador de erros de decodificação: bytes que não formam UTF-8 válido são lidos como Latin-1.
+    Cobre o arquivo Latin-1 cuja amostra só tinha ASCII (o primeiro acento aparece depois dela).
+    """
+    return bytes(erro.object[erro.start:erro.end]).decode('latin-1'), erro.end
+
+
+codecs.register_error(ERROS_DECODIFICACAO, _latin1_nos_invalidos)
+
+
+def _decodificar_amostra(amostra):
+    """Decodifica a amostra como UTF-8 (com ou sem BOM) ou, se falhar, Latin-1. Retorna (texto, encoding)."""
+    try:
+        # Decodificador incremental: um caractere multibyte cortado no fim da amostra não é erro
+        texto = codecs.getincrementaldecoder('utf-8-sig')().decode(amostra, final=False)
+        return texto, 'utf-8-sig' if amostra.startswith(codecs.BOM_UTF8) else 'utf-8'
+    except UnicodeDecodeError:
+        return amostra.decode('latin-1'), 'latin-1'
+
+
+def _escolher_separador(linhas):
+    """Separador com mais colunas no cabeçalho entre os que mantêm o mesmo número de campos nas linhas da amostra."""
+    melhor, melhor_pontuacao = SEPARADORES_CANDIDATOS[0], (0, 0)
+    for sep in SEPARADORES_CANDIDATOS:
+        campos_por_linha = [len(campos) for campos in csv.reader(linhas, delimiter=sep)]
+        if not campos_por_linha or campos_por_linha[0] < 2:
+            continue
+        consistencia = sum(qtd == campos_por_linha[0] for qtd in campos_por_linha) / len(campos_por_linha)
+        pontuacao = (consistencia, campos_por_linha[0])
+        if pontuacao > melhor_pontuacao:
+            melhor, melhor_pontuacao = sep, pontuacao
+    return melhor
+
+
+def _escolher_decimal_e_milhar(linhas, sep):
+    """Vota a marca decimal e o separador de milhar pelos campos numéricos das linhas de dados."""
+    valores = [campo.strip() for campos in csv.reader(linhas[1:], delimiter=sep) for campo in campos]
+    if sep == ',':
+        decimal = '.'
+    else:
+        votos_virgula = sum(bool(_RE_DECIMAL_VIRGULA.fullmatch(v)) for v in valores)
+        votos_ponto = sum(bool(_RE_DECIMAL_PONTO.fullmatch(v)) and not _RE_MILHAR_PONTO.fullmatch(v) for v in valores)
+        decimal = '.' if votos_ponto > votos_virgula else ',' # Empate/sem números: padrão da folha (vírgula)
+
+    milhar = '.' if decimal == ',' else ','
+    padrao_milhar = _RE_MILHAR_PONTO if decimal == ',' else _RE_MILHAR_VIRGULA
+    if milhar == sep or not any(padrao_milhar.fullmatch(v) for v in valores):
+        milhar = None
+    return decimal, milhar
+
+
+def detectar_dialeto_csv(fonte):
+    """
+    Detecta separador, marca decimal, separador de milhar e encoding de um CSV inspecionando uma única vez
+    os primeiros KB ('fonte' é um caminho ou objeto de arquivo). O resultado vai direto para pd.read_csv,
+    que então lê o arquivo uma única vez.
+    Como só a amostra é inspecionada, um UTF-8 detectado não é garantido para o resto do arquivo: os bytes
+    inválidos em UTF-8 que aparecerem depois são lidos como Latin-1 em vez de interromper a leitura.
+    """
+    amostra = _ler_amostra(fonte, TAMANHO_AMOSTRA_DIALETO)
+    texto, encoding = _decodificar_amostra(amostra)
+
+    linhas = texto.splitlines()
+    if len(amostra) == TAMANHO_AMOSTRA_DIALETO and len(linhas) > 1:
+        linhas = linhas[:-1] # Última linha provavelmente cortada pela amostra
+    linhas = [linha for linha in linhas if linha.strip()][:LINHAS_AMOSTRA_DIALETO]
+
+    sep = _escolher_separador(linhas)
+    decimal, milhar = _escolher_decimal_e_milhar(linhas, sep)
+    return {'sep': sep, 'decimal': decimal, 'thousands': milhar, 'encoding': encoding, 'encoding_errors': ERROS_DECODIFICACAO}
+
+
+def _pontuacao_aba(area_declarada, linhas):
+    """
+    Pontuação para escolher a aba de dados: maior área declarada (linhas x colunas) e, quando a planilha
+    não declara dimensões, a mais larga e preenchida nas primeiras linhas. Abas de capa/resumo perdem nos dois.
+    """
+    amostra = list(itertools.islice(linhas, LINHAS_BUSCA_CABECALHO))
+    preenchidas = [sum(v is not None and v != '' for v in linha) for linha in amostra]
+    return (area_declarada, max(preenchidas, default=0), sum(qtd > 0 for qtd in preenchidas))
+
+
+def _motor_xlsx_padrao():
+    """'calamine' (leitor nativo, bem mais rápido) se o pacote python-calamine estiver instalado; senão 'openpyxl'."""
+    try:
+        import python_calamine # noqa: F401
+        return 'calamine'
+    except ImportError:
+        return 'openpyxl'
+
+
+def _valor_calamine(valor):
+    # Mesma normalização do pd.read_excel: célula vazia -> None, número inteiro -> int, data -> datetime
+    if valor == '':
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    if type(valor) is date: # Datas sem hora: datetime, como no openpyxl (vira datetime64 no DataFrame)
+        return datetime.combine(valor, datetime.min.time())
+    return valor
+
+
+def _linhas_xlsx(fonte, motor):
+    """Gera as linhas da aba de dados como tuplas de valores (None = célula vazia), sem objetos de célula."""
+    if motor == 'calamine':
+        from python_calamine import CalamineWorkbook
+        if isinstance(fonte, (str, os.PathLike)):
+            workbook = CalamineWorkbook.from_path(fonte)
+        else:
+            workbook = CalamineWorkbook.from_filelike(fonte)
+        abas = [workbook.get_sheet_by_index(i) for i in range(len(workbook.sheet_names))]
+        aba = max(abas, key=lambda a: _pontuacao_aba(a.height * a.width, a.iter_rows()))
+        for linha in aba.iter_rows():
+            yield tuple(_valor_calamine(v) for v in linha)
+        return
+
+    import openpyxl # Mesma dependência do pd.read_excel (requirements.txt)
+    workbook = openpyxl.load_workbook(fonte, read_only=True, data_only=True)
+    try:
+        aba = max(
+            workbook.worksheets,
+            key=lambda a: _pontuacao_aba((a.max_row or 0) * (a.max_column or 0), a.iter_rows(values_only=True))
+        )
+        yield from aba.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _encontrar_cabecalho(linhas_iniciais):
+    """
+    Posição da linha de cabeçalho entre as primeiras linhas da aba: a com mais células de texto,
+    desde que (quase) só tenha texto. Títulos e linhas em branco acima dela são descartados.
+    """
+    melhor, maior = 0, 0
+    for i, linha in enumerate(linhas_iniciais):
+        preenchidas = [v for v in linha if v is not None and str(v).strip() != '']
+        textos = sum(isinstance(v, str) for v in preenchidas)
+        if textos > maior and textos >= 0.8 * len(preenchidas):
+            melhor, maior = i, textos
+    return melhor
+
+
+def _nomes_cabecalho(linha):
+    """Nomes das colunas a partir da linha de cabeçalho (sem colunas vazias à direita e sem nomes repetidos)."""
+    nomes = [str(v).strip() if v is not None else '' for v in linha]
+    while nomes and not nomes[-1]:
+        nomes.pop()
+    vistos = {}
+    resultado = []
+    for i, nome in enumerate(nomes):
+        nome = nome or f"coluna_{i + 1}"
+        vistos[nome] = vistos.get(nome, 0) + 1
+        resultado.append(nome if vistos[nome] == 1 else f"{nome}_{vistos[nome]}")
+    return resultado
+
+
+def _linhas_para_dataframe(linhas, colunas):
+    return pd.DataFrame.from_records(linhas, columns=colunas).infer_objects()
+
+
+def ler_xlsx_em_blocos(fonte, linhas_por_bloco=LINHAS_POR_BLOCO, nrows=None, motor=None):
+    """
+    Lê uma planilha XLSX (caminho ou objeto de arquivo) linha a linha, com cada linha como uma tupla de valores:
+      - 'openpyxl': modo somente leitura (iter_rows(values_only=True)), memória limitada ao bloco atual;
+      - 'calamine': leitor nativo (python-calamine, opcional), muito mais rápido, mas carrega a aba inteira
+        em memória nativa compacta. Padrão quando instalado.
+    Escolhe a aba e a linha de cabeçalho e gera DataFrames de até 'linhas_por_bloco' linhas
+    (no máximo 'nrows' linhas no total). Linhas totalmente vazias são ignoradas.
+    """
+    linhas = _linhas_xlsx(fonte, motor or _motor_xlsx_padrao())
+    try:
+        iniciais = list(itertools.islice(linhas, LINHAS_BUSCA_CABECALHO))
+        if not iniciais:
+            return
+        posicao_cabecalho = _encontrar_cabecalho(iniciais)
+        colunas = _nomes_cabecalho(iniciais[posicao_cabecalho])
+        largura = len(colunas)
+
+        bloco = []
+        total = 0
+        for linha in itertools.chain(iniciais[posicao_cabecalho + 1:], linhas):
+            if nrows is not None and total >= nrows:
+                break
+            valores = tuple(linha[:largura])
+            if all(v is None for v in valores):
+                continue
+            bloco.append(valores + (None,) * (largura - len(valores)))
+            total += 1
+            if len(bloco) >= linhas_por_bloco:
+                yield _linhas_para_dataframe(bloco, colunas)
+                bloco = []
+        if bloco:
+            yield _linhas_para_dataframe(bloco, colunas)
+    finally:
+        linhas.close() # Fecha a planilha mesmo se a leitura parar antes do fim (nrows)
+
+
+def ler_xlsx(fonte, nrows=None):
+    """Lê uma planilha XLSX inteira (ou só as primeiras 'nrows' linhas) pelo leitor somente leitura."""
+    blocos = list(ler_xlsx_em_blocos(fonte, nrows=nrows))
+    if not blocos:
+        return pd.DataFrame()
+    return blocos[0] if len(blocos) == 1 else pd.concat(blocos, ignore_index=True)
+
+
+def ler_arquivo(caminho, nrows=None):
+    """Lê um CSV/XLSX do disco (opcionalmente só as primeiras 'nrows' linhas)."""
+    if caminho.lower().endswith('.csv'):
+        return pd.read_csv(caminho, nrows=nrows, **detectar_dialeto_csv(caminho))
+    if caminho.lower().endswith('.xlsx'):
+        return ler_xlsx(caminho, nrows=nrows)
+    raise ValueError(f"Formato de arquivo não suportado: {os.path.basename(caminho)}")
+
+
+def ler_em_blocos(caminho, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """Gera o conteúdo do arquivo (CSV ou XLSX) em DataFrames de até 'linhas_por_bloco' linhas."""
+    if caminho.lower().endswith('.xlsx'):
+        # Modo em blocos: openpyxl somente leitura, que não carrega a aba inteira
+        yield from ler_xlsx_em_blocos(caminho, linhas_por_bloco, motor='openpyxl')
+        return
+    with pd.read_csv(caminho, chunksize=linhas_por_bloco, **detectar_dialeto_csv(caminho)) as leitor:
+        for bloco in leitor:
+            yield bloco
+
+
+def limpar_nomes_colunas(colunas):
+    """Padroniza nomes de colunas: minúsculas, sem acentos e apenas [a-z0-9_]."""
+    return (
+        pd.Index(colunas).astype(str)
+        .str.strip()
+        .str.lower()
+        .str.normalize('NFKD')
+        .str.encode('ascii', 'ignore').str.decode('utf-8')
+        .str.replace(r'[^a-z0-9]+', '_', regex=True)
+        .str.strip('_')
+        .tolist()
+    )
+
+
+def mapa_colunas_criticas(colunas):
+    """
+    Renomeações para as colunas críticas (funcionário, tipo de evento, valor) quando elas não existem
+    com o nome exato. Retorna {coluna_original: coluna_critica}.
+    """
+    colunas = list(colunas)
+    mapa = {}
+
+    # 1. NOME_FUNCIONARIO
+    if COL_FUNCIONARIO not in colunas:
+        candidatas = [col for col in colunas if 'nome' in col and 'func' in col]
+        if candidatas:
+            mapa[candidatas[0]] = COL_FUNCIONARIO
+
+    # 2. T (Tipo de Evento: Crédito/Débito)
+    if COL_TIPO_EVENTO not in colunas:
+        candidatas = [col for col in colunas if col not in mapa and 'tipo' in col and any(k in col for k in ['eve', 'mov', 'lan', 't'])]
+        if candidatas:
+            mapa[candidatas[0]] = COL_TIPO_EVENTO
+
+    # 3. VALOR (O Valor Monetário)
+    if COL_VALOR not in colunas:
+        candidatas = [col for col in colunas if col not in mapa and any(k in col for k in ['vlr', 'vl', 'montante', 'total']) and not any(k in col for k in ['base', 'liqui', 'bruto', 'horas', 'rateio'])]
+        if candidatas:
+            mapa[candidatas[0]] = COL_VALOR
+
+    return mapa
+
+
+def normalizar_colunas(df):
+    """
+    Aplica a limpeza dos nomes e a renomeação das colunas críticas.
+    Retorna (df, renomeadas) com renomeadas = {coluna_critica: coluna_original}.
+    """
+    df = df.copy(deep=False)
+    df.columns = limpar_nomes_colunas(df.columns)
+    mapa = mapa_colunas_criticas(df.columns)
+    if mapa:
+        df = df.rename(columns=mapa)
+    return df, {alvo: original for original, alvo in mapa.items()}
+
+
+def ler_e_normalizar_arquivo(caminho, nrows=None):
+    """Lê um arquivo e normaliza suas colunas. Executado nos processos do pool; retorna (df, renomeadas)."""
+    return normalizar_colunas(ler_arquivo(caminho, nrows=nrows))
+
+
+def converter_arquivo(df, colunas_texto, colunas_moeda, moeda_em_centavos=False):
+    """Conversão de tipos (moeda, texto, inferência) de um arquivo. Executado nos processos do pool."""
+    return inferir_e_converter_tipos(df, colunas_texto, colunas_moeda, moeda_em_centavos)
+
+
+def mapear_em_paralelo(funcao, lista_argumentos, executor=None):
+    """
+    Aplica funcao(*argumentos) a cada item de 'lista_argumentos', distribuindo os itens entre os processos
+    do 'executor' (concurrent.futures). Sem executor, ou com um único item, roda no processo atual.
+    Retorna, na ordem de entrada, uma lista de (resultado, erro) — erro é None quando a chamada deu certo.
+    """
+    if executor is None or len(lista_argumentos) < 2:
+        futuros = None
+    else:
+        futuros = [executor.submit(funcao, *argumentos) for argumentos in lista_argumentos]
+
+    resultados = []
+    for i, argumentos in enumerate(lista_argumentos):
+        try:
+            resultados.append((funcao(*argumentos) if futuros is None else futuros[i].result(), None))
+        except Exception as e:
+            resultados.append((None, e))
+    return resultados
+
+
+def colunas_alinhadas(frames):
+    """União das colunas dos DataFrames, na ordem em que aparecem."""
+    return list(dict.fromkeys(col for df in frames for col in df.columns))
+
+
+def concatenar_alinhado(frames):
+    """
+    Concatena DataFrames de arquivos diferentes alinhando o esquema: colunas ausentes num arquivo viram
+    ausentes e colunas categóricas são unidas num dicionário comum (pd.concat as transformaria em object).
+    """
+    if len(frames) == 1:
+        return frames[0]
+
+    colunas = colunas_alinhadas(frames)
+    categorias = {}
+    for col in colunas:
+        series = [df[col] for df in frames if col in df.columns]
+        if all(isinstance(serie.dtype, pd.CategoricalDtype) for serie in series):
+            categorias[col] = union_categoricals(series, sort_categories=True, ignore_order=True).categories
+
+    alinhados = []
+    for df in frames:
+        df = df.copy(deep=False)
+        for col, cats in categorias.items():
+            if col in df.columns:
+                df[col] = df[col].cat.set_categories(cats)
+            else:
+                df[col] = pd.Categorical([None] * len(df), categories=cats)
+        alinhados.append(df.reindex(columns=colunas))
+    return pd.concat(alinhados, ignore_index=True)
+
+
+def plano_de_tipos(df_processado, colunas_inteiras=()):
+    """
+    Tipos finais de cada coluna, definidos a partir da amostra já convertida (pré-visualização).
+    Na ingestão em blocos todos os blocos são alinhados a este plano, para que o esquema do Parquet
+    não dependa do conteúdo de cada bloco (ex.: um bloco sem ausentes inferido como inteiro).
+    Colunas inteiras na amostra são planejadas como float64, já que um bloco posterior pode trazer decimais
+    (ex.: horas 8 na amostra e 7,5 depois); só 'colunas_inteiras' (ex.: moeda em centavos) ficam Int64.
+    """
+    plano = {}
+    for col, tipo in df_processado.dtypes.items():
+        if isinstance(tipo, pd.CategoricalDtype):
+            plano[col] = 'category'
+        elif pd.api.types.is_bool_dtype(tipo):
+            plano[col] = 'boolean'
+        elif pd.api.types.is_integer_dtype(tipo):
+            plano[col] = 'Int64' if col in colunas_inteiras else 'float64' # Int64 anulável: ausentes não viram float
+        elif pd.api.types.is_float_dtype(tipo):
+            plano[col] = 'float64'
+        elif pd.api.types.is_datetime64_any_dtype(tipo):
+            plano[col] = 'datetime64[ns]'
+        else:
+            plano[col] = 'string'
+    return plano
+
+
+def _contar_descartados(descartados, col, antes, depois):
+    """Acumula em 'descartados' quantos valores preenchidos da coluna viraram ausentes na conversão."""
+    if descartados is not None:
+        perdidos = int((antes.notna() & depois.isna()).sum())
+        if perdidos:
+            descartados[col] = descartados.get(col, 0) + perdidos
+
+
+def aplicar_plano_de_tipos(df, plano, descartados=None):
+    """
+    Alinha um bloco convertido ao plano de tipos (mesmas colunas, na mesma ordem, com os mesmos tipos).
+    Valores que não podem ser convertidos ao tipo planejado (ex.: texto numa coluna numérica) viram ausentes;
+    se 'descartados' (dict) for informado, a quantidade por coluna é somada nele para ser relatada.
+    """
+    df = df.reindex(columns=list(plano))
+    for col, tipo in plano.items():
+        serie = df[col]
+        if str(serie.dtype) == tipo:
+            continue
+        if tipo == 'category':
+            # Mesma padronização de inferir_e_converter_tipos para colunas de texto;
+            # só os valores preenchidos são normalizados, ausentes continuam com código -1
+            df[col] = serie.where(serie.isna(), serie.astype(str).str.strip().str.upper()).astype('category')
+        elif tipo in ('Int64', 'float64'):
+            valores = serie
+            if not pd.api.types.is_numeric_dtype(serie.dtype):
+                valores = pd.to_numeric(serie.astype(str), errors='coerce')
+                _contar_descartados(descartados, col, serie, valores)
+            if tipo == 'Int64' and pd.api.types.is_float_dtype(valores.dtype) and not (valores.dropna() % 1 == 0).all():
+                raise ValueError(f"A coluna '{col}' tem valores decimais, mas a amostra indicou inteiros.")
+            df[col] = valores.astype(tipo)
+        elif tipo == 'datetime64[ns]':
+            datas = pd.to_datetime(serie, errors='coerce')
+            _contar_descartados(descartados, col, serie, datas)
+            df[col] = datas.astype(tipo)
+        else:
+            df[col] = serie.astype(tipo)
+    return df
+
+
+def ingerir_em_blocos(caminhos, escritor, converter, plano, ao_concluir_bloco=None, linhas_por_bloco=LINHAS_POR_BLOCO, descartados=None):
+    """
+    Ingestão em streaming: lê cada arquivo em blocos, normaliza as colunas, converte os tipos
+    ('converter' recebe e devolve o DataFrame do bloco), alinha o bloco ao 'plano' e o grava no 'escritor'
+    (catalogo.EscritorDataset). Apenas um bloco fica em memória por vez.
+    'ao_concluir_bloco(bloco_convertido, linhas_acumuladas)' permite acumular estruturas derivadas e
+    'descartados' (dict) recebe, por coluna, os valores que não couberam no tipo planejado (ver aplicar_plano_de_tipos).
+    Retorna o total de linhas gravadas.
+    """
+    linhas = 0
+    for caminho in caminhos:
+        for bloco in ler_em_blocos(caminho, linhas_por_bloco):
+            if bloco.empty:
+                continue
+            bloco, _ = normalizar_colunas(bloco)
+            bloco = aplicar_plano_de_tipos(converter(bloco), plano, descartados)
+            escritor.escrever(bloco)
+            linhas += len(bloco)
+            if ao_concluir_bloco is not None:
+                ao_concluir_bloco(bloco, linhas)
+    return linhas
@@ -0,0 +1,132 @@
+# tabelas.py - Tabelas das visões filtradas: paginação (só a página pedida é fatiada, ordenada e formatada)
+# e exportação sob demanda
+
+from functools import partial
+
+import numpy as np
+import streamlit as st
+
+from exportacao import FORMATOS_EXPORTACAO, LIMITE_LINHAS_XLSX, exportar
+from filtros import contar_linhas
+from utils import formatar_moeda_series, reais_para_exibicao
+
+TAMANHOS_PAGINA = [25, 50, 100, 500]
+SEM_ORDENACAO = '(ordem original)'
+
+
+def indice_ordenacao(serie):
+    """
+    Posições (0..n-1) que ordenam 'serie' de forma crescente e estável, com os ausentes no final.
+    Retorna (ordem, quantidade de ausentes). A ordem decrescente é lida da mesma ordem (ver posicoes_da_pagina),
+    então cada coluna é ordenada uma única vez por visão filtrada.
+    """
+    serie = serie.reset_index(drop=True)
+    try:
+        ordenada = serie.sort_values(kind='stable', na_position='last')
+    except TypeError: # Coluna object com tipos misturados: compara como texto
+        ordenada = serie.map(str, na_action='ignore').sort_values(kind='stable', na_position='last')
+    ordem = ordenada.index.to_numpy()
+    if len(ordem) < np.iinfo(np.int32).max:
+        ordem = ordem.astype(np.int32)
+    return ordem, int(serie.isna().sum())
+
+
+def posicoes_da_pagina(total, inicio, fim, ordem=None, ausentes=0, crescente=True):
+    """
+    Posições (dentro da visão) das linhas [inicio, fim) na ordem pedida, sem materializar a ordem inteira.
+    Decrescente: os valores preenchidos são lidos de trás para frente e os ausentes continuam no final.
+    """
+    fim = min(fim, total)
+    if ordem is None:
+        return np.arange(inicio, fim)
+    if crescente:
+        return ordem[inicio:fim]
+    i = np.arange(inicio, fim)
+    preenchidos = total - ausentes
+    return np.where(i < preenchidos, ordem[np.clip(preenchidos - 1 - i, 0, None)], ordem[i])
+
+
+def pagina_de_linhas(df, posicoes, posicoes_visao):
+    """Materializa só as linhas da página: 'posicoes_visao' são relativas à visão 'posicoes' (None = df inteiro)."""
+    linhas = posicoes_visao if posicoes is None else np.asarray(posicoes)[posicoes_visao]
+    return df.iloc[linhas]
+
+
+def _ordem_em_cache(df, posicoes, coluna, chave, assinatura):
+    """Índice de ordenação da coluna guardado na sessão e recalculado só quando a visão (assinatura) ou a coluna mudam."""
+    chave_estado = f'ordenacao_tabela_{chave}'
+    guardado = st.session_state.get(chave_estado)
+    if guardado is None or guardado['chave'] != (assinatura, coluna):
+        serie = df[coluna] if posicoes is None else df[coluna].iloc[posicoes]
+        ordem, ausentes = indice_ordenacao(serie)
+        guardado = {'chave': (assinatura, coluna), 'ordem': ordem, 'ausentes': ausentes}
+        st.session_state[chave_estado] = guardado
+    return guardado['ordem'], guardado['ausentes']
+
+
+def exibir_tabela_paginada(df, chave, assinatura, posicoes=None, colunas_moeda=(), colunas_centavos=()):
+    """
+    Tabela paginada de uma visão filtrada ('posicoes' = linhas da visão, None = df inteiro).
+    Só a página atual é copiada e formatada; a ordenação usa um índice argsort calculado uma vez por
+    coluna e visão. 'assinatura' identifica a visão (dataset + filtros): ao mudar, a página volta à primeira.
+    'colunas_moeda' são formatadas em BRL; 'colunas_centavos' são convertidas de centavos para reais.
+    """
+    total = contar_linhas(df, posicoes)
+    if total == 0:
+        st.info("Nenhuma linha para exibir.")
+        return
+
+    chave_pagina = f'pagina_tabela_{chave}'
+    chave_assinatura = f'assinatura_tabela_{chave}'
+    if st.session_state.get(chave_assinatura) != assinatura:
+        st.session_state[chave_assinatura] = assinatura
+        st.session_state[chave_pagina] = 1
+
+    col_ordem, col_direcao, col_tamanho, col_pagina = st.columns([3, 2, 2, 2])
+    coluna_ordem = col_ordem.selectbox("Ordenar por:", options=[SEM_ORDENACAO] + list(df.columns), key=f'ordem_tabela_{chave}')
+    decrescente = col_direcao.toggle("Decrescente", key=f'direcao_tabela_{chave}', disabled=coluna_ordem == SEM_ORDENACAO)
+    tamanho = col_tamanho.selectbox("Linhas por página:", options=TAMANHOS_PAGINA, key=f'tamanho_tabela_{chave}')
+
+    paginas = max(1, -(-total // tamanho))
+    if st.session_state.get(chave_pagina, 1) > paginas:
+        st.session_state[chave_pagina] = paginas
+    pagina = col_pagina.number_input(f"Página (de {paginas:,}):".replace(",", "."), min_value=1, max_value=paginas, step=1, key=chave_pagina)
+
+    inicio = (pagina - 1) * tamanho
+    fim = min(inicio + tamanho, total)
+    if coluna_ordem == SEM_ORDENACAO:
+        posicoes_visao = posicoes_da_pagina(total, inicio, fim)
+    else:
+        ordem, ausentes = _ordem_em_cache(df, posicoes, coluna_ordem, chave, assinatura)
+        posicoes_visao = posicoes_da_pagina(total, inicio, fim, ordem, ausentes, crescente=not decrescente)
+
+    df_pagina = reais_para_exibicao(pagina_de_linhas(df, posicoes, posicoes_visao), colunas_centavos)
+    colunas_formatar = [col for col in colunas_moeda if col in df_pagina.columns]
+    if colunas_formatar:
+        df_pagina = df_pagina.copy(deep=False)
+        for col in colunas_formatar:
+            df_pagina[col] = formatar_moeda_series(df_pagina[col], texto_ausente='')
+
+    st.dataframe(df_pagina, use_container_width=True, hide_index=True)
+    st.caption(f"Linhas {inicio + 1:,}–{fim:,} de {total:,}".replace(",", "."))
+
+
+def exibir_botoes_exportacao(df, chave, nome_arquivo, posicoes=None, colunas_centavos=(), rotulo=None):
+    """
+    Um botão de download por formato (CSV, Parquet, XLSX) para a visão filtrada. O arquivo só é gerado
+    (em blocos) quando o botão é clicado; os reruns por mudança de filtro não serializam nada.
+    Rótulo dos botões: "<rotulo> (<formato>)", ou só "📥 <formato>" sem 'rotulo'.
+    """
+    total = contar_linhas(df, posicoes)
+    for coluna, (formato, (extensao, mime)) in zip(st.columns(len(FORMATOS_EXPORTACAO)), FORMATOS_EXPORTACAO.items()):
+        excede_limite = formato == 'XLSX' and total > LIMITE_LINHAS_XLSX
+        coluna.download_button(
+            label=f"{rotulo} ({formato})" if rotulo else f"📥 {formato}",
+            data=partial(exportar, df, formato, posicoes, colunas_centavos),
+            file_name=f"{nome_arquivo}.{extensao}",
+            mime=mime,
+            key=f'exportar_{chave}_{formato}',
+            on_click='ignore',
+            disabled=excede_limite,
+            help=f"XLSX aceita no máximo {LIMITE_LINHAS_XLSX:,} linhas: use CSV ou Parquet.".replace(",", ".") if excede_limite else None,
+        )
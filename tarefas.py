@@ -0,0 +1,138 @@
+# tarefas.py - Tarefas em segundo plano (ex.: ingestão de datasets) com progresso e tempo por etapa
+
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_TAREFAS_SIMULTANEAS = 2 # Ingestões executadas ao mesmo tempo; as demais aguardam na fila
+MAX_TAREFAS_HISTORICO = 10 # Tarefas finalizadas mantidas no registro para exibição
+
+ESTADO_NA_FILA = 'na fila'
+ESTADO_EXECUTANDO = 'executando'
+ESTADO_CONCLUIDA = 'concluida'
+ESTADO_ERRO = 'erro'
+ESTADOS_FINAIS = {ESTADO_CONCLUIDA, ESTADO_ERRO}
+
+
+class Tarefa:
+    """
+    Uma tarefa executada numa thread de fundo. A função da tarefa recebe a própria Tarefa e registra o
+    andamento com etapa(...) (tempo de cada etapa) e informar(...) (detalhe da etapa atual, ex.: linhas lidas).
+    A interface lê apenas instantâneos (resumo()); a função nunca chama o Streamlit.
+    """
+
+    def __init__(self, nome, etapas_previstas):
+        self.id = uuid.uuid4().hex
+        self.nome = nome
+        self.etapas_previstas = list(etapas_previstas)
+        self.estado = ESTADO_NA_FILA
+        self.erro = None
+        self.resultado = None
+        self._etapas = [] # [nome, início, fim] (perf_counter)
+        self._detalhe = ''
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def etapa(self, nome):
+        """Marca o início e o fim de uma etapa (o tempo aparece no resumo mesmo se a etapa falhar)."""
+        registro = [nome, time.perf_counter(), None]
+        with self._lock:
+            self._etapas.append(registro)
+            self._detalhe = ''
+        try:
+            yield
+        finally:
+            with self._lock:
+                registro[2] = time.perf_counter()
+
+    def informar(self, detalhe):
+        """Detalhe do andamento da etapa atual."""
+        with self._lock:
+            self._detalhe = detalhe
+
+    def _finalizar(self, estado, resultado=None, erro=None):
+        with self._lock:
+            self.resultado = resultado
+            self.erro = erro
+            self.estado = estado
+
+    @property
+    def finalizada(self):
+        return self.estado in ESTADOS_FINAIS
+
+    def resumo(self):
+        """Instantâneo consistente da tarefa: estado, etapas com duração (s), detalhe e fração concluída."""
+        with self._lock:
+            agora = time.perf_counter()
+            etapas = [(nome, (fim or agora) - inicio, fim is not None) for nome, inicio, fim in self._etapas]
+            concluidas = sum(1 for _, _, terminada in etapas if terminada)
+            if self.estado == ESTADO_CONCLUIDA:
+                progresso = 1.0
+            else:
+                progresso = min(concluidas / max(len(self.etapas_previstas), 1), 1.0)
+            return {
+                'id': self.id,
+                'nome': self.nome,
+                'estado': self.estado,
+                'erro': self.erro,
+                'detalhe': self._detalhe,
+                'etapas': etapas,
+                'etapa_atual': etapas[-1][0] if etapas and not etapas[-1][2] else None,
+                'progresso': progresso,
+            }
+
+
+class RegistroTarefas:
+    """
+    Registro das tarefas em segundo plano do processo (um por servidor, compartilhado pelas sessões).
+    As tarefas rodam num pool de threads: continuam mesmo se a página que as iniciou for recarregada.
+    """
+
+    def __init__(self, max_simultaneas=MAX_TAREFAS_SIMULTANEAS, max_historico=MAX_TAREFAS_HISTORICO):
+        self._executor = ThreadPoolExecutor(max_workers=max_simultaneas, thread_name_prefix='tarefa')
+        self._tarefas = OrderedDict() # id -> Tarefa, da mais antiga para a mais recente
+        self._max_historico = max_historico
+        self._lock = threading.Lock()
+
+    def iniciar(self, nome, etapas_previstas, funcao, *args, **kwargs):
+        """Agenda funcao(tarefa, *args, **kwargs) numa thread de fundo e retorna a Tarefa."""
+        tarefa = Tarefa(nome, etapas_previstas)
+        with self._lock:
+            self._tarefas[tarefa.id] = tarefa
+            self._podar()
+        self._executor.submit(self._executar, tarefa, funcao, args, kwargs)
+        return tarefa
+
+    def _executar(self, tarefa, funcao, args, kwargs):
+        tarefa.estado = ESTADO_EXECUTANDO
+        try:
+            resultado = funcao(tarefa, *args, **kwargs)
+        except Exception as e:
+            tarefa._finalizar(ESTADO_ERRO, erro=str(e) or type(e).__name__)
+        else:
+            tarefa._finalizar(ESTADO_CONCLUIDA, resultado=resultado)
+
+    def _podar(self):
+        # Mantém todas as tarefas em andamento e só as finalizadas mais recentes
+        finalizadas = [id_tarefa for id_tarefa, tarefa in self._tarefas.items() if tarefa.finalizada]
+        for id_tarefa in finalizadas[:max(0, len(finalizadas) - self._max_historico)]:
+            del self._tarefas[id_tarefa]
+
+    def obter(self, id_tarefa):
+        with self._lock:
+            return self._tarefas.get(id_tarefa)
+
+    def tarefas(self):
+        """Tarefas do registro, da mais recente para a mais antiga."""
+        with self._lock:
+            return list(reversed(self._tarefas.values()))
+
+    def em_andamento(self):
+        return [tarefa for tarefa in self.tarefas() if not tarefa.finalizada]
+
+    def nomes_reservados(self):
+        """Nomes das tarefas ainda não finalizadas (ex.: datasets sendo gravados, que ainda não estão no catálogo)."""
+        return {tarefa.nome for tarefa in self.em_andamento()}
@@ -0,0 +1,215 @@
+# test_analises.py - Cálculos analíticos: KPIs pelo cubo contra o cálculo direto e reconciliação entre datasets
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import analises
+from analises import (
+    SITUACAO_ALTERADO, SITUACAO_MANTIDO, SITUACAO_NOVO, SITUACAO_REMOVIDO, calcular_venc_desc, chaves_compostas,
+    combinar_cubos, construir_cubo, cubo_atende_filtros, diferenca_datasets, kpis_do_cubo,
+)
+from filtros import construir_indice_opcoes, garantir_categoricas, mascara_filtros
+
+COLUNAS_FILTROS = ['emp', 'mes', 't', 'nome_funcionario']
+COLUNAS_VALOR = ['valor', 'base']
+
+
+def _folha():
+    """Folha pequena com os casos difíceis: nome/'t'/valor ausentes, nomes em branco ou com espaços, repetições."""
+    df = pd.DataFrame({
+        'emp': ['1', '1', '2', '2', '1', '2', '3', '1', None, '3', '2', '1'],
+        'mes': ['1', '2', '1', '2', '1', None, '2', '2', '1', '1', '2', '1'],
+        't': ['C', 'D', 'C', None, 'D', 'C', 'C', 'D', 'C', 'D', 'C', 'C'],
+        'nome_funcionario': ['ANA', 'ANA ', None, 'BRUNO', '', 'CARLA', '  ', 'BRUNO', 'DANI', 'ANA', None, 'EDU'],
+        'valor': [100.0, 30.0, 50.0, 20.0, np.nan, 70.0, 10.0, 5.5, 8.0, 2.0, 40.0, 1.25],
+        'base': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0, 11.0, 12.0],
+    })
+    return garantir_categoricas(df, COLUNAS_FILTROS)
+
+
+FILTROS = [
+    {},
+    {'emp': ['1']},
+    {'emp': ['1', '3'], 't': ['C']},
+    {'mes': ['N/A']},
+    {'t': ['N/A', 'D']},
+    {'emp': ['N/A'], 'mes': ['1']},
+    {'emp': ['9']}, # Nenhuma linha
+]
+
+
+@pytest.mark.parametrize('filtros', FILTROS)
+@pytest.mark.parametrize('is_value_mode', [True, False])
+def test_kpis_do_cubo_iguais_ao_calculo_nas_linhas(filtros, is_value_mode):
+    df = _folha()
+    indice = construir_indice_opcoes(df, COLUNAS_FILTROS)
+    cubo = construir_cubo(df, COLUNAS_FILTROS, COLUNAS_VALOR, proporcao_maxima=None)
+    assert cubo_atende_filtros(cubo, filtros, indice)
+
+    mascara = mascara_filtros(df, COLUNAS_FILTROS, filtros, indice)
+    linhas = df if mascara is None else df[mascara]
+    esperado = calcular_venc_desc(linhas, is_value_mode)
+
+    kpis, somas = kpis_do_cubo(cubo, filtros, indice, is_value_mode, ['base'])
+    assert kpis == pytest.approx(esperado)
+    assert somas['base'] == pytest.approx(linhas['base'].sum())
+
+
+def _blocos(df, tamanho):
+    """Blocos como na ingestão em streaming: cada um com o próprio dicionário de categorias."""
+    for inicio in range(0, len(df), tamanho):
+        bloco = df.iloc[inicio:inicio + tamanho].reset_index(drop=True)
+        yield garantir_categoricas(bloco.astype({col: object for col in COLUNAS_FILTROS}), COLUNAS_FILTROS)
+
+
+def _canonico(tabela):
+    """Tabela do cubo com chaves em texto e linhas ordenadas (a ordem e os dicionários não importam)."""
+    tabela = tabela.copy()
+    chaves = [col for col in tabela.columns if isinstance(tabela[col].dtype, pd.CategoricalDtype)]
+    for col in chaves:
+        tabela[col] = tabela[col].astype(object).where(tabela[col].notna(), '<ausente>').astype(str)
+    return tabela.sort_values(chaves).reset_index(drop=True)[sorted(tabela.columns)]
+
+
+@pytest.mark.parametrize('tamanho', [1, 4, 5])
+def test_combinar_cubos_por_bloco_igual_ao_cubo_inteiro(tamanho):
+    df = _folha()
+    inteiro = construir_cubo(df, COLUNAS_FILTROS, COLUNAS_VALOR, proporcao_maxima=None)
+    parciais = [construir_cubo(bloco, COLUNAS_FILTROS, COLUNAS_VALOR, proporcao_maxima=None) for bloco in _blocos(df, tamanho)]
+    combinado = combinar_cubos(parciais, len(df), proporcao_maxima=None)
+
+    for tabela in ('cubo_valores', 'cubo_funcionarios'):
+        pd.testing.assert_frame_equal(_canonico(combinado[tabela]), _canonico(inteiro[tabela]), check_dtype=False)
+
+    indice = construir_indice_opcoes(df, COLUNAS_FILTROS)
+    for filtros in FILTROS:
+        assert kpis_do_cubo(combinado, filtros, indice, True)[0] == pytest.approx(kpis_do_cubo(inteiro, filtros, indice, True)[0])
+
+
+def test_combinar_cubos_sem_algum_parcial_nao_gera_cubo():
+    df = _folha()
+    parciais = [construir_cubo(bloco, COLUNAS_FILTROS, COLUNAS_VALOR, proporcao_maxima=None) for bloco in _blocos(df, 6)]
+    assert combinar_cubos(parciais + [None], len(df)) is None
+
+
+# --- Diferença entre datasets ---
+
+CHAVES = ['nr_func', 'eve', 'seq']
+
+
+def _diferenca_de_referencia(df_antigo, df_novo, chaves, col_valor, tolerancia):
+    """Reconciliação direta (groupby + merge sobre as chaves em texto) para comparar com diferenca_datasets."""
+    def agregado(df):
+        rotulos = df[chaves].astype(object).where(df[chaves].notna(), '<ausente>').astype(str)
+        return df[[col_valor]].fillna(0).groupby([rotulos[col] for col in chaves]).sum()[col_valor]
+
+    antigo, novo = agregado(df_antigo), agregado(df_novo)
+    juntos = pd.concat({'antigo': antigo, 'novo': novo}, axis=1)
+    situacoes = np.where(juntos['antigo'].isna(), SITUACAO_NOVO, np.where(juntos['novo'].isna(), SITUACAO_REMOVIDO, np.where(
+        (juntos['novo'] - juntos['antigo']).abs() > tolerancia, SITUACAO_ALTERADO, SITUACAO_MANTIDO)))
+    return pd.Series(situacoes, index=juntos.index).sort_index()
+
+
+def _situacoes(resultado, chaves):
+    """Situação por chave (em texto) das linhas devolvidas por diferenca_datasets."""
+    rotulos = resultado[chaves].astype(object).where(resultado[chaves].notna(), '<ausente>').astype(str)
+    return pd.Series(resultado['situacao'].to_numpy(), index=pd.MultiIndex.from_frame(rotulos)).sort_index()
+
+
+def _folhas_para_diferenca(seed, linhas=400):
+    gerador = np.random.default_rng(seed)
+
+    def folha():
+        df = pd.DataFrame({
+            'nr_func': gerador.integers(0, 15, linhas).astype(str),
+            'eve': gerador.integers(0, 6, linhas).astype(str),
+            'seq': gerador.integers(0, 3, linhas).astype(str),
+            'valor': gerador.integers(0, 500, linhas) / 4,
+        }).astype({'nr_func': object, 'eve': object, 'seq': object})
+        df.loc[gerador.random(linhas) < 0.05, 'eve'] = None
+        df.loc[gerador.random(linhas) < 0.03, 'valor'] = np.nan
+        return garantir_categoricas(df, CHAVES)
+
+    return folha(), folha()
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_diferenca_igual_a_reconciliacao_direta(seed):
+    antigo, novo = _folhas_para_diferenca(seed)
+    resultado, resumo = diferenca_datasets(antigo, novo, CHAVES, ['valor'])
+
+    esperado = _diferenca_de_referencia(antigo, novo, CHAVES, 'valor', analises.TOLERANCIA_DIFERENCA)
+    mudancas = esperado[esperado != SITUACAO_MANTIDO]
+    pd.testing.assert_series_equal(_situacoes(resultado, CHAVES), mudancas, check_names=False, check_index_type=False)
+    for situacao in (SITUACAO_NOVO, SITUACAO_REMOVIDO, SITUACAO_ALTERADO, SITUACAO_MANTIDO):
+        assert resumo[situacao] == int((esperado == situacao).sum())
+    assert resumo['delta_valor'] == pytest.approx(novo['valor'].sum() - antigo['valor'].sum())
+
+
+def test_chaves_duplicadas_sao_somadas_por_chave():
+    antigo = pd.DataFrame({'nr_func': ['1', '1', '2'], 'eve': ['10', '10', '10'], 'valor': [100.0, 50.0, 30.0]})
+    # Mesma chave dividida em outras linhas no novo: total igual, então não é alteração
+    novo = pd.DataFrame({'nr_func': ['1', '1', '1', '2'], 'eve': ['10', '10', '10', '10'], 'valor': [75.0, 25.0, 50.0, 31.0]})
+    resultado, resumo = diferenca_datasets(antigo, novo, ['nr_func', 'eve'], ['valor'])
+
+    assert resumo[SITUACAO_MANTIDO] == 1 and resumo[SITUACAO_ALTERADO] == 1
+    alterada = resultado.iloc[0]
+    assert (alterada['nr_func'], alterada['situacao']) == ('2', SITUACAO_ALTERADO)
+    assert (alterada['linhas_antigo'], alterada['linhas_novo']) == (1, 1)
+    assert alterada['delta_valor'] == pytest.approx(1.0)
+
+
+def test_parte_da_chave_ausente_e_um_valor_da_chave():
+    antigo = pd.DataFrame({'nr_func': ['1', '1', None], 'eve': [None, '10', '10'], 'valor': [5.0, 7.0, 9.0]})
+    novo = pd.DataFrame({'nr_func': ['1', None], 'eve': [None, '10'], 'valor': [5.0, 9.0]})
+    resultado, resumo = diferenca_datasets(antigo, novo, ['nr_func', 'eve'], ['valor'])
+
+    # (1, ausente) e (ausente, 10) casam entre os lados; só (1, 10) sumiu
+    assert resumo == {SITUACAO_NOVO: 0, SITUACAO_REMOVIDO: 1, SITUACAO_ALTERADO: 0, SITUACAO_MANTIDO: 2, 'delta_valor': -7.0}
+    assert resultado[['nr_func', 'eve', 'situacao']].values.tolist() == [['1', '10', SITUACAO_REMOVIDO]]
+    ausentes = pd.DataFrame({'nr_func': [None], 'eve': ['10'], 'valor': [1.0]})
+    assert pd.isna(diferenca_datasets(ausentes, ausentes.iloc[:0], ['nr_func', 'eve'], ['valor'])[0]['nr_func'].iloc[0])
+
+
+def test_chave_recomprimida_quando_o_produto_estoura_o_limite(monkeypatch):
+    antigo, novo = _folhas_para_diferenca(3)
+    sem_recompressao = diferenca_datasets(antigo, novo, CHAVES, ['valor'])
+
+    # Limite baixo: a chave parcial é recomprimida antes de cada coluna
+    monkeypatch.setattr(analises, 'LIMITE_CHAVE_COMPOSTA', 8)
+    chave_a, chave_b, _ = chaves_compostas(antigo, novo, CHAVES)
+    rotulos = pd.concat([antigo[CHAVES], novo[CHAVES]]).astype(object).fillna('<ausente>').astype(str).agg('|'.join, axis=1)
+    chaves = pd.Series(np.concatenate([chave_a, chave_b]))
+    # Mesma chave inteira <=> mesmos valores nas colunas-chave
+    assert (chaves.groupby(rotulos.to_numpy()).nunique() == 1).all()
+    assert (rotulos.groupby(chaves.to_numpy()).nunique() == 1).all()
+
+    com_recompressao = diferenca_datasets(antigo, novo, CHAVES, ['valor'])
+    assert com_recompressao[1] == sem_recompressao[1]
+    pd.testing.assert_series_equal(_situacoes(com_recompressao[0], CHAVES), _situacoes(sem_recompressao[0], CHAVES))
+
+
+@pytest.mark.parametrize('valor_novo, situacao', [
+    (100.5, SITUACAO_MANTIDO), # Delta igual à tolerância não é alteração
+    (100.75, SITUACAO_ALTERADO),
+    (99.5, SITUACAO_MANTIDO),
+    (99.25, SITUACAO_ALTERADO),
+])
+def test_limite_da_tolerancia(valor_novo, situacao):
+    antigo = pd.DataFrame({'nr_func': ['1'], 'valor': [100.0]})
+    novo = pd.DataFrame({'nr_func': ['1'], 'valor': [valor_novo]})
+    _, resumo = diferenca_datasets(antigo, novo, ['nr_func'], ['valor'], tolerancia=0.5)
+    assert resumo[situacao] == 1
+
+
+def test_tolerancia_padrao_meio_centavo():
+    antigo = pd.DataFrame({'nr_func': ['1', '2'], 'valor': [10.0, 10.0]})
+    novo = pd.DataFrame({'nr_func': ['1', '2'], 'valor': [10.001, 10.01]})
+    resultado, resumo = diferenca_datasets(antigo, novo, ['nr_func'], ['valor'])
+    assert resultado['nr_func'].tolist() == ['2']
+    assert (resumo[SITUACAO_MANTIDO], resumo[SITUACAO_ALTERADO]) == (1, 1)
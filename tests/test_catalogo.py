@@ -0,0 +1,88 @@
+# test_catalogo.py - Catálogo colunar: substituição atômica de um dataset (dados, anexos e manifesto)
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from catalogo import CatalogoColunar
+
+
+def _versao(valor):
+    df = pd.DataFrame({'nome_funcionario': ['ANA', 'BRUNO'], 'valor': [valor, valor]})
+    anexos = {'cubo_valores': pd.DataFrame({'valor': [2 * valor]}), 'opcoes': {'versao': valor}}
+    return df, anexos
+
+
+def _leitura(catalogo):
+    """O que um leitor do catálogo vê agora: dados e anexos da entrada atual do manifesto."""
+    return (
+        catalogo.carregar_dataset('folha')['valor'].iloc[0],
+        catalogo.carregar_anexo('folha', 'cubo_valores')['valor'].iloc[0],
+        catalogo.carregar_anexo('folha', 'opcoes')['versao'],
+    )
+
+
+@pytest.fixture
+def catalogo(tmp_path):
+    catalogo = CatalogoColunar(str(tmp_path))
+    df, anexos = _versao(1.0)
+    catalogo.salvar_dataset('folha', df, {}, anexos)
+    return catalogo
+
+
+def _ao_gravar_manifesto(monkeypatch, catalogo, verificar):
+    """Executa 'verificar' logo antes da gravação do manifesto (a versão nova já está toda no disco)."""
+    gravar = catalogo._gravar_manifesto
+
+    def gravar_verificando(manifesto):
+        verificar()
+        gravar(manifesto)
+
+    monkeypatch.setattr(catalogo, '_gravar_manifesto', gravar_verificando)
+
+
+def test_leitor_ve_a_versao_anterior_completa_ate_a_troca(monkeypatch, catalogo):
+    vistos = []
+    _ao_gravar_manifesto(monkeypatch, catalogo, lambda: vistos.append(_leitura(catalogo)))
+
+    df, anexos = _versao(2.0)
+    catalogo.salvar_dataset('folha', df, {}, anexos)
+    assert vistos == [(1.0, 2.0, 1.0)]
+    assert _leitura(catalogo) == (2.0, 4.0, 2.0)
+
+
+def test_escritor_em_blocos_troca_na_gravacao_do_manifesto(monkeypatch, catalogo):
+    vistos = []
+    _ao_gravar_manifesto(monkeypatch, catalogo, lambda: vistos.append(_leitura(catalogo)))
+
+    df, anexos = _versao(3.0)
+    with catalogo.iniciar_dataset('folha') as escritor:
+        escritor.escrever(df.iloc[:1])
+        escritor.escrever(df.iloc[1:])
+        escritor.concluir({}, anexos)
+    assert vistos == [(1.0, 2.0, 1.0)]
+    assert _leitura(catalogo) == (3.0, 6.0, 3.0)
+
+
+def test_arquivos_da_versao_anterior_sao_removidos(catalogo):
+    df, anexos = _versao(2.0)
+    catalogo.salvar_dataset('folha', df, {}, anexos)
+    entrada = catalogo.ler_manifesto()['folha']
+    assert sorted(os.listdir(catalogo.diretorio)) == sorted(['manifest.json', entrada['arquivo']] + list(entrada['anexos'].values()))
+
+
+def test_falha_antes_da_troca_mantem_a_versao_atual(monkeypatch, catalogo):
+    arquivos = sorted(os.listdir(catalogo.diretorio))
+
+    def falhar():
+        raise OSError('disco cheio')
+
+    _ao_gravar_manifesto(monkeypatch, catalogo, falhar)
+    df, anexos = _versao(2.0)
+    with pytest.raises(OSError):
+        catalogo.salvar_dataset('folha', df, {}, anexos)
+    assert _leitura(catalogo) == (1.0, 2.0, 1.0)
+    assert sorted(os.listdir(catalogo.diretorio)) == arquivos
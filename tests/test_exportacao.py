@@ -0,0 +1,58 @@
+# test_exportacao.py - Os arquivos gerados por exportacao.exportar precisam ser aceitos por st.download_button
+
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from openpyxl import load_workbook
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from exportacao import FORMATOS_EXPORTACAO, exportar
+
+
+@pytest.fixture
+def folha():
+    return pd.DataFrame({
+        'nome_funcionario': pd.Categorical(['ANA', 'BRUNO', None, 'ANA', 'CARLA']),
+        't': pd.Categorical(['V', 'D', 'V', 'V', 'D']),
+        'valor': np.array([123456, 7890, 0, 1, 250000], dtype='int64'), # Centavos
+    })
+
+
+def _para_bytes(dados):
+    return convert_data_to_bytes_and_infer_mime(dados, TypeError("formato não suportado"))[0]
+
+
+@pytest.mark.parametrize('formato', list(FORMATOS_EXPORTACAO))
+def test_saida_aceita_pelo_download_button(folha, formato):
+    dados = _para_bytes(exportar(folha, formato, colunas_centavos=('valor',), tamanho_bloco=2))
+    assert len(dados) > 0
+
+
+@pytest.mark.parametrize('formato', list(FORMATOS_EXPORTACAO))
+def test_visao_vazia_gera_so_o_cabecalho(folha, formato):
+    assert len(_para_bytes(exportar(folha, formato, posicoes=np.array([], dtype=np.intp)))) > 0
+
+
+def test_csv_em_blocos_igual_ao_arquivo_inteiro(folha):
+    posicoes = np.array([4, 0, 3])
+    dados = _para_bytes(exportar(folha, 'CSV', posicoes, colunas_centavos=('valor',), tamanho_bloco=2))
+    lido = pd.read_csv(io.BytesIO(dados), sep=';', decimal=',')
+    assert list(lido.columns) == list(folha.columns)
+    assert lido['nome_funcionario'].tolist() == ['CARLA', 'ANA', 'ANA']
+    assert lido['valor'].tolist() == [2500.0, 1234.56, 0.01]
+
+
+def test_parquet_e_xlsx_preservam_as_linhas(folha):
+    tabela = pq.read_table(io.BytesIO(_para_bytes(exportar(folha, 'Parquet', tamanho_bloco=2))))
+    assert tabela.num_rows == len(folha)
+
+    aba = load_workbook(io.BytesIO(_para_bytes(exportar(folha, 'XLSX', tamanho_bloco=2))), read_only=True)['Dados']
+    linhas = list(aba.iter_rows(values_only=True))
+    assert linhas[0] == tuple(folha.columns)
+    assert len(linhas) == len(folha) + 1
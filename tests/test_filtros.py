@@ -0,0 +1,98 @@
+# test_filtros.py - Motor de filtros: seleção por códigos categóricos, combinação de filtros e períodos
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from filtros import (
+    ROTULO_AUSENTE, construir_indice_datas, construir_indice_opcoes, garantir_categoricas, mascara_filtros,
+    mascara_periodo, mascara_selecao, mascaras_comparacao,
+)
+
+
+@pytest.fixture
+def folha():
+    df = pd.DataFrame({
+        'emp': ['1', '2', None, '1', '3', None],
+        'mes': ['1', '1', '2', '2', '2', '1'],
+        'valor': [10.0, 20.0, 30.0, 40.0, 50.0, 60.0],
+    })
+    return garantir_categoricas(df, ['emp', 'mes'])
+
+
+def _isin_por_texto(serie, selecao):
+    """Comportamento original (isin sobre o texto de cada linha), referência da versão por códigos."""
+    return serie.astype(object).where(serie.notna(), 'nan').astype(str).isin(selecao).to_numpy()
+
+
+@pytest.mark.parametrize('selecao', [['1'], ['1', '3'], [ROTULO_AUSENTE], ['nan'], ['2', ROTULO_AUSENTE], ['9'], []])
+def test_mascara_selecao_igual_ao_isin_por_texto(folha, selecao):
+    esperado = _isin_por_texto(folha['emp'], set(selecao) | ({'nan'} if ROTULO_AUSENTE in selecao else set()))
+    np.testing.assert_array_equal(mascara_selecao(folha['emp'], selecao), esperado)
+
+
+@pytest.mark.parametrize('rotulo_ausente', [ROTULO_AUSENTE, 'nan'])
+def test_ausentes_selecionados_pelo_rotulo(folha, rotulo_ausente):
+    assert (folha['emp'].cat.codes.to_numpy()[mascara_selecao(folha['emp'], [rotulo_ausente])] == -1).all()
+    assert mascara_selecao(folha['emp'], [rotulo_ausente]).sum() == 2
+
+
+def test_coluna_nao_categorica_usa_texto():
+    serie = pd.Series([1, 2, 3, 2])
+    np.testing.assert_array_equal(mascara_selecao(serie, ['2']), [False, True, False, True])
+
+
+def test_selecao_vazia_ou_total_nao_restringe(folha):
+    indice = construir_indice_opcoes(folha, ['emp', 'mes'])
+    todas = indice['emp']['valores']
+    assert ROTULO_AUSENTE in todas
+    assert mascara_filtros(folha, ['emp', 'mes'], {}, indice) is None
+    assert mascara_filtros(folha, ['emp', 'mes'], {'emp': []}, indice) is None
+    assert mascara_filtros(folha, ['emp', 'mes'], {'emp': todas, 'mes': ['1', '2']}, indice) is None
+    # Sem índice, o total de opções vem da própria coluna (categorias + ausente)
+    assert mascara_filtros(folha, ['emp'], {'emp': todas}) is None
+
+
+def test_filtros_parciais_combinados_com_e(folha):
+    indice = construir_indice_opcoes(folha, ['emp', 'mes'])
+    mascara = mascara_filtros(folha, ['emp', 'mes'], {'emp': ['1', ROTULO_AUSENTE], 'mes': ['1']}, indice)
+    assert np.flatnonzero(mascara).tolist() == [0, 5]
+
+
+def test_mascaras_comparacao_iguais_as_calculadas_separadamente(folha):
+    indice = construir_indice_opcoes(folha, ['emp', 'mes'])
+    filtros_base, filtros_comp = {'emp': ['1'], 'mes': ['2']}, {'emp': ['1'], 'mes': ['1', '2']}
+    base, comp = mascaras_comparacao(folha, ['emp', 'mes'], filtros_base, filtros_comp, indice)
+    np.testing.assert_array_equal(base, mascara_filtros(folha, ['emp', 'mes'], filtros_base, indice))
+    np.testing.assert_array_equal(comp, mascara_filtros(folha, ['emp', 'mes'], filtros_comp, indice))
+
+
+@pytest.fixture
+def indice_datas():
+    datas = pd.Series(pd.to_datetime(['2024-03-01', None, '2024-01-01', '2024-02-01', '2024-03-01', '2024-01-15']))
+    return construir_indice_datas(datas)
+
+
+def test_periodo_inclui_as_duas_pontas(indice_datas):
+    mascara = mascara_periodo(indice_datas, pd.Timestamp('2024-01-15'), pd.Timestamp('2024-03-01'))
+    assert np.flatnonzero(mascara).tolist() == [0, 3, 4, 5]
+
+
+def test_periodo_de_um_dia(indice_datas):
+    assert np.flatnonzero(mascara_periodo(indice_datas, '2024-03-01', '2024-03-01')).tolist() == [0, 4]
+
+
+def test_periodo_sem_limites(indice_datas):
+    # Linha sem data fica de fora mesmo sem limites, então a máscara existe
+    assert np.flatnonzero(mascara_periodo(indice_datas, None, None)).tolist() == [0, 2, 3, 4, 5]
+    assert np.flatnonzero(mascara_periodo(indice_datas, None, '2024-01-31')).tolist() == [2, 5]
+    completo = construir_indice_datas(pd.Series(pd.to_datetime(['2024-01-01', '2024-02-01'])))
+    assert mascara_periodo(completo, '2024-01-01', '2024-02-01') is None
+
+
+def test_periodo_fora_dos_dados(indice_datas):
+    assert not mascara_periodo(indice_datas, '2025-01-01', '2025-12-31').any()
@@ -0,0 +1,119 @@
+# test_ingestao.py - Ingestão em blocos (streaming) do CSV até o Parquet do catálogo
+
+import io
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from catalogo import CatalogoColunar
+from ingestao import (
+    TAMANHO_AMOSTRA_DIALETO, aplicar_plano_de_tipos, detectar_dialeto_csv, ingerir_em_blocos,
+    ler_arquivo, ler_e_normalizar_arquivo, ler_em_blocos, plano_de_tipos,
+)
+from utils import inferir_e_converter_tipos
+
+COLUNAS_TEXTO = ['nome_funcionario', 't', 'descricao_evento']
+COLUNAS_MOEDA = ['valor']
+LINHAS_POR_BLOCO = 1000
+
+
+def _converter(bloco):
+    return inferir_e_converter_tipos(bloco, COLUNAS_TEXTO, COLUNAS_MOEDA)
+
+
+def _ingerir(tmp_path, caminho_csv):
+    """Mesmo fluxo do painel: plano de tipos pela amostra (1º bloco), depois todos os blocos no catálogo."""
+    amostra, _ = ler_e_normalizar_arquivo(caminho_csv, nrows=LINHAS_POR_BLOCO)
+    plano = plano_de_tipos(_converter(amostra))
+    catalogo = CatalogoColunar(str(tmp_path / 'catalogo'))
+    with catalogo.iniciar_dataset('folha') as escritor:
+        linhas = ingerir_em_blocos([caminho_csv], escritor, _converter, plano, linhas_por_bloco=LINHAS_POR_BLOCO)
+        escritor.concluir({})
+    return linhas, catalogo.carregar_dataset('folha')
+
+
+@pytest.fixture
+def csv_com_mais_categorias_depois(tmp_path):
+    """1º bloco com 100 descrições distintas (cabe em int8), 2º bloco com outras 300."""
+    descricoes = [f"EVENTO {i % 100}" for i in range(LINHAS_POR_BLOCO)]
+    descricoes += [f"EVENTO {100 + i % 300}" for i in range(LINHAS_POR_BLOCO)]
+    df = pd.DataFrame({
+        'nome_funcionario': [f"FUNC {i % 50}" for i in range(len(descricoes))],
+        't': ['V', 'D'] * LINHAS_POR_BLOCO,
+        'descricao_evento': descricoes,
+        'valor': ['10,50'] * len(descricoes),
+    })
+    caminho = tmp_path / 'folha.csv'
+    df.to_csv(caminho, sep=';', index=False)
+    return str(caminho)
+
+
+def test_blocos_seguintes_podem_ter_mais_categorias_que_o_primeiro(tmp_path, csv_com_mais_categorias_depois):
+    linhas, df = _ingerir(tmp_path, csv_com_mais_categorias_depois)
+    assert linhas == 2 * LINHAS_POR_BLOCO
+    assert isinstance(df['descricao_evento'].dtype, pd.CategoricalDtype)
+    assert df['descricao_evento'].nunique() == 400
+    assert df['descricao_evento'].iloc[-1] == f"EVENTO {100 + (LINHAS_POR_BLOCO - 1) % 300}"
+    assert df['valor'].sum() == pytest.approx(10.5 * linhas)
+
+
+def test_decimais_depois_de_uma_amostra_inteira_nao_interrompem_a_ingestao(tmp_path):
+    horas = ['8'] * LINHAS_POR_BLOCO + ['7,5'] + ['8'] * (LINHAS_POR_BLOCO - 1)
+    df = pd.DataFrame({'nome_funcionario': ['ANA'] * len(horas), 'horas': horas, 'valor': ['1,00'] * len(horas)})
+    caminho = tmp_path / 'horas.csv'
+    df.to_csv(caminho, sep=';', index=False)
+
+    linhas, gravado = _ingerir(tmp_path, str(caminho))
+    assert linhas == len(horas)
+    assert gravado['horas'].dtype == 'float64'
+    assert gravado['horas'].iloc[LINHAS_POR_BLOCO] == 7.5
+
+
+def test_colunas_inteiras_declaradas_continuam_int64():
+    amostra = pd.DataFrame({'valor': [150, 275], 'horas': [8, 8]})
+    assert plano_de_tipos(amostra, colunas_inteiras=['valor']) == {'valor': 'Int64', 'horas': 'float64'}
+
+
+def test_valores_nao_convertidos_sao_contados():
+    plano = {'horas': 'float64', 'admissao': 'datetime64[ns]'}
+    bloco = pd.DataFrame({
+        'horas': pd.Series(['8', 'N/D', None, '7.5', 'x'], dtype=object),
+        'admissao': pd.Series(['2024-01-31', 'ontem', None, '2024-02-29', '2024-03-01'], dtype=object),
+    })
+    descartados = {}
+    convertido = aplicar_plano_de_tipos(bloco, plano, descartados)
+    aplicar_plano_de_tipos(bloco, plano, descartados) # Acumula entre blocos
+    assert convertido['horas'].isna().sum() == 3
+    assert descartados == {'horas': 4, 'admissao': 2}
+
+
+def _csv_com_acentos_depois_da_amostra(encoding):
+    """CSV só com ASCII nos primeiros KB (além da amostra do dialeto) e nomes acentuados no fim."""
+    linhas = ['nome_funcionario;valor'] + [f"FUNCIONARIO {i};1,50" for i in range(TAMANHO_AMOSTRA_DIALETO // 20)]
+    linhas += ['JOSÉ CONCEIÇÃO;2,50', 'ANDRÉ;3,00']
+    conteudo = '\n'.join(linhas).encode(encoding)
+    assert conteudo[:TAMANHO_AMOSTRA_DIALETO].isascii()
+    return conteudo
+
+
+@pytest.mark.parametrize('encoding', ['latin-1', 'utf-8'])
+def test_acentos_depois_da_amostra_sao_lidos(tmp_path, encoding):
+    caminho = tmp_path / 'folha.csv'
+    caminho.write_bytes(_csv_com_acentos_depois_da_amostra(encoding))
+
+    df = ler_arquivo(str(caminho))
+    assert df['nome_funcionario'].tail(2).tolist() == ['JOSÉ CONCEIÇÃO', 'ANDRÉ']
+    assert df['valor'].iloc[-1] == 3.0
+
+    blocos = list(ler_em_blocos(str(caminho), linhas_por_bloco=1000))
+    assert pd.concat(blocos)['nome_funcionario'].tail(2).tolist() == ['JOSÉ CONCEIÇÃO', 'ANDRÉ']
+
+
+def test_acentos_depois_da_amostra_num_upload_em_memoria():
+    # Mesmo caminho do app_analise_dp: o dialeto vai direto para pd.read_csv sobre o arquivo enviado
+    arquivo = io.BytesIO(_csv_com_acentos_depois_da_amostra('latin-1'))
+    df = pd.read_csv(arquivo, **detectar_dialeto_csv(arquivo))
+    assert df['nome_funcionario'].iloc[-2] == 'JOSÉ CONCEIÇÃO'
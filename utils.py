@@ -1,9 +1,19 @@
 # utils.py
 
+import json
+import hashlib
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 from datetime import datetime
 
+# Formatos testados na detecção de datas por amostragem (ordem = preferência em caso de empate)
+FORMATOS_DATA = ['%d/%m/%Y', 'ISO8601', '%d/%m/%Y %H:%M:%S', '%m/%Y']
+TAMANHO_AMOSTRA_DATAS = 300 # Valores preenchidos testados por coluna
+TIPOS_INTEIROS = [np.int8, np.int16, np.int32, np.int64] # Candidatos do planejador de tipos, do menor ao maior
+ESCALA_CENTAVOS = 100 # Moeda em ponto fixo: valor inteiro em centavos (int64)
+
 def formatar_moeda(valor):
     """Formata um valor float ou int para o formato monetário BRL."""
     if pd.isna(valor) or valor is None:
@@ -17,54 +27,306 @@ def formatar_moeda(valor):
     # Formatação com ponto como separador de milhar e vírgula como decimal
     return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
 
-def inferir_e_converter_tipos(df, colunas_texto, colunas_moeda):
+def _agrupar_milhares(inteiros):
+    """
+    Texto (Arrow) de inteiros não negativos com ponto como separador de milhar.
+    Os dígitos são completados com zeros até um múltiplo de 3, fatiados em grupos e reunidos com '.';
+    os zeros e pontos à esquerda são removidos no final. Tudo roda em kernels do Arrow, sem laço Python.
+    """
+    largura = 3 * max(1, -(-len(str(int(inteiros.max(initial=0)))) // 3))
+    texto = pc.utf8_lpad(pc.cast(pa.array(inteiros), pa.string()), width=largura, padding='0')
+    if largura > 3:
+        texto = pc.binary_join_element_wise(*[pc.utf8_slice_codeunits(texto, i, i + 3) for i in range(0, largura, 3)], '.')
+    texto = pc.utf8_ltrim(texto, characters='0.')
+    return pc.if_else(pc.equal(pc.utf8_length(texto), 0), '0', texto)
+
+def _formatar_numeros(valores, casas, prefixo, texto_ausente):
+    """Base de formatar_moeda_series/formatar_numero_series: arredonda, agrupa milhares e monta o texto BRL."""
+    indice = valores.index if isinstance(valores, pd.Series) else None
+    numeros = pd.to_numeric(pd.Series(valores), errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    validos = np.isfinite(numeros)
+    escala = 10 ** casas
+    unidades = np.rint(np.abs(np.where(validos, numeros, 0)) * escala).astype(np.int64)
+    partes = [pc.if_else(pa.array((numeros < 0) & (unidades > 0)), prefixo + '-', prefixo), _agrupar_milhares(unidades // escala)]
+    if casas:
+        partes += [',', pc.utf8_lpad(pc.cast(pa.array(unidades % escala), pa.string()), width=casas, padding='0')]
+    texto = pc.if_else(pa.array(validos), pc.binary_join_element_wise(*partes, ''), texto_ausente)
+    return pd.Series(pd.arrays.ArrowStringArray(texto), index=indice)
+
+def formatar_moeda_series(valores, texto_ausente="R$ 0,00"):
+    """
+    Versão vetorizada de formatar_moeda: formata um array/Series inteiro de uma vez ("R$ 1.234,56").
+    Aplique só sobre as linhas exibidas. Ausentes viram 'texto_ausente'; Series mantêm o índice.
+    """
+    return _formatar_numeros(valores, 2, 'R$ ', texto_ausente)
+
+def formatar_numero_series(valores, texto_ausente=""):
+    """Inteiros com separador de milhar BRL ("1.234"), vetorizado como formatar_moeda_series."""
+    return _formatar_numeros(valores, 0, '', texto_ausente)
+
+def fingerprint_bytes(dados):
+    """Impressão digital (hash) do conteúdo bruto de um arquivo enviado. Calculada uma única vez no upload."""
+    return hashlib.blake2b(dados, digest_size=16).hexdigest()
+
+def calcular_fingerprint(fingerprints_arquivos, configuracao=None):
+    """
+    Impressão digital estável de um dataset: combina os hashes dos arquivos enviados
+    (nome -> fingerprint_bytes) com a configuração de colunas usada no processamento.
+    Serve como chave O(1) de cache no lugar de hashear o DataFrame inteiro a cada rerun.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for nome in sorted(fingerprints_arquivos):
+        h.update(nome.encode('utf-8'))
+        h.update(fingerprints_arquivos[nome].encode('utf-8'))
+    h.update(json.dumps(configuracao or {}, sort_keys=True, default=str).encode('utf-8'))
+    return h.hexdigest()
+
+def assinatura_filtros(filtros_ativos_dict):
+    """Representação canônica (hashable e independente de ordem) de um dicionário coluna -> seleção."""
+    return tuple(sorted(
+        (col, tuple(sorted(str(v) for v in selecoes)) if selecoes is not None else None)
+        for col, selecoes in filtros_ativos_dict.items()
+    ))
+
+def _eh_texto(serie):
+    """Colunas tratadas como texto: object, string (pandas 3 'str') e categóricas."""
+    return (
+        pd.api.types.is_object_dtype(serie.dtype) or
+        pd.api.types.is_string_dtype(serie.dtype) or
+        isinstance(serie.dtype, pd.CategoricalDtype)
+    )
+
+def _valores_por_codigo(codigos, valores_unicos, vazio=np.nan):
+    """Expande valores calculados por valor distinto (pd.factorize) de volta para as linhas; código -1 = ausente."""
+    valores_unicos = np.asarray(valores_unicos)
+    if len(valores_unicos) == 0:
+        return np.full(len(codigos), vazio)
+    return np.where(codigos >= 0, valores_unicos[codigos], vazio)
+
+def _numeros_por_linha(serie):
+    """
+    Valores numéricos (float64, NaN onde não for número) de uma coluna qualquer.
+    Em colunas de texto, a conversão roda só sobre os valores distintos (poucos, mesmo em milhões de linhas).
+    Retorna (valores, todos_numericos) — todos_numericos indica se todo valor preenchido era um número.
+    """
+    if pd.api.types.is_numeric_dtype(serie.dtype) and not pd.api.types.is_bool_dtype(serie.dtype):
+        return serie.to_numpy(dtype='float64', na_value=np.nan), True
+    codigos, unicos = pd.factorize(serie)
+    numeros = pd.to_numeric(pd.Index(unicos, dtype=object), errors='coerce').to_numpy(dtype='float64')
+    return _valores_por_codigo(codigos, numeros), not np.isnan(numeros).any()
+
+def _converter_moeda(serie):
+    """
+    Converte uma coluna de moeda em texto BRL (1.234,56) para float64.
+    A limpeza de strings roda só sobre os valores distintos; as linhas recebem o resultado pelos códigos.
+    """
+    # Já numérica (o leitor de CSV aplicou decimal/milhar): reinterpretá-la como texto removeria o ponto decimal
+    if pd.api.types.is_numeric_dtype(serie.dtype):
+        return serie
+    codigos, unicos = pd.factorize(serie)
+    texto = (
+        pd.Index(unicos).astype(str).str.strip()
+        .str.replace('.', '', regex=False) # Remove separador de milhar (ponto)
+        .str.replace(',', '.', regex=False) # Troca separador decimal (vírgula por ponto)
+    )
+    valores = pd.to_numeric(texto, errors='coerce').to_numpy(dtype='float64')
+    return pd.Series(_valores_por_codigo(codigos, valores), index=serie.index, dtype='float64')
+
+def _converter_moeda_centavos(serie):
+    """
+    Converte uma coluna de moeda (texto BRL ou já numérica) para centavos inteiros (ponto fixo).
+    Sem ausentes o resultado é int64 puro; com ausentes, Int64 (inteiro anulável, mesmos int64 + máscara).
+    Somas em centavos são exatas, sem o erro acumulado do float64 em milhões de eventos.
+    """
+    reais = _converter_moeda(serie).to_numpy(dtype='float64', na_value=np.nan)
+    # Arredondamento para o centavo mais próximo: exato para valores até ~9 trilhões de reais
+    centavos = np.rint(reais * ESCALA_CENTAVOS)
+    ausentes = np.isnan(centavos)
+    if not ausentes.any():
+        return pd.Series(centavos.astype(np.int64), index=serie.index)
+    centavos[ausentes] = 0
+    return pd.Series(pd.arrays.IntegerArray(centavos.astype(np.int64), ausentes), index=serie.index)
+
+def centavos_para_reais(valor):
+    """Converte centavos (escalar, Series ou DataFrame) para reais em float, apenas para exibição."""
+    return valor / ESCALA_CENTAVOS
+
+def reais_para_exibicao(df, colunas_centavos):
+    """Cópia rasa de 'df' com as colunas em centavos convertidas para reais (ex.: tabelas de pré-visualização)."""
+    colunas = [col for col in colunas_centavos if col in df.columns]
+    if not colunas:
+        return df
+    df = df.copy(deep=False)
+    for col in colunas:
+        df[col] = centavos_para_reais(df[col].astype('Float64'))
+    return df
+
+def _converter_numerica(serie):
+    """
+    Tenta converter uma coluna para número. Retorna None se algum valor preenchido não for numérico.
+    Colunas só com inteiros (e sem ausentes) são reduzidas ao menor tipo inteiro (downcast).
+    """
+    if pd.api.types.is_bool_dtype(serie.dtype):
+        return None
+    if pd.api.types.is_integer_dtype(serie.dtype) and not serie.hasnans:
+        return pd.to_numeric(serie, downcast='integer')
+    valores, todos_numericos = _numeros_por_linha(serie)
+    if not todos_numericos:
+        return None
+
+    preenchidos = valores[~np.isnan(valores)]
+    if len(preenchidos) == len(valores) and np.all(np.mod(preenchidos, 1) == 0):
+        return pd.to_numeric(pd.Series(valores, index=serie.index), downcast='integer')
+    return pd.Series(valores, index=serie.index, dtype='float64')
+
+def _texto_para_categoria(serie):
+    """
+    Padroniza texto (strip + UPPERCASE) e monta a categoria a partir dos valores distintos:
+    a normalização roda uma vez por valor distinto e as linhas só recebem códigos inteiros.
+    Valores distintos que viram o mesmo texto (ex.: 'abc' e ' ABC') passam a ser a mesma categoria.
+    """
+    codigos, unicos = pd.factorize(serie)
+    if len(unicos) == 0:
+        return serie.astype('category')
+    rotulos = pd.Index(unicos).astype(str).str.strip().str.upper()
+    categorias = pd.Index(rotulos.unique()).sort_values()
+    codigos_categoria = _valores_por_codigo(codigos, categorias.get_indexer(rotulos), vazio=-1)
+    return pd.Series(pd.Categorical.from_codes(codigos_categoria, categories=categorias), index=serie.index)
+
+def _data_referencia(ano, mes):
+    """Primeiro dia do mês de referência a partir das colunas ano e mes (NaT onde não forem válidos)."""
+    partes = pd.DataFrame({
+        'year': _numeros_por_linha(ano)[0],
+        'month': _numeros_por_linha(mes)[0],
+        'day': 1,
+    }, index=ano.index)
+    return pd.to_datetime(partes, errors='coerce')
+
+def inferir_e_converter_tipos(df, colunas_texto, colunas_moeda, moeda_em_centavos=False):
     """
     Tenta inferir e converter tipos de colunas em um DataFrame,
     priorizando as colunas de texto e moeda fornecidas.
+    Com moeda_em_centavos=True as colunas de moeda viram centavos inteiros (int64) em vez de float64.
+    Vetorizada: as decisões usam arrays NumPy e o tratamento de strings roda sobre os valores distintos.
     """
-    df_novo = df.copy()
+    colunas = {}
+    colunas_categoria = [] # Texto (marcado ou inferido): vira categoria padronizada no passo 3
     
     # 1. Limpeza e Inferência Básica
-    for col in df_novo.columns:
-        # Tenta converter para float se for uma coluna de Moeda
+    for col in df.columns:
+        serie = df[col]
+        # Converte para float (ou centavos inteiros) se for uma coluna de Moeda
         if col in colunas_moeda:
-            # CRÍTICO: Conversão explícita de string para número (tratando vírgula decimal)
-            try:
-                # Remove espaços, remove separador de milhar (ponto), troca separador decimal (vírgula por ponto)
-                df_novo[col] = df_novo[col].astype(str).str.strip().str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
-                df_novo[col] = pd.to_numeric(df_novo[col], errors='coerce')
-            except Exception:
-                df_novo[col] = pd.to_numeric(df_novo[col], errors='coerce')
+            colunas[col] = _converter_moeda_centavos(serie) if moeda_em_centavos else _converter_moeda(serie)
         
-        # Converte colunas explicitamente marcadas para string/object
+        # Colunas explicitamente marcadas como texto viram categorias no passo 3 (sem conversão para object)
         elif col in colunas_texto:
-            df_novo[col] = df_novo[col].astype('object')
+            colunas[col] = serie
+            colunas_categoria.append(col)
         
-        # Tenta converter colunas numéricas restantes para int/float se não forem datas
-        elif df_novo[col].dtype not in ['datetime64[ns]']:
-            try:
-                # Verifica se são todos inteiros, se sim, converte para inteiro
-                if df_novo[col].dropna().apply(lambda x: float(x).is_integer()).all():
-                    df_novo[col] = pd.to_numeric(df_novo[col], errors='coerce', downcast='integer')
-                else:
-                    df_novo[col] = pd.to_numeric(df_novo[col], errors='coerce')
-            except:
-                pass
+        # Tenta converter colunas restantes para int/float se não forem datas
+        elif pd.api.types.is_datetime64_any_dtype(serie.dtype):
+            colunas[col] = serie
+        else:
+            numerica = _converter_numerica(serie)
+            colunas[col] = serie if numerica is None else numerica
+            if numerica is None and _eh_texto(serie):
+                colunas_categoria.append(col)
 
     # 2. Conversão de Colunas de Data (Se for ANO e MES)
-    if 'ano' in df_novo.columns and 'mes' in df_novo.columns:
-        try:
-            # Cria uma coluna de data única para filtragem
-            df_novo['data_referencia'] = pd.to_datetime(df_novo['ano'].astype(str) + '-' + df_novo['mes'].astype(str) + '-01', format='%Y-%m-%d', errors='coerce')
-        except Exception:
-            pass
+    if 'ano' in df.columns and 'mes' in df.columns:
+        # Cria uma coluna de data única para filtragem
+        colunas['data_referencia'] = _data_referencia(df['ano'], df['mes'])
             
-    # 3. Conversão final para categorias e remoção de espaços
-    for col in df_novo.select_dtypes(include=['object']):
-        df_novo[col] = df_novo[col].astype(str).str.strip().str.upper() # Padronização para UPPERCASE
-        df_novo[col] = df_novo[col].astype('category')
+    # 3. Conversão final para categorias e remoção de espaços (Padronização para UPPERCASE)
+    for col in colunas_categoria:
+        colunas[col] = _texto_para_categoria(colunas[col])
+
+    return pd.DataFrame(colunas, index=df.index)
+
+def detectar_formato_data(serie, tamanho_amostra=TAMANHO_AMOSTRA_DATAS, proporcao_minima=0.5):
+    """
+    Testa os formatos de FORMATOS_DATA numa amostra de até 'tamanho_amostra' valores preenchidos
+    (espalhados pela coluna) e retorna o que interpreta a maior parte deles, ou None se nenhum
+    passar de 'proporcao_minima' da amostra. A coluna inteira não é lida.
+    """
+    if len(serie) == 0:
+        return None
+    posicoes = np.unique(np.linspace(0, len(serie) - 1, min(len(serie), tamanho_amostra * 2)).astype(int))
+    amostra = serie.iloc[posicoes].dropna().astype(str).str.strip()
+    amostra = amostra[amostra != ''].head(tamanho_amostra)
+    if amostra.empty:
+        return None
 
-    return df_novo
+    melhor_formato, melhor_proporcao = None, proporcao_minima
+    for formato in FORMATOS_DATA:
+        proporcao = pd.to_datetime(amostra, format=formato, errors='coerce').notna().mean()
+        if proporcao > melhor_proporcao:
+            melhor_formato, melhor_proporcao = formato, proporcao
+    return melhor_formato
+
+def memoria_bytes(df):
+    """Memória ocupada pelo DataFrame (inclui o conteúdo das strings)."""
+    return int(df.memory_usage(deep=True, index=False).sum())
+
+def planejar_tipos_compactos(df, colunas_preservadas=(), proporcao_maxima_categoria=0.5):
+    """
+    Escolhe a menor representação segura de cada coluna (tipos que não perdem informação):
+      - inteiros (e floats sem casas decimais nem ausentes): menor tipo inteiro (ex.: int8/int16 para ano/mês);
+      - texto com poucos valores distintos: categoria (códigos int8/int16 + dicionário);
+      - texto com muitos valores distintos (IDs, chaves): strings Arrow, em vez de objetos Python;
+      - categorias quase sem repetição: strings Arrow (o dicionário custaria mais que os códigos economizam).
+    Colunas em 'colunas_preservadas' (ex.: as de filtro, que precisam ser categóricas, e as de centavos,
+    que precisam de int64 para somar sem estouro) não mudam.
+    Colunas monetárias em float64 também não mudam (float32 perderia centavos).
+    Retorna {coluna: novo_tipo} apenas para as colunas que mudam.
+    """
+    plano = {}
+    for col in df.columns:
+        if col in colunas_preservadas:
+            continue
+        serie = df[col]
+        tipo = serie.dtype
+
+        if pd.api.types.is_bool_dtype(tipo) or pd.api.types.is_datetime64_any_dtype(tipo):
+            continue
+
+        if pd.api.types.is_integer_dtype(tipo) or pd.api.types.is_float_dtype(tipo):
+            valores = serie.to_numpy()
+            if pd.api.types.is_float_dtype(tipo) and (np.isnan(valores).any() or not np.all(np.mod(valores, 1) == 0)):
+                continue
+            if len(valores) == 0:
+                continue
+            minimo, maximo = valores.min(), valores.max()
+            menor = next((np.dtype(t) for t in TIPOS_INTEIROS if np.iinfo(t).min <= minimo and maximo <= np.iinfo(t).max), None)
+            if menor is not None and menor != tipo:
+                plano[col] = str(menor)
+            continue
+
+        distintos = serie.nunique(dropna=True)
+        muitos_distintos = len(serie) > 0 and distintos > len(serie) * proporcao_maxima_categoria
+        if isinstance(tipo, pd.CategoricalDtype):
+            if muitos_distintos:
+                plano[col] = 'string[pyarrow]'
+        elif pd.api.types.is_object_dtype(tipo) or pd.api.types.is_string_dtype(tipo):
+            if muitos_distintos:
+                if str(tipo) != 'string[pyarrow]':
+                    plano[col] = 'string[pyarrow]'
+            else:
+                plano[col] = 'category'
+    return plano
+
+def compactar_tipos(df, colunas_preservadas=()):
+    """
+    Aplica planejar_tipos_compactos. Retorna (df_compacto, memória antes, memória depois), em bytes.
+    O DataFrame original não é alterado.
+    """
+    antes = memoria_bytes(df)
+    plano = planejar_tipos_compactos(df, colunas_preservadas)
+    if not plano:
+        return df, antes, antes
+    df = df.astype(plano)
+    return df, antes, memoria_bytes(df)
 
 def encontrar_colunas_tipos(df):
     """Retorna listas de colunas categoricas e de data."""
@@ -79,27 +341,41 @@ def verificar_ausentes(df):
     df_ausentes = pd.DataFrame({'Contagem de Ausentes': ausentes, 'Percentual (%)': percentual})
     return df_ausentes[df_ausentes['Contagem de Ausentes'] > 0].sort_values(by='Contagem de Ausentes', ascending=False)
 
-def gerar_rotulo_filtro(df_completo, filtros_ativos_dict, colunas_data, data_range):
-    """Gera um rótulo resumido dos filtros aplicados."""
+def gerar_rotulo_filtro(df_completo, filtros_ativos_dict, colunas_data, data_range, indice_opcoes=None, limites_data=None):
+    """
+    Gera um rótulo resumido dos filtros aplicados.
+    Com o índice de opções do dataset, não recalcula os valores distintos e informa os registros selecionados.
+    'limites_data' (primeira e última data, ex.: do índice de datas ordenado) evita varrer a coluna de data.
+    """
     rotulos = []
     
     # Rótulos Categóricos
     for col, selecoes in filtros_ativos_dict.items():
         if col not in df_completo.columns: continue
-        opcoes_unicas = df_completo[col].astype(str).fillna('N/A').unique().tolist()
+        if indice_opcoes and col in indice_opcoes:
+            opcoes_unicas = indice_opcoes[col]['valores']
+        else:
+            opcoes_unicas = df_completo[col].astype(str).fillna('N/A').unique().tolist()
         
         # Só mostra se o filtro estiver ativo (len > 0 e len < total de opções)
         if selecoes and len(selecoes) > 0 and len(selecoes) < len(opcoes_unicas):
-            rotulos.append(f"**{col.replace('_', ' ').title()}**: ({len(selecoes)} opções)")
+            rotulo = f"**{col.replace('_', ' ').title()}**: ({len(selecoes)} opções"
+            if indice_opcoes and col in indice_opcoes:
+                contagens = dict(zip(indice_opcoes[col]['valores'], indice_opcoes[col]['contagens']))
+                registros = sum(contagens.get(v, 0) for v in selecoes)
+                rotulo += f", {registros:,} registros".replace(",", ".")
+            rotulos.append(rotulo + ")")
     
     # Rótulos de Data
     if data_range and colunas_data:
         data_col = colunas_data[0]
-        # Converte para datetime e remove NaT antes de calcular min/max
-        data_series = pd.to_datetime(df_completo[data_col], errors='coerce').dropna()
-        if not data_series.empty:
-            data_min_df = data_series.min().to_pydatetime()
-            data_max_df = data_series.max().to_pydatetime()
+        if limites_data is None:
+            # Converte para datetime e remove NaT antes de calcular min/max
+            data_series = pd.to_datetime(df_completo[data_col], errors='coerce').dropna()
+            limites_data = (data_series.min(), data_series.max()) if not data_series.empty else None
+        if limites_data is not None:
+            data_min_df = pd.Timestamp(limites_data[0]).to_pydatetime()
+            data_max_df = pd.Timestamp(limites_data[1]).to_pydatetime()
             
             data_range_start = pd.to_datetime(data_range[0]).to_pydatetime()
             data_range_end = pd.to_datetime(data_range[1]).to_pydatetime()